@@ -0,0 +1,89 @@
+"""
+Запись и чтение JSON-дампов звонков: отдельный файл на звонок (как было,
+call_data_<call_id>.json с indent=2) и сегментированный архив CallArchive.
+
+Запуск из папки Asya:
+    python scripts/bench_call_archive.py [--calls 20000] [--reads 2000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.database.call_archive import CallArchive  # noqa: E402
+
+
+def make_call():
+    call_id = str(uuid.uuid4())
+    return call_id, {
+        "call_id": call_id,
+        "timestamp": "2025-05-06T10:00:00",
+        "client_data": {"phone_number": "+79161234567", "name": "Иван", "city": "Казань"},
+        "transcription": [
+            {"speaker": "client" if i % 2 else "bot", "text": "Нужна мастика битумная, двадцать вёдер", "timestamp": f"10:00:{i:02d}"}
+            for i in range(20)
+        ],
+        "action": {"next_step": "transfer", "target_department": "Коммерческий отдел"},
+    }
+
+
+def bench_files(root, calls, reads):
+    start = time.perf_counter()
+    for call_id, document in calls:
+        with open(os.path.join(root, f"call_data_{call_id}.json"), "w", encoding="utf-8") as f:
+            f.write(json.dumps(document, ensure_ascii=False, indent=2))
+    write_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for call_id, _ in reads:
+        with open(os.path.join(root, f"call_data_{call_id}.json"), encoding="utf-8") as f:
+            json.load(f)
+    read_s = time.perf_counter() - start
+    start = time.perf_counter()
+    listed = len(os.listdir(root))
+    list_ms = (time.perf_counter() - start) * 1000
+    return write_s, read_s, listed, list_ms
+
+
+def bench_archive(root, calls, reads):
+    archive = CallArchive(root)
+    start = time.perf_counter()
+    for call_id, document in calls:
+        archive.append(call_id, document)
+    archive.flush()
+    write_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for call_id, _ in reads:
+        archive.get(call_id)
+    read_s = time.perf_counter() - start
+    archive.close()
+    start = time.perf_counter()
+    listed = len(os.listdir(root))
+    list_ms = (time.perf_counter() - start) * 1000
+    return write_s, read_s, listed, list_ms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--reads", type=int, default=2000)
+    args = parser.parse_args()
+
+    calls = [make_call() for _ in range(args.calls)]
+    reads = random.sample(calls, min(args.reads, len(calls)))
+    for name, bench in (("файл на звонок", bench_files), ("архив сегментов", bench_archive)):
+        with tempfile.TemporaryDirectory() as root:
+            write_s, read_s, listed, list_ms = bench(root, calls, reads)
+        print(
+            f"{name:16s}: запись {args.calls / write_s:8.0f} звонков/с, чтение {len(reads) / read_s:8.0f} звонков/с, "
+            f"файлов в папке {listed}, листинг {list_ms:.1f} мс"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Размер базы и время записи JSON-дампов: текст с indent=2 в jsons.json_data
+(как было) и сжатый компактный JSON со ссылкой на call_transcripts.
+
+Запуск из папки Asya:
+    python scripts/bench_call_json.py [--calls 10000] [--segments 30]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.database.call_json import COMPACT_JSON_FORMAT, encode_call_json  # noqa: E402
+from src.database.connection import ConnectionManager  # noqa: E402
+
+PHRASES = [
+    "Здравствуйте, компания, меня зовут Ася, чем могу помочь?",
+    "Добрый день, интересует мастика битумная для кровли, сколько стоит ведро?",
+    "Подскажите, пожалуйста, из какого вы города?",
+    "Мы в Казани, нужна доставка на объект, примерно двадцать вёдер.",
+]
+
+
+def make_call(segments):
+    call_id, client_id = str(uuid.uuid4()), str(uuid.uuid4())
+    transcription = [
+        {"speaker": "bot" if i % 2 == 0 else "client", "text": PHRASES[i % len(PHRASES)], "timestamp": f"10:{i // 60:02d}:{i % 60:02d}"}
+        for i in range(segments)
+    ]
+    document = {
+        "call_id": call_id,
+        "client_id": client_id,
+        "timestamp": "2025-05-06T10:00:00",
+        "client_data": {"phone_number": "+79161234567", "name": "Иван", "city": "Казань", "region": None,
+                        "inn": None, "company": None, "is_duplicate_city": False, "last_call_summary": None},
+        "request_details": {"department": "Отдел продаж", "product_service": None, "request_text": "Мастика"},
+        "transcription": transcription,
+        "action": {"next_step": "transfer", "target_department": "Отдел продаж", "manager_id": None},
+        "metadata": {"is_repeat_call": False, "call_history_id": [], "is_work_time": True,
+                     "sip_status": "answered", "llm_retry_count": 0, "fallback_triggered": False},
+    }
+    segment_rows = [
+        (call_id, client_id, t["speaker"], t["text"], f"seg_{i:04d}", f"2025-05-06T{t['timestamp']}")
+        for i, t in enumerate(transcription)
+    ]
+    return document, segment_rows
+
+
+def run(label, path, calls, encode):
+    connections = ConnectionManager(path)
+    with connections.transaction() as conn:
+        conn.execute('''
+            CREATE TABLE call_transcripts (transcript_id INTEGER PRIMARY KEY AUTOINCREMENT, call_id TEXT,
+                                           client_id TEXT, speaker TEXT, text TEXT, segment_id TEXT, segment_time TEXT)
+        ''')
+        conn.execute('''
+            CREATE TABLE jsons (call_id TEXT PRIMARY KEY, client_id TEXT, timestamp TEXT,
+                                json_data TEXT, json_blob BLOB, json_format TEXT)
+        ''')
+    elapsed = 0.0
+    for document, segment_rows in calls:
+        start = time.perf_counter()
+        with connections.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO call_transcripts (call_id, client_id, speaker, text, segment_id, segment_time) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                segment_rows,
+            )
+            conn.execute(
+                "INSERT INTO jsons (call_id, client_id, timestamp, json_data, json_blob, json_format) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (document["call_id"], document["client_id"], document["timestamp"], *encode(document)),
+            )
+        elapsed += time.perf_counter() - start
+    conn = connections.connection()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    size = conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+    connections.close_all()
+    print(f"{label:<28} база {size / 2**20:8.1f} МиБ, запись {elapsed:6.2f} с на {len(calls)} звонков")
+    return size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--segments", type=int, default=30)
+    args = parser.parse_args()
+
+    calls = [make_call(args.segments) for _ in range(args.calls)]
+    with tempfile.TemporaryDirectory() as tmp:
+        before = run(
+            "до: json_data, indent=2", os.path.join(tmp, "before.db"), calls,
+            lambda document: (json.dumps(document, ensure_ascii=False, indent=2), None, None),
+        )
+        after = run(
+            "после: json_blob, zlib+ref", os.path.join(tmp, "after.db"), calls,
+            lambda document: (None, encode_call_json(document), COMPACT_JSON_FORMAT),
+        )
+    print(f"размер x{before[0] / after[0]:.2f} меньше, запись x{before[1] / after[1]:.2f} быстрее")
+
+
+if __name__ == "__main__":
+    main()
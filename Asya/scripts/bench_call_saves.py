@@ -0,0 +1,101 @@
+"""
+Сохранение звонков: коммит на каждый звонок (как было в save_call_data)
+и групповой коммит GroupCommitWriter, при одновременном завершении звонков.
+
+Запуск из папки Asya:
+    python scripts/bench_call_saves.py [--calls 2000] [--callers 32] [--segments 30]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.database.connection import ConnectionManager  # noqa: E402
+from src.database.group_commit import GroupCommitWriter, WriteJob, apply_jobs  # noqa: E402
+
+INSERT_CALL = "INSERT INTO calls (call_id, client_id, timestamp, department) VALUES (?, ?, ?, ?)"
+INSERT_SEGMENT = "INSERT INTO call_transcripts (call_id, client_id, speaker, text, segment_id) VALUES (?, ?, ?, ?, ?)"
+
+
+def make_db(path):
+    connections = ConnectionManager(path)
+    with connections.transaction() as conn:
+        conn.execute("CREATE TABLE clients_info (client_id TEXT PRIMARY KEY, change_version INTEGER DEFAULT 0)")
+        conn.execute("CREATE TABLE calls (call_id TEXT PRIMARY KEY, client_id TEXT, timestamp TEXT, department TEXT)")
+        conn.execute('''
+            CREATE TABLE call_transcripts (transcript_id INTEGER PRIMARY KEY AUTOINCREMENT, call_id TEXT,
+                                           client_id TEXT, speaker TEXT, text TEXT, segment_id TEXT)
+        ''')
+    return connections
+
+
+def call_job(segments):
+    call_id, client_id = str(uuid.uuid4()), str(uuid.uuid4())
+    return WriteJob(
+        statements=[
+            (INSERT_CALL, [(call_id, client_id, time.strftime("%Y-%m-%dT%H:%M:%S"), "Отдел продаж")]),
+            (INSERT_SEGMENT, [
+                (call_id, client_id, "bot" if i % 2 == 0 else "client", "реплика диалога " * 5, f"seg_{i}")
+                for i in range(segments)
+            ]),
+        ],
+        result=call_id,
+    )
+
+
+def run(label, save, calls, callers, segments):
+    per_caller = calls // callers
+    workers = [
+        threading.Thread(target=lambda: [save(call_job(segments)) for _ in range(per_caller)])
+        for _ in range(callers)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    rate = per_caller * callers / (time.perf_counter() - start)
+    print(f"{label:<40} {rate:>10.0f} звонков/с")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--callers", type=int, default=32)
+    parser.add_argument("--segments", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # "До": транзакция (и fsync) на звонок, реплики по одной
+        before_db = make_db(os.path.join(tmp, "before.db"))
+
+        def save_per_call(job):
+            conn = before_db.connection()
+            conn.execute("PRAGMA synchronous=FULL")
+            with before_db.transaction(immediate=True):
+                for sql, rows in job.statements:
+                    for row in rows:
+                        conn.execute(sql, row)
+
+        before = run("до: коммит на звонок", save_per_call, args.calls, args.callers, args.segments)
+
+        after_db = make_db(os.path.join(tmp, "after.db"))
+        writer = GroupCommitWriter(after_db)
+        writer.start()
+        after = run(
+            "после: групповой коммит",
+            lambda job: writer.submit_job(job).result(),
+            args.calls, args.callers, args.segments,
+        )
+        writer.stop()
+        print(f"ускорение: x{after / before:.1f}; группы: {writer.metrics.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Сравнение: соединение на каждый запрос (как было в DatabaseManager) и
+долгоживущие соединения ConnectionManager (WAL, прагмы, кэш запросов).
+
+Запуск из папки Asya:
+    python scripts/bench_db_connections.py [--clients 20000] [--queries 20000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.database.connection import ConnectionManager  # noqa: E402
+
+LOOKUP_SQL = "SELECT * FROM clients_info WHERE phone_e164 = ?"
+UPDATE_SQL = "UPDATE clients_info SET comment = ? WHERE phone_e164 = ?"
+
+
+def make_db(path, clients):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE clients_info (client_id TEXT PRIMARY KEY, phone_e164 TEXT, name TEXT, comment TEXT)
+    ''')
+    conn.execute("CREATE UNIQUE INDEX idx_clients_phone_e164 ON clients_info(phone_e164)")
+    conn.executemany(
+        "INSERT INTO clients_info VALUES (?, ?, ?, '')",
+        ((str(i), f"+7916{i:07d}", f"Клиент {i}") for i in range(clients)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(label, query, phones, threads=1):
+    """Запросы в нескольких потоках; возвращает запросов в секунду."""
+    chunks = [phones[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=lambda chunk=chunk: [query(p) for p in chunk]) for chunk in chunks]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    qps = len(phones) / (time.perf_counter() - start)
+    print(f"{label:<48} {qps:>10.0f} запросов/с")
+    return qps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        make_db(path, args.clients)
+        phones = [f"+7916{random.randrange(args.clients):07d}" for _ in range(args.queries)]
+        writes = phones[: max(args.queries // 10, 1)]
+
+        def lookup_per_call(phone):
+            conn = sqlite3.connect(path)
+            try:
+                return conn.execute(LOOKUP_SQL, (phone,)).fetchone()
+            finally:
+                conn.close()
+
+        def update_per_call(phone):
+            conn = sqlite3.connect(path)
+            try:
+                conn.execute(UPDATE_SQL, ("bench", phone))
+                conn.commit()
+            finally:
+                conn.close()
+
+        # "До": журнал отката, соединение на запрос
+        before = [
+            run("до: поиск клиента, 1 поток", lookup_per_call, phones),
+            run(f"до: поиск клиента, {args.threads} потока", lookup_per_call, phones, args.threads),
+            run("до: обновление клиента", update_per_call, writes),
+        ]
+
+        manager = ConnectionManager(path)
+
+        def lookup_pooled(phone):
+            return manager.connection().execute(LOOKUP_SQL, (phone,)).fetchone()
+
+        def update_pooled(phone):
+            with manager.transaction() as conn:
+                conn.execute(UPDATE_SQL, ("bench", phone))
+
+        after = [
+            run("после: поиск клиента, 1 поток", lookup_pooled, phones),
+            run(f"после: поиск клиента, {args.threads} потока", lookup_pooled, phones, args.threads),
+            run("после: обновление клиента", update_pooled, writes),
+        ]
+        manager.close_all()
+
+        print("ускорение: " + ", ".join(f"x{a / b:.1f}" for a, b in zip(after, before)))
+
+
+if __name__ == "__main__":
+    main()
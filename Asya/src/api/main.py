@@ -6,6 +6,7 @@ from fastapi import FastAPI, Request
 
 from .middleware.logging_middleware import logging_middleware
 from .routes.call_endpoints import router as call_router
+from .routes.client_endpoints import router as client_router
 from .routes.health_check import router as health_router
 
 load_dotenv()
@@ -19,6 +20,7 @@ async def add_logging_middleware(request: Request, call_next):
 
 # Подключаем роуты
 app.include_router(call_router, prefix="/api/v1")
+app.include_router(client_router, prefix="/api/v1")
 app.include_router(health_router, prefix="/api/v1")
 # Важно: websocket_router пока НЕ подключаем, чтобы не тянуть незавершённый код
 
@@ -0,0 +1,34 @@
+"""
+Endpoints для истории звонков клиента.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from src.database.async_db import AsyncDatabaseManager, get_async_db
+from src.utils.logger import get_logger
+from src.database.shemas.call_schemas import RecentCallsResponse
+
+router = APIRouter(prefix="/clients", tags=["clients"])
+logger = get_logger(__name__)
+
+
+def get_db_manager() -> AsyncDatabaseManager:
+    """Зависимость FastAPI: общий асинхронный менеджер БД процесса."""
+    return get_async_db()
+
+
+@router.get("/{client_id}/calls", response_model=RecentCallsResponse)
+async def get_recent_calls(
+    client_id: str,
+    n: int = Query(3, ge=1, le=50),
+    db: AsyncDatabaseManager = Depends(get_db_manager),
+):
+    """
+    Последние n звонков клиента: сводка, отдел и начало транскрипта.
+    """
+    try:
+        calls = await db.get_recent_calls(client_id, n)
+        return RecentCallsResponse(client_id=client_id, calls=calls)
+    except Exception as e:
+        logger.error(f"Failed to get recent calls for {client_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
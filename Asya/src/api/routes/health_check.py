@@ -8,7 +8,7 @@ from typing import Dict, Any
 from datetime import datetime
 
 from src.utils.ari_client import AriClient
-from src.database.db_manager import DatabaseManager
+from src.database.async_db import get_async_db
 from src.utils.logger import get_logger
 
 router = APIRouter(tags=["health"])
@@ -35,6 +35,7 @@ async def full_health_check() -> Dict[str, Any]:
 
     Не используем Depends, чтобы не ловить 500,
     если конструктор DatabaseManager или AriClient упадёт.
+    Запрос к БД выполняется в пуле чтения, event loop не блокируется.
     """
     health_status: Dict[str, Any] = {
         "timestamp": datetime.now().isoformat(),
@@ -46,12 +47,14 @@ async def full_health_check() -> Dict[str, Any]:
 
     # --- Проверка БД ---
     try:
-        db_manager = DatabaseManager()  # db/clients.db
-        db_connected = await db_manager.check_connection()
+        async_db = get_async_db()  # db/clients.db
+        db_connected = await async_db.check_connection()
         health_status["database"] = "healthy" if db_connected else "unhealthy"
         health_status["details"]["database"] = {
             "connected": db_connected,
             "checked_at": datetime.now().isoformat(),
+            # Групповой коммит: размер групп и задержка коммита
+            "writer": async_db.writer_metrics(),
         }
     except Exception as e:
         logger.error(f"Ошибка health_check для БД: {e}")
@@ -1,10 +1,13 @@
 # src/api/routes/websocket_handler.py
 
+import asyncio
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from starlette.websockets import WebSocketState
 from typing import Dict
 import logging
+from src.asya_core.caller_prefetch import CallerPrefetcher
 from src.asya_core.dialog_manager import DialogManager
+from src.database.async_db import get_async_db
 from src.utils.ari_client import AriClient
 from src.config.asterisk_ari_config import ARI_CONFIG  # ← ваш конфиг из config/
 
@@ -22,6 +25,9 @@ ari_client = AriClient(
     password=ARI_CONFIG["password"]
 )
 
+# Предзагрузка контекста звонящего (клиент, прошлые звонки, регион по номеру)
+caller_prefetcher = CallerPrefetcher.from_db(get_async_db().db)
+
 
 @router.websocket("/events")
 async def ari_websocket_endpoint(websocket: WebSocket):
@@ -80,6 +86,9 @@ async def handle_stasis_start(data: dict):
 
     logger.info(f"📞 Новый звонок: {caller_id} → {called_id} (ID: {channel_id})")
 
+    # Запускаем сразу: запросы к базе идут параллельно с приветствием
+    prefetch = caller_prefetcher.start(caller_id if caller_id != "unknown" else None)
+
     # Создаём новый диалог
     dialog = DialogManager(
         channel_id=channel_id,
@@ -92,6 +101,16 @@ async def handle_stasis_start(data: dict):
 
     # Запускаем основной цикл диалога
     asyncio.create_task(dialog.start())
+    asyncio.create_task(attach_caller_context(dialog, prefetch))
+
+
+async def attach_caller_context(dialog: DialogManager, prefetch: asyncio.Task):
+    """Передаёт диалогу результат предзагрузки, как только он готов (не позже таймаута)."""
+    try:
+        context = await prefetch
+        dialog.apply_caller_context(context, await get_async_db().get_region_names())
+    except asyncio.CancelledError:
+        pass
 
 
 async def handle_talking_started(data: dict):
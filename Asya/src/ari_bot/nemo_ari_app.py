@@ -3,6 +3,7 @@ import json
 import logging
 import os
 import subprocess
+import sys
 import wave
 from pathlib import Path
 from typing import Optional
@@ -12,6 +13,11 @@ import numpy as np
 import torch
 from nemo.collections.asr.models import EncDecCTCModelBPE
 
+# Общие модули пакета (src.utils.*): скрипт запускается из src/ari_bot
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src.asya_core.caller_prefetch import CallerContext, CallerPrefetcher
+from src.database.async_db import get_async_db
+
 # ---------- Логирование ----------
 
 logger = logging.getLogger("nemo_ari_app")
@@ -35,6 +41,9 @@ ARI_APP = os.getenv("ARI_APP", "fast_api")
 ARI_USER = os.getenv("ARI_USER", "avr")
 ARI_PASSWORD = os.getenv("ARI_PASSWORD", "avr_password")
 
+# База клиентов для предзагрузки контекста звонящего
+DB_PATH = os.getenv("ASYA_DB_PATH", "db/clients.db")
+
 AST_RECORDING_DIR = "/var/spool/asterisk/recording"
 AST_SOUNDS_DIR = "/var/lib/asterisk/sounds"
 
@@ -52,6 +61,10 @@ asr_model: Optional[EncDecCTCModelBPE] = None
 silero_model = None
 silero_device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# Контекст звонка по channel_id: номер и задача предзагрузки (клиент, прошлые звонки, регион)
+call_contexts: dict = {}
+caller_prefetcher: Optional[CallerPrefetcher] = None
+
 
 # ---------- Инициализация NeMo ASR ----------
 
@@ -384,10 +397,26 @@ async def handle_stasis_start(
     if not channel_id:
         return
 
+    # Клиент, его прошлые звонки и регион по номеру — параллельно, пока идёт приветствие;
+    # обработчик не ждёт результата
+    prefetch = caller_prefetcher.start(caller) if caller_prefetcher and caller else None
+    call_contexts[channel_id] = {"caller": caller, "prefetch": prefetch}
+
     # Запускаем запись этого канала
     await start_recording(session, channel_id)
 
 
+async def get_caller_context(channel_id: Optional[str]) -> Optional[CallerContext]:
+    """Результат предзагрузки для канала (к первой реплике обычно уже готов; ждёт не дольше таймаута)."""
+    prefetch = (call_contexts.get(channel_id) or {}).get("prefetch")
+    if prefetch is None:
+        return None
+    try:
+        return await prefetch
+    except asyncio.CancelledError:
+        return None
+
+
 async def handle_recording_finished(
     session: aiohttp.ClientSession, event: dict
 ) -> None:
@@ -434,6 +463,14 @@ async def handle_recording_finished(
 
     logger.info("[ASR] Итоговый текст для %s: %r", name, user_text)
 
+    caller_context = await get_caller_context(channel_id)
+    if caller_context is not None:
+        logger.info(
+            "[BOT] channel=%s контекст звонящего: %s",
+            channel_id,
+            caller_context.system_messages(await get_async_db(DB_PATH).get_region_names()),
+        )
+
     # Ответ бота (пока простое эхо)
     if not user_text.strip():
         bot_reply = (
@@ -539,6 +576,9 @@ async def ari_events_loop() -> None:
                                 logger.info(
                                     "[StasisEnd] channel_id=%s", ch_id
                                 )
+                                context = call_contexts.pop(ch_id, None) or {}
+                                if context.get("prefetch") is not None:
+                                    context["prefetch"].cancel()
                         elif msg.type == aiohttp.WSMsgType.ERROR:
                             logger.error(
                                 "Ошибка ARI WebSocket: %s", msg
@@ -554,8 +594,10 @@ async def ari_events_loop() -> None:
 
 
 async def main_async():
+    global caller_prefetcher
     # Подготовим NeMo ASR, чтобы не грузить модель при первом звонке
     init_nemo_asr()
+    caller_prefetcher = CallerPrefetcher.from_db(get_async_db(DB_PATH).db)
     await ari_events_loop()
 
 
@@ -0,0 +1,137 @@
+"""
+Предзагрузка контекста звонящего на StasisStart: клиент, прошлые звонки и прогноз
+региона запрашиваются параллельно, пока играет приветствие, с общим таймаутом.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from src.utils.phone_regions import get_phone_trie, predict_region, region_prediction_text
+
+logger = logging.getLogger(__name__)
+
+# Приветствие длится несколько секунд — контекст должен успеть раньше
+PREFETCH_TIMEOUT = 1.5
+
+# Сколько прошлых звонков показывать LLM
+RECENT_CALLS = 3
+
+
+@dataclass
+class CallerContext:
+    """Что известно о звонящем до первой реплики."""
+    caller: Optional[str]
+    client: Optional[Dict[str, Any]] = None
+    recent_calls: List[Dict[str, Any]] = field(default_factory=list)
+    region_prediction: Optional[Dict[str, Any]] = None
+    # Источники, не успевшие за таймаут или упавшие
+    missing: List[str] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    def system_messages(self, region_names: Optional[Dict[str, str]] = None) -> List[Dict[str, str]]:
+        """Системные сообщения для первого запроса к LLM."""
+        messages = []
+        if self.client:
+            messages.append({
+                "role": "system",
+                "content": f"Клиент найден в базе: {self.client.get('name') or 'имя не указано'}"
+                           f"{', город ' + self.client['city_name'] if self.client.get('city_name') else ''}.",
+            })
+        summaries = [
+            f"{(call.get('timestamp') or '')[:10]} — {call.get('department') or 'отдел не указан'}: "
+            f"{call.get('request_text') or call.get('summary') or ''}".strip()
+            for call in self.recent_calls
+        ]
+        if summaries:
+            messages.append({"role": "system", "content": "Прошлые звонки клиента:\n" + "\n".join(summaries)})
+        elif self.client and self.client.get("last_call_summary"):
+            messages.append({
+                "role": "system",
+                "content": f"Информация о последнем звонке: {self.client['last_call_summary']}",
+            })
+        region_text = region_prediction_text(self.region_prediction, region_names or {})
+        if region_text and not (self.client and self.client.get("region_code")):
+            messages.append({"role": "system", "content": region_text.strip()})
+        return messages
+
+
+def _predict_caller_region(phone: str) -> Optional[Dict[str, Any]]:
+    return predict_region(phone, get_phone_trie())
+
+
+class CallerPrefetcher:
+    """
+    Запускает поиск клиента, его последних звонков и прогноз региона параллельно.
+
+    Источники — обычные (блокирующие) функции по номеру звонящего; каждая
+    выполняется в своём потоке через asyncio.to_thread.
+    """
+
+    def __init__(
+        self,
+        find_client: Callable[[str], Optional[Dict[str, Any]]],
+        recent_calls: Callable[[str, int], List[Dict[str, Any]]],
+        predict: Callable[[str], Optional[Dict[str, Any]]] = _predict_caller_region,
+        recent_n: int = RECENT_CALLS,
+        timeout: float = PREFETCH_TIMEOUT,
+    ):
+        """
+        Args:
+            find_client: Клиент по номеру или None.
+            recent_calls: Последние n звонков клиента по его номеру.
+            predict: Прогноз региона по номеру (по умолчанию — дерево префиксов процесса).
+            recent_n: Сколько прошлых звонков запрашивать.
+            timeout: Общее ожидание всех источников, секунды.
+        """
+        self.find_client = find_client
+        self.recent_calls = recent_calls
+        self.predict = predict
+        self.recent_n = recent_n
+        self.timeout = timeout
+
+    @classmethod
+    def from_db(cls, db, **kwargs) -> "CallerPrefetcher":
+        """Источники из DatabaseManager: find_client_by_phone и get_recent_calls_by_phone."""
+        return cls(db.find_client_by_phone, db.get_recent_calls_by_phone, **kwargs)
+
+    async def fetch(self, caller: Optional[str]) -> CallerContext:
+        """Контекст звонящего не позже чем через timeout секунд."""
+        context = CallerContext(caller=caller)
+        if not caller:
+            return context
+
+        start = time.perf_counter()
+        tasks = {
+            "client": asyncio.create_task(asyncio.to_thread(self.find_client, caller)),
+            "recent_calls": asyncio.create_task(asyncio.to_thread(self.recent_calls, caller, self.recent_n)),
+            "region_prediction": asyncio.create_task(asyncio.to_thread(self.predict, caller)),
+        }
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.timeout)
+        for task in pending:
+            # Поток доработает сам, результат просто не нужен
+            task.cancel()
+
+        for name, task in tasks.items():
+            if task not in done:
+                context.missing.append(name)
+                logger.warning(f"Предзагрузка {caller}: {name} не успел за {self.timeout} с")
+            elif task.exception() is not None:
+                context.missing.append(name)
+                logger.error(f"Предзагрузка {caller}: ошибка {name}: {task.exception()}")
+            elif task.result() is not None:
+                setattr(context, name, task.result())
+
+        context.elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(
+            f"Предзагрузка {caller}: клиент {'найден' if context.client else 'не найден'}, "
+            f"прошлых звонков {len(context.recent_calls)}, регион {context.region_prediction}, "
+            f"{context.elapsed_ms:.1f} мс"
+        )
+        return context
+
+    def start(self, caller: Optional[str]) -> "asyncio.Task[CallerContext]":
+        """Запускает fetch в фоне (вызывать из обработчика StasisStart)."""
+        return asyncio.create_task(self.fetch(caller))
@@ -1,5 +1,6 @@
 import logging
 import json
+import uuid
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
@@ -7,8 +8,8 @@ from asya_core.models.llm import LLM
 from asya_core.models.stt import STT
 from asya_core.models.tts import TTS
 from asya_core.models.vad import VAD
-from asya_core.knowledge_base import KnowledgeBase
-from asya_core.database import DatabaseManager
+from asya_core.knowledge_base import KnowledgeBase, kb_system_message
+from src.database.async_db import AsyncDatabaseManager
 from asya_core.schemas import DialogState, CallProfile, TranscriptSegment, LLMResponse
 
 logger = logging.getLogger(__name__)
@@ -27,7 +28,7 @@ class DialogManager:
         tts: TTS,
         vad: VAD,
         kb: KnowledgeBase,
-        db: DatabaseManager,
+        db: AsyncDatabaseManager,
     ):
         self.llm = llm
         self.stt = stt
@@ -41,6 +42,8 @@ class DialogManager:
         self.profile = CallProfile()
         self.transcript: List[TranscriptSegment] = []
         self.history: List[Dict[str, str]] = []
+        # Идентификатор звонка с первой реплики: реплики пишутся в БД по мере разговора
+        self.call_id = str(uuid.uuid4())
 
         # Добавляем системный промпт в историю
         self._init_history()
@@ -57,6 +60,23 @@ class DialogManager:
             "content": full_prompt
         })
 
+    def apply_caller_context(self, context, region_names: Optional[Dict[str, str]] = None) -> None:
+        """
+        Добавляет сведения о звонящем (CallerContext из предзагрузки на StasisStart)
+        сразу после системного промпта — до первого запроса к LLM.
+        region_names — названия регионов cities_map по коду (get_region_names).
+        """
+        messages = context.system_messages(region_names)
+        self.history[1:1] = messages
+        # Найденный клиент: звонок сохранится под его client_id, а не под новым
+        if context.client and not getattr(self.profile, "client_id", None):
+            self.profile.client_id = context.client.get("client_id")
+            # Реплики, записанные до предзагрузки, тоже получают клиента — иначе
+            # оборвавшийся звонок восстановился бы без истории клиента
+            if self.transcript and self.profile.client_id:
+                self.db.attach_turns_client(self.call_id, self.profile.client_id)
+        logger.info(f"Контекст звонящего добавлен: {len(messages)} сообщений, не успели: {context.missing}")
+
     def process_audio_chunk(self, audio_chunk: bytes) -> Dict[str, Any]:
         """
         Главный метод: обрабатывает один аудиофрагмент.
@@ -80,15 +100,11 @@ class DialogManager:
                 # Если тишина — запускаем STT на накопленном аудио
                 if self.stt.has_audio():
                     full_transcript = self.stt.transcribe()
-                    self.transcript.append(TranscriptSegment(
-                        speaker="client",
-                        text=full_transcript,
-                        timestamp=datetime.now()
-                    ))
+                    self._record_turn("client", full_transcript)
                     self.history.append({"role": "user", "content": full_transcript})
 
-                    # 2. Отправляем полную историю в LLM
-                    llm_response_raw = self.llm.generate(self.history)
+                    # 2. Отправляем историю в LLM (с фрагментами каталога под этот шаг)
+                    llm_response_raw = self.llm.generate(self._llm_messages())
 
                     # 3. Парсим ответ LLM
                     response = self._parse_llm_response(llm_response_raw)
@@ -104,11 +120,7 @@ class DialogManager:
                     audio_output = self.tts.synthesize(response["answer"])
 
                     # 7. Сохраняем транскрипцию и логи
-                    self.transcript.append(TranscriptSegment(
-                        speaker="bot",
-                        text=response["answer"],
-                        timestamp=datetime.now()
-                    ))
+                    self._record_turn("bot", response["answer"])
 
                     # 8. Логируем
                     logger.info(f"Dialog step: {response['reasoning']}")
@@ -141,10 +153,11 @@ class DialogManager:
         self.stt.clear_buffer()
 
         # 3. Добавляем реплику клиента в историю
+        self._record_turn("client", client_text)
         self.history.append({"role": "user", "content": client_text})
 
         # 4. Получаем ответ от LLM
-        llm_response_raw = self.llm.generate(self.history)
+        llm_response_raw = self.llm.generate(self._llm_messages())
         response = self._parse_llm_response(llm_response_raw)
 
         # 5. Обновляем профиль
@@ -153,6 +166,7 @@ class DialogManager:
 
         # 6. Добавляем ответ в историю
         self.history.append({"role": "assistant", "content": response["answer"]})
+        self._record_turn("bot", response["answer"])
 
         # 7. Генерируем TTS
         audio_output = self.tts.synthesize(response["answer"])
@@ -162,6 +176,23 @@ class DialogManager:
 
         return response
 
+    def _record_turn(self, speaker: str, text: str):
+        """Добавляет реплику в транскрипт и сразу ставит её в очередь записи в БД (без ожидания)."""
+        segment = TranscriptSegment(speaker=speaker, text=text, timestamp=datetime.now())
+        self.transcript.append(segment)
+        self.db.append_turn(self.call_id, len(self.transcript), segment, getattr(self.profile, "client_id", None))
+
+    def _llm_messages(self) -> List[Dict[str, str]]:
+        """
+        Сообщения для LLM на текущем шаге: системный промпт, фрагменты каталога,
+        подобранные по последним репликам клиента, и история диалога.
+        Фрагменты каталога в историю не сохраняются — на следующем шаге подбираются заново.
+        """
+        kb_message = kb_system_message(self.kb, self.history)
+        if kb_message is None:
+            return self.history
+        return self.history[:1] + [kb_message] + self.history[1:]
+
     def _parse_llm_response(self, raw_response: str) -> LLMResponse:
         """
         Парсит сырой ответ LLM в строгий JSON-формат.
@@ -234,9 +265,14 @@ class DialogManager:
             "system_info": system_info or ""
         }
 
-    def save_call_data(self):
-        """Сохраняет полный диалог и профиль в БД."""
-        self.db.save_call(
+    async def save_call_data(self):
+        """
+        Завершает звонок в БД (через поток записи, не блокируя event loop).
+        Реплики уже записаны по ходу разговора — пишутся только клиент, строка звонка и JSON-дамп.
+        """
+        await self.db.save_call_data(
+            call_id=self.call_id,
+            transcript_saved=True,
             profile=self.profile,
             transcript=self.transcript,
             history=self.history
@@ -0,0 +1,222 @@
+"""
+База знаний о продукции для "Аси".
+
+Вместо того чтобы отправлять весь каталог (products_kb.md, ~42 КБ) в каждом
+запросе к LLM, каталог при старте режется на фрагменты "товар + раздел"
+(Описание, Преимущества, Технические характеристики), по ним строится
+индекс BM25 (чистый Python + NumPy). На каждом шаге диалога в отдельное
+системное сообщение попадают только несколько самых подходящих фрагментов
+в пределах бюджета токенов.
+"""
+
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Каталог продукции в Markdown
+KB_FILE_PATH = os.path.join(os.path.dirname(__file__), "data", "products_kb.md")
+
+# Параметры BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Сколько фрагментов и токенов каталога добавлять в контекст одного шага
+TOP_K = 4
+TOKEN_BUDGET = 800
+
+# Грубая оценка для русского текста: ~3 символа на токен
+CHARS_PER_TOKEN = 3
+
+# Слова длиннее обрезаются до основы: "базальтовый"/"базальтовая" -> "базаль"
+STEM_LENGTH = 6
+
+_WORD_RE = re.compile(r"[0-9a-zа-я]+")
+
+# Частые слова реплик клиента, не несущие смысла для поиска
+STOP_WORDS = {
+    "а", "в", "во", "и", "к", "на", "не", "о", "об", "от", "по", "с", "со", "у", "из", "за", "для", "до",
+    "что", "как", "это", "ли", "же", "бы", "мне", "вы", "вас", "вам", "я", "мы", "он", "она", "они",
+    "его", "ее", "их", "есть", "или", "но", "да", "нет", "так", "там", "тут", "какой", "какая", "какие",
+    "скажите", "подскажите", "пожалуйста", "здравствуйте", "хочу", "нужно", "нужен", "нужна", "можно",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительное число токенов текста (для бюджета контекста)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова в нижнем регистре (ё -> е) без стоп-слов, обрезанные до основы."""
+    words = _WORD_RE.findall(str(text).lower().replace("ё", "е"))
+    return [w[:STEM_LENGTH] for w in words if w not in STOP_WORDS]
+
+
+@dataclass
+class KBChunk:
+    """Фрагмент каталога: раздел одного товара."""
+    product: str
+    section: str
+    text: str
+
+    def render(self) -> str:
+        return f"### {self.product} — {self.section}\n{self.text}"
+
+
+def chunk_markdown(markdown: str) -> List[KBChunk]:
+    """
+    Режет каталог на фрагменты по товарам ("## ") и разделам ("### ").
+    Подразделы ("#### ") остаются внутри своего раздела.
+    """
+    chunks: List[KBChunk] = []
+    product, section, lines = None, None, []
+
+    def flush():
+        text = "\n".join(line for line in lines if line.strip() not in ("", "---")).strip()
+        if product and text:
+            chunks.append(KBChunk(product, section or "Общее", text))
+
+    for line in markdown.splitlines():
+        if line.startswith("## "):
+            flush()
+            # "## 3. Мат базальтовый прошивной ОБМ-50" -> без номера
+            product, section, lines = re.sub(r"^\d+\.\s*", "", line[3:].strip()), None, []
+        elif line.startswith("### "):
+            flush()
+            section, lines = line[4:].strip(), []
+        elif not line.startswith("# "):
+            lines.append(line)
+    flush()
+    return chunks
+
+
+class KnowledgeBase:
+    """BM25-поиск по фрагментам каталога и сборка контекста для LLM."""
+
+    def __init__(self, chunks: List[KBChunk], k1: float = BM25_K1, b: float = BM25_B):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+
+        # Название товара входит в текст фрагмента для поиска: "а какая плотность у ШБТ?"
+        docs = [tokenize(f"{c.product} {c.section} {c.text}") for c in chunks]
+        self._doc_len = np.array([len(d) for d in docs], dtype=np.float32)
+        self._avg_len = float(self._doc_len.mean()) if len(docs) else 0.0
+
+        # Для каждого термина: номера фрагментов и частоты в них
+        postings: Dict[str, Dict[int, int]] = {}
+        for doc_id, doc in enumerate(docs):
+            for term in doc:
+                tf = postings.setdefault(term, {})
+                tf[doc_id] = tf.get(doc_id, 0) + 1
+
+        n_docs = len(docs)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: Dict[str, float] = {}
+        for term, tf in postings.items():
+            self._postings[term] = (
+                np.fromiter(tf.keys(), dtype=np.int32, count=len(tf)),
+                np.fromiter(tf.values(), dtype=np.float32, count=len(tf)),
+            )
+            df = len(tf)
+            self._idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+        self.total_tokens = sum(estimate_tokens(c.render()) for c in chunks)
+        logger.info(
+            f"База знаний построена: {len(chunks)} фрагментов, {len(self._postings)} терминов, "
+            f"~{self.total_tokens} токенов в полном каталоге"
+        )
+
+    @classmethod
+    def from_file(cls, path: str = KB_FILE_PATH, **kwargs) -> "KnowledgeBase":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(chunk_markdown(f.read()), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query: str, top_k: int = TOP_K) -> List[Tuple[KBChunk, float]]:
+        """Фрагменты с наибольшим BM25 (только с ненулевым score)."""
+        if not self.chunks:
+            return []
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self._doc_len / self._avg_len)
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            doc_ids, tf = self._postings[term]
+            scores[doc_ids] += self._idf[term] * tf * (self.k1 + 1) / (tf + norm[doc_ids])
+
+        found = np.flatnonzero(scores)
+        if not len(found):
+            return []
+        best = found[np.argsort(-scores[found], kind="stable")[:top_k]]
+        return [(self.chunks[i], float(scores[i])) for i in best]
+
+    def build_context(self, query: str, top_k: int = TOP_K, token_budget: int = TOKEN_BUDGET) -> str:
+        """
+        Текст системного сообщения с фрагментами каталога для одного шага диалога.
+        Фрагменты, не влезающие в token_budget, пропускаются. Пустая строка —
+        если по запросу ничего не найдено.
+        """
+        parts, used = [], 0
+        for chunk, _ in self.search(query, top_k):
+            rendered = chunk.render()
+            tokens = estimate_tokens(rendered)
+            if used + tokens > token_budget:
+                continue
+            parts.append(rendered)
+            used += tokens
+        if not parts:
+            return ""
+        return "Справочная информация из каталога продукции (используй только её, если клиент спрашивает о товарах):\n\n" + "\n\n".join(parts)
+
+
+def kb_query_from_history(history: List[Dict[str, str]], turns: int = 2) -> str:
+    """Последние реплики клиента — запрос к базе знаний (учитывает уточнения вроде "а плотность?")."""
+    user_messages = [m.get("content", "") for m in history if m.get("role") == "user"]
+    return " ".join(user_messages[-turns:])
+
+
+def kb_system_message(kb: Optional[KnowledgeBase], history: List[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    """Системное сообщение с контекстом каталога для текущего шага или None."""
+    if kb is None:
+        return None
+    context = kb.build_context(kb_query_from_history(history))
+    return {"role": "system", "content": context} if context else None
+
+
+# --- Для отладки: экономия токенов и время поиска ---
+if __name__ == "__main__":
+    import time
+
+    kb = KnowledgeBase.from_file()
+    queries = [
+        "сколько стоит базальтовый шнур",
+        "какая плотность у прошивного мата",
+        "огнезащитная краска для металлоконструкций",
+        "нужны противопожарные подушки для кабельных проходок",
+        "цилиндры для труб",
+    ]
+    injected = []
+    for q in queries:
+        context = kb.build_context(q)
+        injected.append(estimate_tokens(context))
+        print(f"{q!r}: {[c.product + ' / ' + c.section for c, _ in kb.search(q)]}")
+
+    n = 2000
+    start = time.perf_counter()
+    for i in range(n):
+        kb.build_context(queries[i % len(queries)])
+    elapsed = (time.perf_counter() - start) / n * 1e6
+
+    avg = sum(injected) / len(injected)
+    print(f"Полный каталог: ~{kb.total_tokens} токенов, в среднем в контексте: ~{avg:.0f} "
+          f"(-{100 * (1 - avg / kb.total_tokens):.0f}%), поиск: {elapsed:.0f} мкс")
@@ -0,0 +1,124 @@
+"""
+Асинхронный фасад DatabaseManager для event loop FastAPI и ARI: чтения в пуле
+потоков, записи — через один поток GroupCommitWriter.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from src.database.db_manager import CallProfile, DatabaseManager, TranscriptSegment
+from src.database.group_commit import GroupCommitWriter
+
+logger = logging.getLogger(__name__)
+
+# Потоков для чтения: запросы короткие, больше не нужно
+READ_WORKERS = 4
+
+
+class AsyncDatabaseManager:
+    """
+    Те же методы, что у DatabaseManager, но awaitable: чтения — в пуле потоков,
+    записи — через GroupCommitWriter.
+    """
+
+    def __init__(self, db: DatabaseManager, read_workers: int = READ_WORKERS, **writer_kwargs):
+        """
+        Args:
+            db (DatabaseManager): Синхронный менеджер, который выполняет запросы.
+            read_workers (int): Потоков для чтения.
+            writer_kwargs: flush_interval / max_rows для GroupCommitWriter.
+        """
+        self.db = db
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-read")
+        self._writer = GroupCommitWriter(db.connections, **writer_kwargs)
+        self._writer.start()
+
+    async def _read(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(func, *args, **kwargs))
+
+    async def _write(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        return await asyncio.wrap_future(self._writer.submit(func, *args, **kwargs))
+
+    # --- Чтение ---
+
+    async def check_connection(self) -> bool:
+        return await self._read(self.db.ping)
+
+    async def find_client_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        return await self._read(self.db.find_client_by_phone, phone)
+
+    async def get_recent_calls_by_phone(self, phone: str, n: int = 3) -> List[Dict[str, Any]]:
+        return await self._read(self.db.get_recent_calls_by_phone, phone, n)
+
+    async def get_call_json(self, call_id: str) -> Optional[Dict[str, Any]]:
+        return await self._read(self.db.get_call_json, call_id)
+
+    async def get_recent_calls(self, client_id: str, n: int = 3) -> List[Dict[str, Any]]:
+        return await self._read(self.db.get_recent_calls, client_id, n)
+
+    async def get_product_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
+        return await self._read(self.db.get_product_by_id, product_id)
+
+    async def get_region_by_city(self, city: str, region_hint: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        return await self._read(self.db.get_region_by_city, city, region_hint)
+
+    async def get_region_names(self) -> Dict[str, str]:
+        return await self._read(self.db.get_region_names)
+
+    # --- Запись ---
+
+    def append_turn(self, call_id: str, turn: int, segment: TranscriptSegment, client_id: Optional[str] = None) -> Future:
+        """
+        Реплика звонка в очередь записи (одна строка call_transcripts, в группе с другими).
+        Не ждёт коммита: Future завершится, когда реплика будет записана.
+        """
+        return self._writer.submit_job(self.db.turn_write(call_id, turn, segment, client_id))
+
+    def attach_turns_client(self, call_id: str, client_id: str) -> Future:
+        """Проставляет client_id уже поставленным в очередь репликам звонка (после них по очереди)."""
+        return self._writer.submit_job(self.db.attach_turns_write(call_id, client_id))
+
+    async def save_call_data(self, profile: CallProfile, transcript: List[TranscriptSegment], history: List[Dict[str, str]],
+                             call_id: Optional[str] = None, transcript_saved: bool = False) -> str:
+        """Звонок попадает в ближайшую группу; await завершается после её коммита. Возвращает call_id."""
+        try:
+            job = self.db.build_call_write(profile, transcript, history, call_id, transcript_saved)
+            call_id = await asyncio.wrap_future(self._writer.submit_job(job))
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении звонка в базу: {e}", exc_info=True)
+            raise RuntimeError(f"Ошибка сохранения звонка в базу: {str(e)}")
+        logger.info(f"Звонок {call_id} успешно сохранён в базу.")
+        return call_id
+
+    async def update_client_profile(self, client_id: str, field: str, value: Any) -> bool:
+        return await self._write(self.db.update_client_profile, client_id, field, value)
+
+    def writer_metrics(self) -> Dict[str, Any]:
+        """Размер групп и задержка коммита потока записи."""
+        return self._writer.metrics.snapshot()
+
+    def close(self):
+        """Дожидается поставленных записей и останавливает потоки."""
+        self._writer.stop()
+        self._readers.shutdown(wait=True)
+
+
+_instances: Dict[str, AsyncDatabaseManager] = {}
+_instances_lock = threading.Lock()
+
+
+def get_async_db(db_path: str = "db/clients.db") -> AsyncDatabaseManager:
+    """Общий AsyncDatabaseManager процесса для файла базы (схема проверяется при первом вызове)."""
+    with _instances_lock:
+        instance = _instances.get(db_path)
+        if instance is None:
+            db = DatabaseManager(db_path)
+            # Звонки, оборванные до сохранения в прошлых запусках, — в историю клиентов
+            db.recover_unfinished_calls()
+            instance = _instances[db_path] = AsyncDatabaseManager(db)
+        return instance
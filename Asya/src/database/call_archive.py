@@ -0,0 +1,352 @@
+"""
+Архив JSON-дампов звонков: сегменты JSON lines с дозаписью и индекс call_id -> смещение в index.db.
+
+Миграция (из папки Asya):
+    python -m src.database.call_archive pack ../call_archive ../JSON ../call_data_*.json [--remove]
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.database.connection import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# Размер сегмента, после которого начинается новый (64 МиБ)
+MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+# Возраст сегмента, после которого начинается новый, секунды (час)
+MAX_SEGMENT_AGE = 3600.0
+# fsync после стольких звонков...
+SYNC_EVERY = 32
+# ...или не реже чем раз в столько секунд (проверяется при записи)
+SYNC_INTERVAL = 1.0
+
+INDEX_FILE = "index.db"
+SEGMENT_GLOB = "calls-*.jsonl"
+SEGMENT_RE = re.compile(r"^calls-(\d{6})-(\d{8}T\d{6})\.jsonl$")
+
+CREATE_INDEX_SQL = """
+CREATE TABLE IF NOT EXISTS archive_index (
+    call_id TEXT PRIMARY KEY,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+)
+"""
+INSERT_INDEX_SQL = "INSERT OR REPLACE INTO archive_index (call_id, segment, offset, length) VALUES (?, ?, ?, ?)"
+
+_IndexEntry = Tuple[str, str, int, int]
+
+
+def _segment_created(name: str) -> float:
+    """Время создания сегмента из имени файла (unix time)."""
+    match = SEGMENT_RE.match(name)
+    return datetime.strptime(match.group(2), "%Y%m%dT%H%M%S").timestamp() if match else 0.0
+
+
+def _encode_line(call_id: str, document: Dict[str, Any]) -> bytes:
+    if document.get("call_id") != call_id:
+        document = {**document, "call_id": call_id}
+    return (json.dumps(document, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class CallArchive:
+    """
+    Архив звонков в папке root_dir: сегменты *.jsonl и индекс index.db.
+    Писатель в папку архива должен быть один (один процесс); читать можно из любого потока.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        max_segment_bytes: int = MAX_SEGMENT_BYTES,
+        max_segment_age: float = MAX_SEGMENT_AGE,
+        sync_every: int = SYNC_EVERY,
+        sync_interval: float = SYNC_INTERVAL,
+    ):
+        """
+        Args:
+            root_dir (str): Папка архива (создаётся при необходимости).
+            max_segment_bytes (int): Размер сегмента, после которого начинается новый.
+            max_segment_age (float): Возраст сегмента, после которого начинается новый, секунды.
+            sync_every (int): Сколько звонков записывать между fsync.
+            sync_interval (float): Максимум секунд между fsync (проверяется при записи).
+        """
+        self.root_dir = root_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        os.makedirs(root_dir, exist_ok=True)
+        self.connections = ConnectionManager(os.path.join(root_dir, INDEX_FILE))
+        with self.connections.transaction() as conn:
+            conn.execute(CREATE_INDEX_SQL)
+
+        self._lock = threading.RLock()
+        self._file = None
+        self._segment: Optional[str] = None
+        self._segment_size = 0
+        self._segment_created = 0.0
+        self._sequence = 0
+        # Записано в сегмент, но ещё не в индексе (ждёт fsync)
+        self._pending: Dict[str, _IndexEntry] = {}
+        self._last_sync = time.monotonic()
+        self._recover()
+
+    # --- Сегменты ---
+
+    def segments(self) -> List[str]:
+        """Имена файлов сегментов по порядку."""
+        return sorted(
+            name for name in (os.path.basename(p) for p in glob.glob(os.path.join(self.root_dir, SEGMENT_GLOB)))
+            if SEGMENT_RE.match(name)
+        )
+
+    def _path(self, segment: str) -> str:
+        return os.path.join(self.root_dir, segment)
+
+    def _recover(self):
+        """Индексирует строки, дописанные после последнего коммита индекса, и открывает последний сегмент."""
+        segments = self.segments()
+        if not segments:
+            return
+        self._sequence = int(SEGMENT_RE.match(segments[-1]).group(1))
+        conn = self.connections.connection()
+        row = conn.execute(
+            "SELECT segment, MAX(offset + length) FROM archive_index "
+            "WHERE segment = (SELECT MAX(segment) FROM archive_index)"
+        ).fetchone()
+        last_segment, indexed_end = (row[0], row[1]) if row and row[0] else (None, 0)
+
+        recovered: List[_IndexEntry] = []
+        for segment in segments:
+            if last_segment is not None and segment < last_segment:
+                continue
+            start = indexed_end if segment == last_segment else 0
+            end = self._scan_tail(segment, start, recovered)
+            if end < os.path.getsize(self._path(segment)):
+                # Неполная строка после сбоя: обрезаем, иначе следующая запись склеится с ней
+                logger.warning(f"Архив звонков: обрезан неполный хвост {segment} с {end} байт")
+                with open(self._path(segment), "r+b") as f:
+                    f.truncate(end)
+        if recovered:
+            with self.connections.transaction() as conn:
+                conn.executemany(INSERT_INDEX_SQL, recovered)
+            logger.info(f"Архив звонков: переиндексировано {len(recovered)} записей после перезапуска")
+
+        last = segments[-1]
+        self._segment = last
+        self._segment_size = os.path.getsize(self._path(last))
+        self._segment_created = _segment_created(last)
+
+    def _scan_tail(self, segment: str, start: int, entries: List[_IndexEntry]) -> int:
+        """Добавляет в entries полные строки сегмента начиная со start; возвращает конец последней."""
+        offset = start
+        with open(self._path(segment), "rb") as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    call_id = json.loads(line)["call_id"]
+                except (ValueError, KeyError, TypeError):
+                    logger.error(f"Архив звонков: повреждённая строка {segment}:{offset}, пропущена")
+                else:
+                    entries.append((str(call_id), segment, offset, len(line)))
+                offset += len(line)
+        return offset
+
+    def _rotate_if_needed(self, incoming: int):
+        now = time.time()
+        if (
+            self._segment is not None
+            and self._segment_size > 0
+            and (self._segment_size + incoming > self.max_segment_bytes
+                 or now - self._segment_created >= self.max_segment_age)
+        ):
+            # Старый сегмент должен быть на диске до того, как индекс сошлётся на новый
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._segment = None
+        if self._segment is None:
+            self._sequence += 1
+            self._segment = f"calls-{self._sequence:06d}-{datetime.fromtimestamp(now):%Y%m%dT%H%M%S}.jsonl"
+            self._segment_size = 0
+            self._segment_created = now
+        if self._file is None:
+            self._file = open(self._path(self._segment), "ab")
+
+    # --- Запись ---
+
+    def append(self, call_id: str, document: Dict[str, Any]) -> Tuple[str, int]:
+        """
+        Дописывает звонок в текущий сегмент.
+
+        Запись видна get() сразу; на диске гарантированно — после ближайшего
+        пакетного fsync (sync_every / sync_interval) или flush().
+
+        Returns:
+            tuple: (сегмент, смещение) записи.
+        """
+        call_id = str(call_id)
+        line = _encode_line(call_id, document)
+        with self._lock:
+            self._rotate_if_needed(len(line))
+            offset = self._segment_size
+            self._file.write(line)
+            self._file.flush()
+            self._segment_size += len(line)
+            self._pending[call_id] = (call_id, self._segment, offset, len(line))
+            if len(self._pending) >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+            return self._segment, offset
+
+    def _sync(self):
+        """fsync сегмента, затем одна транзакция индекса для всех ожидающих записей."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        if self._pending:
+            with self.connections.transaction() as conn:
+                conn.executemany(INSERT_INDEX_SQL, list(self._pending.values()))
+            self._pending = {}
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        """Принудительный fsync и запись индекса."""
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        """flush() и закрытие сегмента и соединений индекса."""
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.connections.close_all()
+
+    # --- Чтение ---
+
+    def _locate(self, call_id: str) -> Optional[_IndexEntry]:
+        with self._lock:
+            entry = self._pending.get(call_id)
+        if entry is not None:
+            return entry
+        row = self.connections.connection().execute(
+            "SELECT call_id, segment, offset, length FROM archive_index WHERE call_id = ?", (call_id,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def __contains__(self, call_id: str) -> bool:
+        return self._locate(str(call_id)) is not None
+
+    def get(self, call_id: str) -> Optional[Dict[str, Any]]:
+        """JSON-дамп звонка или None: поиск в индексе и одно чтение по смещению."""
+        entry = self._locate(str(call_id))
+        if entry is None:
+            return None
+        _, segment, offset, length = entry
+        with open(self._path(segment), "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def count(self) -> int:
+        """Звонков в архиве (включая ещё не синхронизированные)."""
+        with self._lock:
+            pending = list(self._pending)
+        conn = self.connections.connection()
+        indexed = conn.execute("SELECT COUNT(*) FROM archive_index").fetchone()[0]
+        if not pending:
+            return indexed
+        placeholders = ", ".join("?" * len(pending))
+        already = conn.execute(
+            f"SELECT COUNT(*) FROM archive_index WHERE call_id IN ({placeholders})", pending
+        ).fetchone()[0]
+        return indexed + len(pending) - already
+
+
+# --- Разовая миграция отдельных файлов ---
+
+def _call_files(paths: Iterable[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.json"))))
+        else:
+            files.extend(sorted(glob.glob(path)) or [path])
+    return files
+
+
+def _call_id_from_filename(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem[len("call_data_"):] if stem.startswith("call_data_") else stem
+
+
+def pack_call_files(archive: CallArchive, paths: Iterable[str], remove: bool = False) -> Dict[str, int]:
+    """
+    Упаковывает отдельные JSON-файлы звонков в архив.
+
+    Args:
+        archive (CallArchive): Архив назначения.
+        paths: Файлы, маски или папки (из папки берутся *.json).
+        remove (bool): Удалить исходные файлы после fsync архива.
+
+    Returns:
+        dict: Счётчики packed / skipped (уже в архиве) / failed.
+    """
+    stats = {"packed": 0, "skipped": 0, "failed": 0}
+    packed_files = []
+    for path in _call_files(paths):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                document = json.load(f)
+            call_id = str(document.get("call_id") or _call_id_from_filename(path))
+        except (OSError, ValueError, AttributeError) as e:
+            logger.error(f"Архив звонков: не удалось прочитать {path}: {e}")
+            stats["failed"] += 1
+            continue
+        if call_id in archive:
+            stats["skipped"] += 1
+        else:
+            archive.append(call_id, document)
+            stats["packed"] += 1
+        packed_files.append(path)
+    archive.flush()
+    if remove:
+        for path in packed_files:
+            os.remove(path)
+    logger.info(f"Архив звонков: упаковано {stats['packed']}, пропущено {stats['skipped']}, ошибок {stats['failed']}")
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Архив JSON-дампов звонков")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack = commands.add_parser("pack", help="упаковать отдельные файлы звонков в архив")
+    pack.add_argument("archive_dir", help="папка архива")
+    pack.add_argument("paths", nargs="+", help="файлы, маски или папки с *.json")
+    pack.add_argument("--remove", action="store_true", help="удалить исходные файлы после упаковки")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    archive = CallArchive(args.archive_dir)
+    try:
+        stats = pack_call_files(archive, args.paths, remove=args.remove)
+    finally:
+        archive.close()
+    print(f"Упаковано: {stats['packed']}, уже в архиве: {stats['skipped']}, ошибок: {stats['failed']}")
+
+
+if __name__ == "__main__":
+    main()
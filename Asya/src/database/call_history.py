@@ -0,0 +1,104 @@
+"""
+История звонков клиента: индексы calls/call_transcripts и запросы последних
+и незавершённых звонков.
+"""
+
+import sqlite3
+from typing import Any, Dict, List
+
+CREATE_CALL_HISTORY_INDEXES_SQL = [
+    '''
+    CREATE INDEX IF NOT EXISTS idx_calls_client_timestamp
+        ON calls(client_id, timestamp, call_id, department, product_service, request_text, next_step)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_transcripts_call_segment ON call_transcripts(call_id, segment_id)
+    ''',
+]
+
+# Реплик в отрывке транскрипта и символов в одной реплике
+EXCERPT_SEGMENTS = 4
+EXCERPT_SEGMENT_CHARS = 200
+
+# Сводка звонка — request_text (как и last_call_summary в final_sql).
+# Реплики берутся в порядке записи (rowid): segment_id бывает "seg_10" < "seg_2".
+# {schema} — main или присоединённый архив месяца (src.database.partitions).
+RECENT_CALLS_SQL_TEMPLATE = '''
+    WITH recent AS (
+        SELECT call_id, timestamp, department, product_service, request_text, next_step
+        FROM {schema}.calls
+        WHERE client_id = :client_id
+        ORDER BY timestamp DESC
+        LIMIT :n
+    )
+    SELECT
+        r.call_id, r.timestamp, r.department, r.product_service,
+        r.request_text AS summary, r.next_step,
+        (
+            SELECT group_concat(line, char(10)) FROM (
+                SELECT t.speaker || ': ' || substr(t.text, 1, :chars) AS line
+                FROM {schema}.call_transcripts AS t
+                WHERE t.call_id = r.call_id
+                ORDER BY t.rowid
+                LIMIT :segments
+            )
+        ) AS transcript_excerpt
+    FROM recent AS r
+    ORDER BY r.timestamp DESC
+'''
+RECENT_CALLS_SQL = RECENT_CALLS_SQL_TEMPLATE.format(schema="main")
+
+
+def ensure_call_history_indexes(conn: sqlite3.Connection):
+    """Индексы истории звонков (идемпотентно). Коммит — на стороне вызывающего кода."""
+    for sql in CREATE_CALL_HISTORY_INDEXES_SQL:
+        conn.execute(sql)
+
+
+def fetch_recent_calls(
+    conn: sqlite3.Connection,
+    client_id: Any,
+    n: int = 3,
+    segments: int = EXCERPT_SEGMENTS,
+    schema: str = "main",
+) -> List[Dict[str, Any]]:
+    """
+    Последние n звонков клиента (новые первыми).
+    schema — база, в которой искать (main или присоединённый архив месяца).
+
+    Returns:
+        list: Словари call_id, timestamp, department, product_service, summary,
+            next_step, transcript_excerpt ("speaker: текст" построчно или None).
+    """
+    sql = RECENT_CALLS_SQL if schema == "main" else RECENT_CALLS_SQL_TEMPLATE.format(schema=schema)
+    cursor = conn.execute(
+        sql,
+        {"client_id": str(client_id), "n": n, "segments": segments, "chars": EXCERPT_SEGMENT_CHARS},
+    )
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+# Звонки, у которых есть реплики (записанные по ходу звонка), но нет строки в calls
+UNFINISHED_CALLS_SQL = '''
+    SELECT t.call_id, max(t.client_id) AS client_id, count(*) AS turns,
+           min(t.segment_time) AS started_at, max(t.segment_time) AS last_turn_at
+    FROM call_transcripts AS t
+    LEFT JOIN calls AS c ON c.call_id = t.call_id
+    WHERE c.call_id IS NULL
+    GROUP BY t.call_id
+    HAVING max(t.segment_time) < :before
+'''
+
+
+def fetch_unfinished_calls(conn: sqlite3.Connection, before: str) -> List[Dict[str, Any]]:
+    """
+    Звонки без записи в calls, последняя реплика которых раньше before (ISO-время):
+    процесс упал или звонок оборвался до сохранения.
+
+    Returns:
+        list: Словари call_id, client_id, turns, started_at, last_turn_at.
+    """
+    cursor = conn.execute(UNFINISHED_CALLS_SQL, {"before": before})
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
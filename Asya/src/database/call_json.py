@@ -0,0 +1,81 @@
+"""
+Компактный JSON-дамп звонка в jsons.json_blob: без отступов, сжатый zlib,
+транскрипция — ссылкой на call_transcripts.
+"""
+
+import json
+import sqlite3
+import zlib
+from typing import Any, Dict, List, Optional
+
+# Формат json_blob: zlib-сжатый компактный JSON, транскрипция — ссылкой
+COMPACT_JSON_FORMAT = "zlib+ref/1"
+TRANSCRIPT_REF = {"$ref": "call_transcripts"}
+COMPRESSION_LEVEL = 6
+
+COMPACT_JSON_COLUMNS = {"json_blob": "BLOB", "json_format": "TEXT"}
+
+
+def ensure_compact_json_columns(conn: sqlite3.Connection):
+    """Колонки json_blob и json_format в jsons (идемпотентно). Коммит — на стороне вызывающего кода."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(jsons)")}
+    for column, column_type in COMPACT_JSON_COLUMNS.items():
+        if column not in columns:
+            conn.execute(f"ALTER TABLE jsons ADD COLUMN {column} {column_type}")
+
+
+def encode_call_json(document: Dict[str, Any], transcript_by_ref: bool = True) -> bytes:
+    """
+    Компактный сжатый JSON звонка.
+
+    Args:
+        document (dict): JSON-дамп звонка (_build_call_json).
+        transcript_by_ref (bool): Транскрипция записана в call_transcripts
+            с теми же репликами — в дампе остаётся только ссылка.
+    """
+    if transcript_by_ref and "transcription" in document:
+        document = {**document, "transcription": TRANSCRIPT_REF}
+    payload = json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(payload.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def transcript_entries(rows) -> List[Dict[str, Any]]:
+    """Реплики в формате "transcription" дампа из строк (speaker, text, segment_time ISO)."""
+    return [
+        {"speaker": speaker, "text": text, "timestamp": (segment_time or "")[11:19]}
+        for speaker, text, segment_time in rows
+    ]
+
+
+def decode_call_json(blob: bytes, transcript: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Документ из json_blob. Если транскрипция хранится ссылкой, подставляется
+    transcript (реплики из call_transcripts, см. transcript_entries).
+    """
+    document = json.loads(zlib.decompress(blob).decode("utf-8"))
+    if document.get("transcription") == TRANSCRIPT_REF:
+        document["transcription"] = transcript if transcript is not None else []
+    return document
+
+
+def load_call_json(conn: sqlite3.Connection, call_id: str, schema: str = "main") -> Optional[Dict[str, Any]]:
+    """
+    Исходный JSON-дамп звонка (реплики — из call_transcripts в порядке записи).
+    Строки, сохранённые до компактного формата, читаются из json_data.
+    schema — main или присоединённый архив месяца (src.database.partitions).
+    """
+    row = conn.execute(
+        f"SELECT json_data, json_blob, json_format FROM {schema}.jsons WHERE call_id = ?", (str(call_id),)
+    ).fetchone()
+    if row is None:
+        return None
+    json_data, json_blob, json_format = row
+    if json_blob is None:
+        return json.loads(json_data) if json_data else None
+    if json_format != COMPACT_JSON_FORMAT:
+        raise ValueError(f"Неизвестный формат jsons.json_format: {json_format}")
+    transcript = transcript_entries(conn.execute(
+        f"SELECT speaker, text, segment_time FROM {schema}.call_transcripts WHERE call_id = ? ORDER BY rowid",
+        (str(call_id),),
+    ))
+    return decode_call_json(json_blob, transcript)
@@ -0,0 +1,436 @@
+"""
+Компилятор каталога: products.txt -> таблица products, products_kb.md и векторный индекс.
+Колонки, заполняемые вручную (department, weight_priority), не перезаписываются.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.asya_core.knowledge_base import KB_FILE_PATH
+from src.database.cities_loader import bump_data_version, get_data_version
+from src.utils.product_vectors import ProductVectorIndex
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_TABLE = "products"
+
+# Векторный индекс товаров (тот же путь, что читает final_sql.py)
+VECTORS_FILE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "product_vectors.npz"
+)
+
+# Колонки products, которые пишет компилятор (добавляются, если их нет)
+CATALOG_COLUMNS = {
+    "description": "TEXT",
+    "technical_specs": "TEXT",  # JSON-объект {характеристика: значение}
+    "price": "TEXT",
+    "url": "TEXT",
+    "content_hash": "TEXT",
+}
+
+_PRODUCT_SEPARATOR_RE = re.compile(r"={3,}PRODUCT={3,}")
+_TITLE_RE = re.compile(r"^\d*\.?\s*(.+)$")
+_URL_RE = re.compile(r"https?://\S+")
+_PHONE_RE = re.compile(r"\+7\s*\(\d{3}\)\s*\d{3}-\d{2}-\d{2}")
+_SPEC_TABLE_RE = re.compile(r"^\|\s*([^|]+?)\s*\|\s*([^|]+?)\s*\|$")
+_SPEC_LINE_RE = re.compile(r"^([А-ЯЁA-Z][^:|]{1,60}):\s*(\S.{0,80})$")
+_PRICE_RE = re.compile(
+    r"(?:цена|стоимость)\D{0,30}?(\d[\d\u00a0 ]*(?:[.,]\d+)?)\s*(?:руб|₽)", re.IGNORECASE
+)
+_ARCHIVED_RE = re.compile(
+    r"снят\w* с производства|товар в архиве|архивн\w* товар|нет в продаже", re.IGNORECASE
+)
+
+# Пункты меню и подвала сайта, попадающие в выгрузку отдельными строками
+NAV_LINES = {
+    "Продукция", "Огнезащита", "ОгнезащитаВоздуховодовМеталлоконструкцийМастика", "Воздуховодов",
+    "Металлоконструкций", "Мастика", "Услуги", "Поддержка", "Блог", "Поиск", "Производство", "Объекты",
+    "Огнезащита металлоконструкций", "Огнезащита воздуховодов", "Тепло- и звукоизоляция",
+    "Нефтегазовая отрасль", "Энергетика", "Судостроение", "Частное домостроение", "Проектировщикам",
+    "Монтажникам", "Снабженцам", "Нормативные документы",
+}
+FOOTER_PREFIXES = ("Полезные статьи", "Применяемые на данном интернет-сайте")
+
+# Вкладки карточки товара (заголовки без своего текста)
+TAB_HEADERS = ("Описание", "Преимущества", "Технические характеристики", "Инструкция")
+INSTRUCTION_HEADING = "Инструкция"
+OZON_MARK = "Купить на OZON"
+
+# Строка не короче — абзац текста, короче — заголовок, сертификат или пункт меню
+MIN_TEXT_LENGTH = 80
+
+
+@dataclass
+class CatalogProduct:
+    """Структурная запись товара из products.txt."""
+    name: str
+    url: str = ""
+    slang_names: List[str] = field(default_factory=list)
+    specs: Dict[str, str] = field(default_factory=dict)
+    price: Optional[float] = None
+    is_archived: bool = False
+    description: str = ""
+    advantages: List[Tuple[str, str]] = field(default_factory=list)  # (заголовок, текст)
+    instruction: str = ""
+    certificates: List[str] = field(default_factory=list)
+
+    @property
+    def content_hash(self) -> str:
+        """Хэш всего содержимого записи: меняется — товар нужно перезаписать."""
+        payload = json.dumps(asdict(self), ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def to_markdown(self, number: int) -> str:
+        """Товар в формате products_kb.md (разделы "### " режет chunk_markdown)."""
+        parts = [f"## {number}. {self.name}\n"]
+        if self.description:
+            parts.append(f"### Описание\n{self.description}\n")
+        if self.advantages:
+            parts.append("### Преимущества\n")
+            for heading, text in self.advantages:
+                parts.append(f"#### {heading}\n{text}\n" if heading else f"{text}\n")
+        specs = dict(self.specs)
+        if self.price is not None and not any(key.lower().startswith(("цена", "стоимость")) for key in specs):
+            specs["Цена, руб."] = f"{self.price:g}"
+        if specs:
+            rows = "\n".join(f"| {key} | {value} |" for key, value in specs.items())
+            parts.append(f"### Технические характеристики\n\n| Параметр | Значение |\n| --- | --- |\n{rows}\n")
+        if self.instruction:
+            parts.append(f"### {INSTRUCTION_HEADING}\n{self.instruction}\n")
+        if self.certificates:
+            parts.append("### Сертификаты\n" + "\n".join(f"- {c}" for c in self.certificates) + "\n")
+        parts.append("---\n")
+        return "\n".join(parts)
+
+
+def derive_slang_names(name: str) -> List[str]:
+    """
+    Варианты названия, которыми товар называют по телефону: артикул в конце
+    названия ("ШБТ", "ОБМ-50" и "ОБМ 50") и название без артикула.
+    """
+    words = name.split()
+    code_start = len(words)
+    while code_start > 0 and words[code_start - 1].isupper() and len(words[code_start - 1]) > 1:
+        code_start -= 1
+    if code_start == len(words):
+        return []
+    code = " ".join(words[code_start:])
+    slang = [code]
+    if "-" in code:
+        slang.append(code.replace("-", " "))
+    if code_start >= 2:
+        slang.append(" ".join(words[:code_start]))
+    return slang
+
+
+def parse_price(text: str) -> Optional[float]:
+    match = _PRICE_RE.search(text)
+    if not match:
+        return None
+    try:
+        return float(re.sub(r"[\s\u00a0]", "", match.group(1)).replace(",", "."))
+    except ValueError:
+        return None
+
+
+def _parse_spec(line: str) -> Optional[Tuple[str, str]]:
+    """Характеристика из строки таблицы "| ключ | значение |" или "Ключ: значение"."""
+    match = _SPEC_TABLE_RE.match(line)
+    if match:
+        key, value = match.groups()
+        if key == "Параметр" or set(key) <= set("-: "):
+            return None
+        return key, value
+    if len(line) < MIN_TEXT_LENGTH:
+        match = _SPEC_LINE_RE.match(line)
+        if match:
+            return match.group(1).strip(), match.group(2).strip()
+    return None
+
+
+def _strip_menu_prefix(line: str) -> str:
+    """Меню сайта склеено с первым абзацем: "Мастика Шнур теплоизоляционный ..." -> "Шнур ..."."""
+    for prefix in sorted(NAV_LINES | set(TAB_HEADERS), key=len, reverse=True):
+        if line.startswith(prefix + " "):
+            return line[len(prefix) + 1:]
+    return line
+
+
+def parse_product_block(block: str) -> Optional[CatalogProduct]:
+    """Разбирает один блок ===PRODUCT===; None — если в блоке нет названия."""
+    lines = [line.strip() for line in block.strip().splitlines()]
+    if not lines or not lines[0]:
+        return None
+    name = _TITLE_RE.match(lines[0]).group(1).strip()
+    url_match = _URL_RE.search(block)
+    product = CatalogProduct(
+        name=name,
+        url=url_match.group(0) if url_match else "",
+        slang_names=derive_slang_names(name),
+        is_archived=bool(_ARCHIVED_RE.search(block)),
+    )
+
+    body: List[str] = []
+    for line in lines[1:]:
+        if not line or line in NAV_LINES or _URL_RE.fullmatch(line) or _PHONE_RE.search(line):
+            continue
+        if line.startswith(FOOTER_PREFIXES):
+            break
+        if len(line) >= MIN_TEXT_LENGTH:
+            line = _strip_menu_prefix(line)
+        body.append(line)
+
+    # Выгрузка повторяет вкладки карточки дважды: одинаковые абзацы пропускаются
+    seen_texts: List[str] = []
+    certificates: List[str] = []
+    heading: Optional[str] = None
+    for line in body:
+        spec = _parse_spec(line)
+        if spec:
+            product.specs.setdefault(*spec)
+            continue
+        if len(line) < MIN_TEXT_LENGTH:
+            # Короткая строка без абзаца после неё — сертификат (или пустая вкладка)
+            if heading is not None and heading not in TAB_HEADERS:
+                certificates.append(heading)
+            heading = line
+            continue
+
+        text = line.split(OZON_MARK)[0].strip()
+        if not any(text in seen or seen in text for seen in seen_texts):
+            seen_texts.append(text)
+            if heading == INSTRUCTION_HEADING:
+                product.instruction = text
+            elif not product.description and heading is None:
+                product.description = text
+            else:
+                product.advantages.append((heading if heading not in TAB_HEADERS else "", text))
+        heading = None
+    if heading is not None and heading not in TAB_HEADERS:
+        certificates.append(heading)
+
+    product.certificates = list(dict.fromkeys(certificates))
+    product.price = parse_price(block)
+    return product
+
+
+def parse_products_txt(text: str) -> List[CatalogProduct]:
+    """Все товары выгрузки; повторы одного названия — первый блок."""
+    products: Dict[str, CatalogProduct] = {}
+    for block in _PRODUCT_SEPARATOR_RE.split(text):
+        product = parse_product_block(block) if block.strip() else None
+        if product is not None:
+            products.setdefault(product.name, product)
+    return list(products.values())
+
+
+def render_kb_markdown(products: Sequence[CatalogProduct]) -> str:
+    """Файл базы знаний из действующих (не архивных) товаров."""
+    active = [p for p in products if not p.is_archived]
+    return "# Продукты компании\n\n" + "\n".join(p.to_markdown(i) for i, p in enumerate(active, 1))
+
+
+def ensure_catalog_columns(conn: sqlite3.Connection):
+    """Добавляет в products недостающие колонки CATALOG_COLUMNS (схемы db_create.py и DatabaseManager различаются)."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({PRODUCTS_TABLE})")}
+    if not existing:
+        raise ValueError(f"Таблица {PRODUCTS_TABLE} не найдена")
+    for column, column_type in CATALOG_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {PRODUCTS_TABLE} ADD COLUMN {column} {column_type}")
+
+
+def _merge_slang(existing: Any, compiled: List[str]) -> str:
+    """Сленговые названия из выгрузки плюс добавленные вручную (без повторов)."""
+    manual = [s.strip() for s in str(existing or "").split(",") if s.strip()]
+    return ",".join(dict.fromkeys(compiled + manual))
+
+
+def _write_atomic(path: str, write):
+    """Пишет во временный файл рядом с path и подменяет path целиком."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # np.savez дописывает .npz к имени без этого расширения
+    tmp_path = os.path.join(directory, f".tmp-{uuid.uuid4().hex}{os.path.splitext(path)[1]}")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_text(path: str, text: str):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    _write_atomic(path, write)
+
+
+def upsert_products(conn: sqlite3.Connection, products: Sequence[CatalogProduct]) -> Dict[str, int]:
+    """
+    Пакетно записывает товары в products одной транзакцией.
+
+    Новые названия вставляются, изменившиеся (другой content_hash) обновляются,
+    остальные не трогаются. Товары, ранее записанные компилятором и пропавшие
+    из выгрузки, помечаются архивными (хэш сбрасывается, чтобы при возвращении
+    в выгрузку товар снова стал действующим).
+
+    Returns:
+        dict: inserted, updated, unchanged, archived, version — версия "products" в data_versions.
+    """
+    ensure_catalog_columns(conn)
+    pk_type = next(
+        (row[2] for row in conn.execute(f"PRAGMA table_info({PRODUCTS_TABLE})") if row[5]), ""
+    ).upper()
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        existing = {
+            name: (product_id, slang, content_hash)
+            for product_id, name, slang, content_hash in conn.execute(
+                f"SELECT product_id, official_name, slang_name, content_hash FROM {PRODUCTS_TABLE} "
+                f"WHERE official_name IS NOT NULL ORDER BY rowid DESC"
+            )
+        }
+
+        inserts, updates = [], []
+        for product in products:
+            content_hash = product.content_hash
+            values = (
+                product.description,
+                json.dumps(product.specs, ensure_ascii=False),
+                None if product.price is None else f"{product.price:g}",
+                product.url,
+                product.is_archived,
+                content_hash,
+            )
+            if product.name not in existing:
+                slang = _merge_slang("", product.slang_names)
+                inserts.append((product.name, slang) + values)
+                continue
+            product_id, old_slang, old_hash = existing[product.name]
+            if old_hash != content_hash:
+                updates.append((_merge_slang(old_slang, product.slang_names),) + values + (product_id,))
+
+        columns = "official_name, slang_name, description, technical_specs, price, url, is_archived, content_hash"
+        if pk_type == "INTEGER":
+            conn.executemany(
+                f"INSERT INTO {PRODUCTS_TABLE} ({columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", inserts
+            )
+        else:
+            # product_id TEXT (схема DatabaseManager) сам не заполняется
+            conn.executemany(
+                f"INSERT INTO {PRODUCTS_TABLE} (product_id, {columns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(str(uuid.uuid4()),) + row for row in inserts],
+            )
+        conn.executemany(f'''
+            UPDATE {PRODUCTS_TABLE}
+            SET slang_name = ?, description = ?, technical_specs = ?, price = ?, url = ?,
+                is_archived = ?, content_hash = ?
+            WHERE product_id = ?
+        ''', updates)
+
+        names = {p.name for p in products}
+        gone = [
+            (product_id,) for name, (product_id, _, content_hash) in existing.items()
+            if content_hash is not None and name not in names
+        ]
+        archived = 0
+        if gone:
+            before = conn.total_changes
+            conn.executemany(
+                f"UPDATE {PRODUCTS_TABLE} SET is_archived = 1, content_hash = NULL "
+                f"WHERE product_id = ? AND NOT COALESCE(is_archived, 0)",
+                gone,
+            )
+            archived = conn.total_changes - before
+
+        if inserts or updates or archived:
+            version = bump_data_version(conn, PRODUCTS_TABLE)
+        else:
+            version = get_data_version(conn, PRODUCTS_TABLE)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "unchanged": len(products) - len(inserts) - len(updates),
+        "archived": archived,
+        "version": version,
+    }
+
+
+def load_product_rows(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Строки products в виде словарей (для векторного индекса)."""
+    cursor = conn.execute(f"SELECT * FROM {PRODUCTS_TABLE}")
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def compile_catalog(
+    conn: sqlite3.Connection,
+    text: str,
+    kb_path: Optional[str] = KB_FILE_PATH,
+    vectors_path: Optional[str] = VECTORS_FILE_PATH,
+    force: bool = False,
+) -> Dict[str, int]:
+    """
+    Полный шаг компиляции выгрузки сайта.
+
+    Args:
+        conn: Соединение с clients.db.
+        text: Содержимое products.txt.
+        kb_path: Куда выпустить products_kb.md (None — не выпускать).
+        vectors_path: Куда сохранить векторный индекс (None — не сохранять).
+        force: Перевыпустить файлы, даже если товары не изменились.
+
+    Returns:
+        dict: parsed — разобрано товаров, плюс счётчики upsert_products.
+    """
+    products = parse_products_txt(text)
+    if not products:
+        raise ValueError("В выгрузке не найдено ни одного товара")
+    result = {"parsed": len(products), **upsert_products(conn, products)}
+    changed = force or result["inserted"] or result["updated"] or result["archived"]
+
+    if kb_path and (changed or not os.path.exists(kb_path)):
+        _write_text(kb_path, render_kb_markdown(products))
+        logger.info(f"База знаний выпущена: {kb_path}")
+    if vectors_path and (changed or not os.path.exists(vectors_path)):
+        index = ProductVectorIndex.build(load_product_rows(conn))
+        _write_atomic(vectors_path, index.save)
+        logger.info(f"Векторный индекс сохранён: {vectors_path}")
+
+    logger.info(
+        f"Каталог скомпилирован: {result['parsed']} товаров, новых {result['inserted']}, "
+        f"изменённых {result['updated']}, в архив {result['archived']}, версия {result['version']}"
+    )
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Использование: python -m src.database.catalog_compiler products.txt clients.db [--force]")
+        sys.exit(1)
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        source = f.read()
+    db = sqlite3.connect(sys.argv[2])
+    try:
+        stats = compile_catalog(db, source, force="--force" in sys.argv[3:])
+    finally:
+        db.close()
+    print(f"✅ Товаров: {stats['parsed']}, новых: {stats['inserted']}, изменённых: {stats['updated']}, "
+          f"без изменений: {stats['unchanged']}, в архив: {stats['archived']} (версия каталога {stats['version']})")
@@ -0,0 +1,234 @@
+"""
+Атомарная перезагрузка cities_map (теневая таблица и RENAME) и горячая замена
+индекса городов в процессе диалога.
+"""
+
+import csv
+import logging
+import re
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.database.city_aliases import rebuild_city_aliases
+from src.database.connection import get_connection_manager
+from src.utils.city_index import CityIndex, set_city_index
+
+logger = logging.getLogger(__name__)
+
+CITIES_TABLE = "cities_map"
+SHADOW_TABLE = "cities_map_new"
+OLD_TABLE = "cities_map_old"
+
+# Новая таблица не может быть меньше этой доли старой (защита от обрезанного CSV)
+MIN_ROWS_RATIO = 0.5
+
+# Как часто процесс диалога проверяет версию справочника (секунды)
+RELOAD_INTERVAL = 5.0
+
+CREATE_DATA_VERSIONS_SQL = '''
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+CITY_COLUMNS = ("city_name", "region_code", "region_name", "is_duplicate", "aliases", "phone_route_code")
+
+CityRow = Tuple[str, str, str, bool, str, str]
+
+
+def read_cities_csv(csv_file_path: str) -> List[CityRow]:
+    """Читает _Cities_maps_.csv в кортежи колонок CITY_COLUMNS."""
+    rows: List[CityRow] = []
+    with open(csv_file_path, "r", encoding="utf-8-sig") as csvfile:
+        for row in csv.DictReader(csvfile):
+            is_duplicate = (row.get("is_duplicate") or "0").strip().upper() in ("1", "TRUE")
+            rows.append((
+                (row.get("city_name") or "").strip(),
+                (row.get("region_code") or "").strip(),
+                (row.get("region_name") or "").strip(),
+                is_duplicate,
+                (row.get("aliases") or "").strip(),  # JSON-строка
+                (row.get("phone_route_code") or "").strip(),
+            ))
+    return rows
+
+
+def get_data_version(conn: sqlite3.Connection, name: str = CITIES_TABLE) -> int:
+    """Текущая версия справочника (0, если он ещё ни разу не перезагружался)."""
+    conn.execute(CREATE_DATA_VERSIONS_SQL)
+    row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def bump_data_version(conn: sqlite3.Connection, name: str) -> int:
+    """Увеличивает версию справочника name в data_versions (в транзакции вызывающего кода)."""
+    conn.execute(CREATE_DATA_VERSIONS_SQL)
+    conn.execute('''
+        INSERT INTO data_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    ''', (name,))
+    return get_data_version(conn, name)
+
+
+def validate_cities(conn: sqlite3.Connection, table: str, old_count: int,
+                    min_ratio: float = MIN_ROWS_RATIO) -> int:
+    """
+    Проверяет заполненную теневую таблицу.
+
+    Raises:
+        ValueError: Таблица пустая, заметно меньше старой или содержит строки
+            без названия города / кода региона.
+
+    Returns:
+        int: Количество строк.
+    """
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    if count == 0:
+        raise ValueError("Новый справочник городов пуст")
+    if count < old_count * min_ratio:
+        raise ValueError(f"Новый справочник городов слишком мал: {count} строк вместо {old_count}")
+    broken = conn.execute(f'''
+        SELECT COUNT(*) FROM {table}
+        WHERE TRIM(COALESCE(city_name, '')) = '' OR TRIM(COALESCE(region_code, '')) = ''
+    ''').fetchone()[0]
+    if broken:
+        raise ValueError(f"В новом справочнике {broken} строк без города или кода региона")
+    return count
+
+
+def _table_schema(conn: sqlite3.Connection, table: str) -> Tuple[str, List[str]]:
+    """SQL создания таблицы и её индексов из sqlite_master."""
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    if row is None:
+        raise ValueError(f"Таблица {table} не найдена")
+    indexes = [
+        sql for (sql,) in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+        )
+    ]
+    return row[0], indexes
+
+
+def swap_cities_map(conn: sqlite3.Connection, rows: Sequence[CityRow],
+                    min_ratio: float = MIN_ROWS_RATIO) -> Dict[str, int]:
+    """
+    Загружает строки в теневую таблицу и одной транзакцией подменяет ею cities_map.
+
+    Читатели до коммита видят старую таблицу целиком, после — новую целиком.
+    При ошибке валидации транзакция откатывается и cities_map не меняется.
+
+    Returns:
+        dict: cities — число городов, aliases — число алиасов, version — новая версия справочника.
+    """
+    create_sql, index_sqls = _table_schema(conn, CITIES_TABLE)
+    shadow_sql = re.sub(
+        r"^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?[\"'`\[]?" + CITIES_TABLE + r"[\"'`\]]?",
+        f"CREATE TABLE {SHADOW_TABLE}", create_sql, count=1, flags=re.IGNORECASE,
+    )
+
+    # Без legacy-режима RENAME переписал бы ссылки на cities_map в триггерах
+    # clients_info и внешних ключах city_aliases на cities_map_old
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old_count = conn.execute(f"SELECT COUNT(*) FROM {CITIES_TABLE}").fetchone()[0]
+            conn.execute(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+            conn.execute(shadow_sql)
+            conn.executemany(
+                f"INSERT INTO {SHADOW_TABLE} ({', '.join(CITY_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            count = validate_cities(conn, SHADOW_TABLE, old_count, min_ratio)
+
+            conn.execute(f"ALTER TABLE {CITIES_TABLE} RENAME TO {OLD_TABLE}")
+            conn.execute(f"ALTER TABLE {SHADOW_TABLE} RENAME TO {CITIES_TABLE}")
+            conn.execute(f"DROP TABLE {OLD_TABLE}")
+            for index_sql in index_sqls:
+                conn.execute(index_sql)
+
+            aliases_count = rebuild_city_aliases(conn)
+            version = bump_data_version(conn, CITIES_TABLE)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+
+    logger.info(f"cities_map заменена: {count} городов, {aliases_count} алиасов, версия {version}")
+    return {"cities": count, "aliases": aliases_count, "version": version}
+
+
+def load_city_rows(conn: sqlite3.Connection, table: str = CITIES_TABLE) -> List[Dict[str, Any]]:
+    """Строки cities_map в виде словарей (для CityIndex и дерева телефонных префиксов)."""
+    cursor = conn.execute(f"SELECT * FROM {table}")
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _default_on_reload(rows: List[Dict[str, Any]]):
+    set_city_index(CityIndex(rows))
+
+
+class CitiesReloader(threading.Thread):
+    """
+    Фоновый поток процесса диалога: следит за версией cities_map в data_versions
+    и при её изменении перечитывает справочник.
+
+    Новый индекс строится в этом потоке, а диалог продолжает пользоваться
+    старым; on_reload лишь подменяет ссылки (присваивание атомарно).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        on_reload: Callable[[List[Dict[str, Any]]], None] = _default_on_reload,
+        interval: float = RELOAD_INTERVAL,
+        version: Optional[int] = None,
+    ):
+        """
+        Args:
+            db_path: Путь к clients.db.
+            on_reload: Что сделать со строками нового справочника
+                (по умолчанию — set_city_index(CityIndex(rows))).
+            interval: Период проверки версии в секундах.
+            version: Версия уже загруженных данных; None — прочитать текущую из БД.
+        """
+        super().__init__(name="CitiesReloader", daemon=True)
+        self.db_path = db_path
+        self.on_reload = on_reload
+        self.interval = interval
+        self._stop_event = threading.Event()
+        # Проверка версии раз в interval секунд — на долгоживущем соединении потока
+        self._connections = get_connection_manager(db_path)
+        if version is None:
+            version = get_data_version(self._connections.connection())
+        self.version = version
+
+    def check(self) -> bool:
+        """Одна проверка версии. Возвращает True, если справочник был перезагружен."""
+        conn = self._connections.connection()
+        version = get_data_version(conn)
+        if version == self.version:
+            return False
+        rows = load_city_rows(conn)
+        self.on_reload(rows)
+        self.version = version
+        logger.info(f"Справочник городов перезагружен: версия {version}, {len(rows)} городов")
+        return True
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Ошибка при перезагрузке справочника городов: {e}")
+
+    def stop(self):
+        self._stop_event.set()
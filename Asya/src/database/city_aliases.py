@@ -0,0 +1,110 @@
+"""
+Нормализованная таблица алиасов городов и триггеры региона на её основе.
+
+city_aliases(alias_lower PRIMARY KEY, city_id) содержит названия городов и
+все их алиасы в нижнем регистре (плюс вариант с "е" вместо "ё"). Триггеры
+clients_info находят регион одним поиском по первичному ключу вместо
+LOWER() по всем строкам cities_map и разбора aliases через json_each.
+
+Таблицу заполняют загрузчики cities_map (updated_cities.py, csv_db.py)
+через rebuild_city_aliases().
+"""
+
+import logging
+import sqlite3
+from typing import List, Tuple
+
+from src.utils.city_index import normalize_city_key, parse_aliases
+
+logger = logging.getLogger(__name__)
+
+CREATE_CITY_ALIASES_SQL = '''
+    CREATE TABLE IF NOT EXISTS city_aliases (
+        alias_lower TEXT PRIMARY KEY,
+        city_id INTEGER NOT NULL,
+        FOREIGN KEY (city_id) REFERENCES cities_map(city_id)
+    ) WITHOUT ROWID
+'''
+
+# SQLite LOWER() приводит к нижнему регистру только латиницу, поэтому
+# алиасы хранятся уже в нижнем регистре, а в clients_info пишется
+# каноническое название из cities_map (resolve_city).
+REGION_TRIGGERS_SQL = [
+    '''
+    CREATE TRIGGER update_region_from_city
+    AFTER INSERT ON clients_info
+    FOR EACH ROW
+    WHEN NEW.city_name IS NOT NULL AND NEW.city_name != ''
+    BEGIN
+        UPDATE clients_info
+        SET region_code = c.region_code,
+            region_name = c.region_name
+        FROM city_aliases AS a
+        JOIN cities_map AS c ON c.city_id = a.city_id
+        WHERE a.alias_lower = LOWER(TRIM(NEW.city_name))
+          AND clients_info.rowid = NEW.rowid;
+    END;
+    ''',
+    '''
+    CREATE TRIGGER update_region_on_update
+    AFTER UPDATE OF city_name ON clients_info
+    FOR EACH ROW
+    WHEN NEW.city_name IS NOT NULL AND NEW.city_name != ''
+    BEGIN
+        UPDATE clients_info
+        SET region_code = c.region_code,
+            region_name = c.region_name
+        FROM city_aliases AS a
+        JOIN cities_map AS c ON c.city_id = a.city_id
+        WHERE a.alias_lower = LOWER(TRIM(NEW.city_name))
+          AND clients_info.rowid = NEW.rowid;
+    END;
+    ''',
+]
+
+
+def build_alias_rows(cities: List[Tuple[int, str, str]]) -> List[Tuple[str, int]]:
+    """
+    Строит пары (alias_lower, city_id) из строк (city_id, city_name, aliases).
+
+    Порядок важен: при совпадении ключей выигрывает первый город (как LIMIT 1
+    в старых триггерах), а точные написания имеют приоритет над вариантами
+    с заменой "ё" на "е".
+    """
+    exact, folded = [], []
+    for city_id, city_name, aliases in cities:
+        if not city_name or not str(city_name).strip():
+            continue
+        for term in [str(city_name).strip().lower()] + parse_aliases(aliases):
+            exact.append((term, city_id))
+            folded.append((normalize_city_key(term), city_id))
+    return exact + folded
+
+
+def rebuild_city_aliases(conn: sqlite3.Connection) -> int:
+    """
+    Перестраивает city_aliases по текущему содержимому cities_map.
+    Коммит — на стороне вызывающего кода (в той же транзакции, что и загрузка городов).
+
+    Returns:
+        int: Количество записей в city_aliases.
+    """
+    conn.execute(CREATE_CITY_ALIASES_SQL)
+    conn.execute("DELETE FROM city_aliases")
+    cities = conn.execute("SELECT city_id, city_name, aliases FROM cities_map ORDER BY city_id").fetchall()
+    conn.executemany(
+        "INSERT OR IGNORE INTO city_aliases (alias_lower, city_id) VALUES (?, ?)",
+        build_alias_rows(cities),
+    )
+    count = conn.execute("SELECT COUNT(*) FROM city_aliases").fetchone()[0]
+    logger.info(f"city_aliases перестроена: {count} записей для {len(cities)} городов")
+    return count
+
+
+def install_region_triggers(conn: sqlite3.Connection):
+    """Пересоздаёт триггеры update_region_from_city / update_region_on_update."""
+    conn.execute(CREATE_CITY_ALIASES_SQL)
+    conn.execute("DROP TRIGGER IF EXISTS update_region_from_city")
+    conn.execute("DROP TRIGGER IF EXISTS update_region_on_update")
+    for sql in REGION_TRIGGERS_SQL:
+        conn.execute(sql)
@@ -0,0 +1,161 @@
+"""
+Клиенты в памяти процесса диалога с обновлением по записи (write-through)
+и версиями изменений в data_versions.
+"""
+
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from src.database.cities_loader import CREATE_DATA_VERSIONS_SQL, bump_data_version, get_data_version
+from src.utils.validation import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+CLIENTS_DATA_VERSION = "clients"
+
+CREATE_CHANGE_VERSION_INDEX_SQL = '''
+    CREATE INDEX IF NOT EXISTS idx_clients_change_version ON clients_info(change_version)
+'''
+
+
+def ensure_change_tracking(conn: sqlite3.Connection):
+    """Колонка clients_info.change_version с индексом и таблица data_versions (идемпотентно)."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(clients_info)")}
+    if "change_version" not in columns:
+        conn.execute("ALTER TABLE clients_info ADD COLUMN change_version INTEGER DEFAULT 0")
+    conn.execute(CREATE_CHANGE_VERSION_INDEX_SQL)
+    conn.execute(CREATE_DATA_VERSIONS_SQL)
+
+
+def mark_client_changed(conn: sqlite3.Connection, client_id: Any) -> int:
+    """
+    Отмечает изменение клиента в транзакции вызывающего кода (до коммита).
+
+    Returns:
+        int: Новая версия "clients".
+    """
+    version = bump_data_version(conn, CLIENTS_DATA_VERSION)
+    conn.execute("UPDATE clients_info SET change_version = ? WHERE client_id = ?", (version, str(client_id)))
+    return version
+
+
+def mark_clients_changed(conn: sqlite3.Connection, client_ids: Iterable[Any]) -> int:
+    """
+    Как mark_client_changed, но для группы клиентов одной транзакции
+    (групповой коммит): одна новая версия на всю группу.
+
+    Returns:
+        int: Новая версия "clients".
+    """
+    version = bump_data_version(conn, CLIENTS_DATA_VERSION)
+    conn.executemany(
+        "UPDATE clients_info SET change_version = ? WHERE client_id = ?",
+        [(version, str(client_id)) for client_id in dict.fromkeys(client_ids)],
+    )
+    return version
+
+
+def _row_phone_key(row: Dict[str, Any]) -> Optional[str]:
+    key = row.get("phone_e164")
+    if key:
+        return key
+    phone = row.get("phone")
+    return normalize_phone(phone) if phone else None
+
+
+class ClientRepository:
+    """
+    Клиенты по client_id и по каноническому номеру телефона.
+
+    Поиск — обращение к dict; изменения применяются построчно
+    (apply_committed / refresh), без перечитывания всей таблицы.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_phone: Dict[str, str] = {}
+        # Отметка: версия "clients", до которой изменения уже применены
+        self.version = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "ClientRepository":
+        """Полная загрузка clients_info (один раз при старте процесса)."""
+        ensure_change_tracking(conn)
+        repo = cls()
+        repo.version = get_data_version(conn, CLIENTS_DATA_VERSION)
+        cursor = conn.execute("SELECT * FROM clients_info ORDER BY rowid")
+        columns = [col[0] for col in cursor.description]
+        for row in cursor:
+            repo._put(dict(zip(columns, row)))
+        logger.info(f"Клиенты загружены: {len(repo)} (версия {repo.version})")
+        return repo
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def _put(self, row: Dict[str, Any]):
+        client_id = str(row["client_id"])
+        old = self._by_id.get(client_id)
+        if old is not None:
+            old_key = _row_phone_key(old)
+            if old_key and self._by_phone.get(old_key) == client_id:
+                del self._by_phone[old_key]
+        self._by_id[client_id] = row
+        key = _row_phone_key(row)
+        if key:
+            # Как и уникальный индекс phone_e164: номер остаётся за первым клиентом
+            self._by_phone.setdefault(key, client_id)
+
+    def get(self, client_id: Any) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(str(client_id))
+
+    def find_by_phone(self, phone: Any) -> Optional[Dict[str, Any]]:
+        """Клиент по номеру в любом формате ("8 (916) ...", "+7916...")."""
+        key = normalize_phone(phone) if phone else None
+        client_id = self._by_phone.get(key) if key else None
+        return self._by_id.get(client_id) if client_id else None
+
+    def apply_committed(self, conn: sqlite3.Connection, client_id: Any) -> Optional[Dict[str, Any]]:
+        """
+        Применяет уже закоммиченную вставку/обновление одного клиента:
+        строка перечитывается по первичному ключу и подменяется в памяти.
+        """
+        cursor = conn.execute("SELECT * FROM clients_info WHERE client_id = ?", (str(client_id),))
+        columns = [col[0] for col in cursor.description]
+        values = cursor.fetchone()
+        if values is None:
+            return None
+        row = dict(zip(columns, values))
+        with self._lock:
+            self._put(row)
+            # Отметка сдвигается, только если до этой записи не было чужих изменений
+            if (row.get("change_version") or 0) == self.version + 1:
+                self.version += 1
+        return row
+
+    def refresh(self, conn: sqlite3.Connection) -> int:
+        """
+        Подтягивает изменения других процессов: строки с change_version
+        выше отметки. Если версия не менялась — один SELECT по data_versions.
+
+        Returns:
+            int: Сколько строк обновлено в памяти.
+        """
+        version = get_data_version(conn, CLIENTS_DATA_VERSION)
+        if version == self.version:
+            return 0
+        cursor = conn.execute(
+            "SELECT * FROM clients_info WHERE change_version > ? ORDER BY change_version", (self.version,)
+        )
+        columns = [col[0] for col in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        with self._lock:
+            for row in rows:
+                self._put(row)
+            self.version = version
+        if rows:
+            logger.info(f"Клиенты обновлены до версии {version}: {len(rows)} строк")
+        return len(rows)
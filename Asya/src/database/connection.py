@@ -0,0 +1,123 @@
+"""
+Общие долгоживущие соединения с SQLite (по одному на поток) в режиме WAL.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Ожидание блокировки другим писателем, секунды
+BUSY_TIMEOUT = 5.0
+# Кэш страниц: отрицательное значение — в КиБ (64 МиБ)
+CACHE_SIZE_KIB = 64 * 1024
+# Отображение файла базы в память (256 МиБ)
+MMAP_SIZE = 256 * 1024 * 1024
+# Подготовленных запросов в кэше одного соединения
+CACHED_STATEMENTS = 256
+
+
+class ConnectionManager:
+    """
+    Соединения с одним файлом базы: по одному на поток, открываются при
+    первом обращении потока и живут до close_all(). Вызывающий код их не
+    закрывает, а пишет через transaction().
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        busy_timeout: float = BUSY_TIMEOUT,
+        cache_size_kib: int = CACHE_SIZE_KIB,
+        mmap_size: int = MMAP_SIZE,
+        cached_statements: int = CACHED_STATEMENTS,
+    ):
+        """
+        Args:
+            db_path (str): Путь к файлу SQLite.
+            busy_timeout (float): Сколько ждать блокировку писателя, секунды.
+            cache_size_kib (int): Кэш страниц соединения, КиБ.
+            mmap_size (int): Сколько байт файла отображать в память.
+            cached_statements (int): Размер кэша подготовленных запросов.
+        """
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            cached_statements=self.cached_statements,
+            # Поток-владелец гарантирует threading.local; так close_all может закрыть из любого потока
+            check_same_thread=False,
+        )
+        # Режим журнала хранится в файле базы; для ":memory:" останется "memory"
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        with self._lock:
+            self._connections.append(conn)
+        logger.debug(f"Открыто соединение с {self.db_path} для потока {threading.current_thread().name}")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока (открывается при первом вызове). Не закрывать."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Транзакция на соединении потока: commit при выходе, rollback при исключении.
+
+        Args:
+            immediate (bool): Сразу взять блокировку записи (BEGIN IMMEDIATE),
+                чтобы чтение-затем-запись не упёрлось в чужого писателя.
+        """
+        conn = self.connection()
+        if immediate and not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    def close_all(self):
+        """Закрывает соединения всех потоков (при остановке процесса)."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_path: str) -> ConnectionManager:
+    """Общий ConnectionManager процесса для файла базы."""
+    key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = ConnectionManager(db_path)
+        return manager
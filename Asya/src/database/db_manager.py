@@ -1,9 +1,19 @@
 import sqlite3
 import uuid
-import json
 import logging
 from typing import Dict, List, Any, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from src.database.call_history import fetch_unfinished_calls
+from src.database.call_json import COMPACT_JSON_FORMAT, encode_call_json
+from src.database.client_repository import mark_client_changed
+from src.database.connection import get_connection_manager
+from src.database.group_commit import WriteJob, apply_jobs
+from src.database.migrations import migrate
+from src.database.partitions import CallPartitions
+from src.database.phone_keys import migrate_phone_keys
+from src.utils.city_index import CityIndex, CityResolver
+from src.utils.validation import normalize_phone
 
 # Если asya_core.schemas нет или он незавершён — не ломаемся
 try:
@@ -15,6 +25,51 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Запросы сохранения звонка (одинаковый текст — строки разных звонков склеиваются в один executemany)
+# Существующий клиент обновляется на месте: INSERT OR REPLACE при конфликте по уникальному
+# phone_e164 удалял бы строку клиента. Поля, которые в этом звонке не назвали (NULL), сохраняются.
+INSERT_CLIENT_SQL = '''
+    INSERT INTO clients_info
+    (client_id, phone, phone_e164, name, city_name, region_code, region_name, inn, organization, comment,
+     is_duplicate_city, is_repeat_call, assigned_manager_id, last_call_summary)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(client_id) DO UPDATE SET
+        phone = COALESCE(excluded.phone, phone),
+        phone_e164 = COALESCE(excluded.phone_e164, phone_e164),
+        name = COALESCE(excluded.name, name),
+        city_name = COALESCE(excluded.city_name, city_name),
+        region_code = COALESCE(excluded.region_code, region_code),
+        region_name = COALESCE(excluded.region_name, region_name),
+        inn = COALESCE(excluded.inn, inn),
+        organization = COALESCE(excluded.organization, organization),
+        comment = COALESCE(excluded.comment, comment),
+        is_duplicate_city = excluded.is_duplicate_city,
+        is_repeat_call = excluded.is_repeat_call,
+        assigned_manager_id = COALESCE(excluded.assigned_manager_id, assigned_manager_id),
+        last_call_summary = COALESCE(excluded.last_call_summary, last_call_summary)
+'''
+INSERT_CALL_SQL = '''
+    INSERT INTO calls
+    (call_id, client_id, timestamp, department, product_service, request_text,
+     next_step, target_department, manager_id, is_repeat_call, is_work_time,
+     llm_retry_count, sip_status, fallback_triggered)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+INSERT_TRANSCRIPT_SQL = '''
+    INSERT INTO call_transcripts
+    (call_id, client_id, speaker, text, segment_id, segment_time, llm_response)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+# Реплики, записанные по ходу звонка, получают client_id при завершении звонка
+ATTACH_TRANSCRIPT_CLIENT_SQL = '''
+    UPDATE call_transcripts SET client_id = ? WHERE call_id = ? AND client_id IS NULL
+'''
+# JSON-дамп — сжатый компактный JSON в json_blob (src.database.call_json), json_data не заполняется
+INSERT_JSON_SQL = '''
+    INSERT INTO jsons (call_id, client_id, timestamp, json_blob, json_format)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
 class DatabaseManager:
     """
     Класс для управления базой данных SQLite (clients.db).
@@ -30,201 +85,141 @@ class DatabaseManager:
             db_path (str): Путь к файлу SQLite базы данных.
         """
         self.db_path = db_path
+        # Долгоживущие соединения (по одному на поток, WAL), общие для всех менеджеров этого файла
+        self.connections = get_connection_manager(db_path)
+        # Архивы закрытых месяцев (archive_YYYY_MM.db) для истории звонков
+        self.partitions = CallPartitions(db_path)
+        self._city_resolver: Optional[CityResolver] = None
         self._init_db()
 
     def _init_db(self):
         """
-        Создаёт таблицы базы данных, если их нет.
-        Использует структуру из вашего R&D-отчёта.
+        Приводит схему базы к текущей версии (src.database.migrations): одна схема
+        для db_create.py, final_sql и DatabaseManager, индексы горячих запросов.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # --- clients_info ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS clients_info (
-                client_id TEXT PRIMARY KEY,
-                phone TEXT UNIQUE,
-                name TEXT,
-                city_name TEXT,
-                region_code TEXT,
-                region_name TEXT,
-                inn TEXT,
-                organization TEXT,
-                comment TEXT,
-                last_call_summary TEXT,
-                is_duplicate_city BOOLEAN DEFAULT FALSE,
-                is_repeat_call BOOLEAN DEFAULT FALSE,
-                assigned_manager_id TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # --- calls ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS calls (
-                call_id TEXT PRIMARY KEY,
-                client_id TEXT,
-                timestamp DATETIME,
-                department TEXT,
-                product_service TEXT,
-                request_text TEXT,
-                next_step TEXT,
-                target_department TEXT,
-                manager_id TEXT,
-                is_repeat_call BOOLEAN DEFAULT FALSE,
-                is_work_time BOOLEAN DEFAULT TRUE,
-                llm_retry_count INTEGER DEFAULT 0,
-                sip_status TEXT,
-                fallback_triggered BOOLEAN DEFAULT FALSE,
-                FOREIGN KEY (client_id) REFERENCES clients_info(client_id)
-            )
-        ''')
-
-        # --- call_transcripts ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS call_transcripts (
-                transcript_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                call_id TEXT,
-                client_id TEXT,
-                speaker TEXT,
-                text TEXT,
-                segment_id TEXT,
-                segment_time DATETIME,
-                llm_response BOOLEAN DEFAULT FALSE,
-                FOREIGN KEY (call_id) REFERENCES calls(call_id),
-                FOREIGN KEY (client_id) REFERENCES clients_info(client_id)
-            )
-        ''')
-
-        # --- jsons ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS jsons (
-                call_id TEXT PRIMARY KEY,
-                client_id TEXT,
-                timestamp DATETIME,
-                json_data TEXT,
-                FOREIGN KEY (call_id) REFERENCES calls(call_id),
-                FOREIGN KEY (client_id) REFERENCES clients_info(client_id)
-            )
-        ''')
-
-        # --- products ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                product_id TEXT PRIMARY KEY,
-                official_name TEXT,
-                slang_name TEXT,
-                description TEXT,
-                technical_specs TEXT,
-                price TEXT,
-                is_archived BOOLEAN DEFAULT FALSE,
-                weight_priority INTEGER DEFAULT 0
-            )
-        ''')
-
-        # --- regions_map ---
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS regions_map (
-                region_code TEXT PRIMARY KEY,
-                region_name TEXT,
-                city_name TEXT,
-                aliases TEXT,
-                phone_route_code TEXT
-            )
-        ''')
-
-        conn.commit()
-        conn.close()
+        migrate(self.connections.connection())
+        with self.connections.transaction() as conn:
+            # phone_e164 для строк, записанных кодом, который его не заполняет
+            migrate_phone_keys(conn)
         logger.info("База данных инициализирована/проверена.")
 
     async def check_connection(self) -> bool:
         """
         Простейшая проверка доступности БД для /health/full.
+        Выполняется в event loop; без блокировки — AsyncDatabaseManager.check_connection.
         """
+        return self.ping()
+
+    def ping(self) -> bool:
+        """Синхронная проверка доступности БД (SELECT 1)."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.execute("SELECT 1")
-            conn.close()
+            self.connections.connection().execute("SELECT 1")
             return True
         except Exception as e:
             logger.error(f"Ошибка при проверке соединения с БД: {e}")
             return False
 
-    def save_call_data(self, profile: CallProfile, transcript: List[TranscriptSegment], history: List[Dict[str, str]]):
+    def save_call_data(self, profile: CallProfile, transcript: List[TranscriptSegment], history: List[Dict[str, str]],
+                       call_id: Optional[str] = None, transcript_saved: bool = False) -> str:
         """
         Сохраняет полный звонок в базу данных.
         Вызывается из dialog_manager.py после завершения диалога.
+        Под нагрузкой звонки сохраняет AsyncDatabaseManager — группами через GroupCommitWriter.
 
         Args:
             profile (CallProfile): Полный профиль клиента.
             transcript (List[TranscriptSegment]): Список реплик диалога.
             history (List[Dict[str, str]]): Полная история диалога (для JSON-дампа).
+            call_id (str): Идентификатор звонка, если он выдан в начале звонка.
+            transcript_saved (bool): Реплики уже записаны по ходу звонка (turn_write).
+
+        Returns:
+            str: call_id сохранённого звонка.
         """
-        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            # --- 1. Сохраняем/обновляем клиента ---
-            client_id = str(profile.client_id) if profile.client_id else str(uuid.uuid4())
-            profile.client_id = client_id  # Убеждаемся, что client_id есть
-
-            cursor.execute('''
-                INSERT OR REPLACE INTO clients_info 
-                (client_id, phone, name, city_name, region_code, region_name, inn, organization, comment, 
-                 is_duplicate_city, is_repeat_call, assigned_manager_id, last_call_summary)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                client_id,
-                profile.get("Телефон"),
-                profile.get("Имя клиента"),
-                profile.get("Город"),
-                profile.get("client_region", {}).get("code"),
-                profile.get("client_region", {}).get("name"),
-                profile.get("ИНН"),
-                profile.get("Организация"),
-                profile.get("Комментарии"),
-                profile.get("is_duplicate_city", False),
-                profile.is_repeat_call,
-                profile.get("assigned_manager_id"),
-                profile.last_call_summary if hasattr(profile, 'last_call_summary') else None
-            ))
-
-            # --- 2. Сохраняем запись звонка ---
-            call_id = str(uuid.uuid4())
-            last_call_summary = transcript[-1].text if transcript else ""
-
-            cursor.execute('''
-                INSERT INTO calls 
-                (call_id, client_id, timestamp, department, product_service, request_text, 
-                 next_step, target_department, manager_id, is_repeat_call, is_work_time, 
-                 llm_retry_count, sip_status, fallback_triggered)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                call_id,
-                client_id,
-                datetime.now().isoformat(),
-                profile.get("Отдел"),
-                None,  # Будет заполнено из JSON
-                profile.get("Комментарии"),
-                "transfer",  # По умолчанию
-                profile.get("Отдел"),
-                profile.get("assigned_manager_id"),
-                profile.is_repeat_call,
-                True,  # По умолчанию
-                0,  # Будет заполнено из JSON
-                "answered",  # Будет заполнено из JSON
-                False  # Будет заполнено из JSON
-            ))
-
-            # --- 3. Сохраняем транскрипцию ---
-            for segment in transcript:
-                cursor.execute('''
-                    INSERT INTO call_transcripts 
-                    (call_id, client_id, speaker, text, segment_id, segment_time, llm_response)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
+            job = self.build_call_write(profile, transcript, history, call_id, transcript_saved)
+            with self.connections.transaction() as conn:
+                apply_jobs(conn, [job])
+            logger.info(f"Звонок {job.result} успешно сохранён в базу.")
+            return job.result
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении звонка в базу: {e}", exc_info=True)
+            raise RuntimeError(f"Ошибка сохранения звонка в базу: {str(e)}")
+
+    def build_call_write(self, profile: CallProfile, transcript: List[TranscriptSegment], history: List[Dict[str, str]],
+                         call_id: Optional[str] = None, transcript_saved: bool = False) -> WriteJob:
+        """
+        Строки клиента, звонка, транскрипта и JSON-дампа одного звонка (без обращения к БД).
+        Выполняются apply_jobs: сразу (save_call_data) или в группе с другими звонками.
+        Если реплики уже записаны по ходу звонка (transcript_saved), они только
+        получают client_id — объём записи при завершении не зависит от длины звонка.
+        """
+        job = WriteJob(statements=[], result=call_id or str(uuid.uuid4()))
+        if profile.client_id:
+            self._fill_call_write(job, profile, transcript, history, str(profile.client_id), transcript_saved)
+        else:
+            # Клиент не найден предзагрузкой — ищем по номеру в транзакции потока записи:
+            # два одновременных первых звонка с нового номера получают одного клиента
+            job.prepare = lambda conn: self._fill_call_write(
+                job, profile, transcript, history, self._client_id_for_phone(conn, profile.get("Телефон")), transcript_saved
+            )
+        return job
+
+    @staticmethod
+    def _client_id_for_phone(conn, phone: Optional[str]) -> str:
+        """client_id клиента с этим номером (phone_e164) или новый uuid."""
+        phone_key = normalize_phone(phone) if phone else None
+        row = conn.execute("SELECT client_id FROM clients_info WHERE phone_e164 = ?", (phone_key,)).fetchone() if phone_key else None
+        return str(row[0]) if row else str(uuid.uuid4())
+
+    def _fill_call_write(self, job: WriteJob, profile: CallProfile, transcript: List[TranscriptSegment],
+                         history: List[Dict[str, str]], client_id: str, transcript_saved: bool):
+        """Заполняет statements задания build_call_write для известного client_id."""
+        call_id = job.result
+        profile.client_id = client_id  # Убеждаемся, что client_id есть
+
+        # --- 1. Клиент ---
+        client_row = (
+            client_id,
+            profile.get("Телефон"),
+            normalize_phone(profile.get("Телефон")),
+            profile.get("Имя клиента"),
+            profile.get("Город"),
+            profile.get("client_region", {}).get("code"),
+            profile.get("client_region", {}).get("name"),
+            profile.get("ИНН"),
+            profile.get("Организация"),
+            profile.get("Комментарии"),
+            profile.get("is_duplicate_city", False),
+            profile.is_repeat_call,
+            profile.get("assigned_manager_id"),
+            profile.last_call_summary if hasattr(profile, 'last_call_summary') else None
+        )
+
+        # --- 2. Запись звонка ---
+        call_row = (
+            call_id,
+            client_id,
+            datetime.now().isoformat(),
+            profile.get("Отдел"),
+            None,  # Будет заполнено из JSON
+            profile.get("Комментарии"),
+            "transfer",  # По умолчанию
+            profile.get("Отдел"),
+            profile.get("assigned_manager_id"),
+            profile.is_repeat_call,
+            True,  # По умолчанию
+            0,  # Будет заполнено из JSON
+            "answered",  # Будет заполнено из JSON
+            False  # Будет заполнено из JSON
+        )
+
+        # --- 3. Транскрипция ---
+        if transcript_saved:
+            transcript_statement = (ATTACH_TRANSCRIPT_CLIENT_SQL, [(client_id, call_id)])
+        else:
+            transcript_statement = (INSERT_TRANSCRIPT_SQL, [
+                (
                     call_id,
                     client_id,
                     segment.speaker,
@@ -232,34 +227,80 @@ class DatabaseManager:
                     f"seg_{segment.timestamp.strftime('%H%M%S')}",
                     segment.timestamp.isoformat(),
                     segment.speaker == "bot"
-                ))
-
-            # --- 4. Сохраняем полный JSON-дамп ---
-            json_data = self._build_call_json(profile, transcript, history, call_id, client_id)
-            json_str = json.dumps(json_data, ensure_ascii=False, indent=2)
-
-            cursor.execute('''
-                INSERT INTO jsons (call_id, client_id, timestamp, json_data)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                call_id,
-                client_id,
-                datetime.now().isoformat(),
-                json_str
-            ))
+                )
+                for segment in transcript
+            ])
+
+        # --- 4. Полный JSON-дамп (сжатый; транскрипция — ссылкой на строки call_transcripts) ---
+        json_data = self._build_call_json(profile, transcript, history, call_id, client_id)
+        json_row = (call_id, client_id, datetime.now().isoformat(), encode_call_json(json_data), COMPACT_JSON_FORMAT)
+
+        job.statements = [
+            (INSERT_CLIENT_SQL, [client_row]),
+            (INSERT_CALL_SQL, [call_row]),
+            transcript_statement,
+            (INSERT_JSON_SQL, [json_row]),
+        ]
+        job.changed_clients = [client_id]
+
+    def turn_write(self, call_id: str, turn: int, segment: TranscriptSegment, client_id: Optional[str] = None) -> WriteJob:
+        """
+        Одна реплика, записываемая сразу, как прозвучала (append-only).
+        Если звонок оборвётся, реплики останутся в call_transcripts (см. recover_unfinished_calls).
 
-            conn.commit()
-            logger.info(f"Звонок {call_id} успешно сохранён в базу.")
+        Args:
+            call_id (str): Идентификатор звонка, выданный в его начале.
+            turn (int): Номер реплики в звонке (segment_id "seg_0001", сортируется по порядку).
+            segment (TranscriptSegment): Реплика.
+            client_id (str): Клиент, если уже известен; иначе проставится при завершении.
+        """
+        row = (
+            call_id,
+            str(client_id) if client_id else None,
+            segment.speaker,
+            segment.text,
+            f"seg_{turn:04d}",
+            segment.timestamp.isoformat(),
+            segment.speaker == "bot"
+        )
+        return WriteJob(statements=[(INSERT_TRANSCRIPT_SQL, [row])], result=call_id)
+
+    def attach_turns_write(self, call_id: str, client_id: str) -> WriteJob:
+        """
+        client_id для реплик звонка, записанных до того, как клиент стал известен
+        (предзагрузка закончилась после первых реплик). Тогда и прерванный звонок
+        восстанавливается уже с клиентом.
+        """
+        return WriteJob(statements=[(ATTACH_TRANSCRIPT_CLIENT_SQL, [(str(client_id), call_id)])], result=call_id)
 
+    def recover_unfinished_calls(self, idle_minutes: int = 30) -> int:
+        """
+        Звонки, от которых остались только реплики (процесс упал или звонок
+        оборвался до сохранения), получают запись в calls со статусом "interrupted" —
+        и попадают в историю клиента, если он был найден по номеру (client_id реплик
+        проставляют turn_write и attach_turns_write). Звонки с репликами моложе
+        idle_minutes не трогаются.
+
+        Returns:
+            int: Сколько звонков восстановлено.
+        """
+        before = (datetime.now() - timedelta(minutes=idle_minutes)).isoformat()
+        try:
+            with self.connections.transaction(immediate=True) as conn:
+                calls = fetch_unfinished_calls(conn, before)
+                conn.executemany(
+                    '''
+                    INSERT INTO calls (call_id, client_id, timestamp, next_step, sip_status)
+                    VALUES (?, ?, ?, NULL, 'interrupted')
+                    ''',
+                    [(call["call_id"], call["client_id"], call["started_at"]) for call in calls],
+                )
+            if calls:
+                logger.warning(f"Восстановлено незавершённых звонков: {len(calls)}")
+            return len(calls)
         except Exception as e:
-            if conn:
-                conn.rollback()
-            logger.error(f"Ошибка при сохранении звонка в базу: {e}", exc_info=True)
-            raise RuntimeError(f"Ошибка сохранения звонка в базу: {str(e)}")
-
-        finally:
-            if conn:
-                conn.close()
+            logger.error(f"Ошибка при восстановлении незавершённых звонков: {e}")
+            return 0
 
     def _build_call_json(self, profile: CallProfile, transcript: List[TranscriptSegment], history: List[Dict[str, str]], call_id: str, client_id: str) -> Dict[str, Any]:
         """
@@ -325,6 +366,12 @@ class DatabaseManager:
             "metadata": metadata
         }
 
+    def _cursor(self) -> sqlite3.Cursor:
+        """Курсор на соединении потока со строками sqlite3.Row (row_factory соединения не меняется)."""
+        cursor = self.connections.connection().cursor()
+        cursor.row_factory = sqlite3.Row
+        return cursor
+
     def find_client_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
         """
         Ищет клиента в базе по номеру телефона.
@@ -332,18 +379,15 @@ class DatabaseManager:
 
         Используется в dialog_manager.py для определения повторного звонка.
         """
-        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            clean_phone = ''.join(filter(str.isdigit, str(phone)))
-            if len(clean_phone) == 11 and clean_phone[0] == '8':
-                clean_phone = '7' + clean_phone[1:]
+            # Тот же ключ, что пишется в phone_e164 ("+7XXXXXXXXXX"), поиск по уникальному индексу
+            phone_key = normalize_phone(phone)
+            if phone_key is None:
+                return None
 
-            cursor.execute('SELECT * FROM clients_info WHERE phone = ?', (clean_phone,))
-            row = cursor.fetchone()  # ← ✅ ЭТО ПРАВИЛЬНО! БЕЗ "row = "!
+            cursor = self._cursor()
+            cursor.execute('SELECT * FROM clients_info WHERE phone_e164 = ?', (phone_key,))
+            row = cursor.fetchone()
 
             if row:
                 return dict(row)
@@ -352,9 +396,50 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Ошибка при поиске клиента по телефону {phone}: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
+
+    def get_recent_calls_by_phone(self, phone: str, n: int = 3) -> List[Dict[str, Any]]:
+        """
+        Последние n звонков клиента по номеру телефона (новые первыми).
+        Не ждёт find_client_by_phone: клиент находится в том же запросе через phone_e164,
+        поэтому предзагрузка на StasisStart может выполнять оба запроса параллельно.
+        """
+        phone_key = normalize_phone(phone)
+        if phone_key is None:
+            return []
+        try:
+            rows = self._cursor().execute('''
+                SELECT c.call_id, c.timestamp, c.department, c.product_service, c.request_text, c.next_step
+                FROM clients_info AS ci
+                JOIN calls AS c ON c.client_id = ci.client_id
+                WHERE ci.phone_e164 = ?
+                ORDER BY c.timestamp DESC
+                LIMIT ?
+            ''', (phone_key, n)).fetchall()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Ошибка при получении звонков клиента {phone}: {e}")
+            return []
+
+    def get_call_json(self, call_id: str) -> Optional[Dict[str, Any]]:
+        """Полный JSON-дамп звонка (собирается из json_blob и call_transcripts) или None; ищется и в архивах месяцев."""
+        try:
+            return self.partitions.call_json(self.connections.connection(), call_id)
+        except Exception as e:
+            logger.error(f"Ошибка при чтении JSON звонка {call_id}: {e}")
+            return None
+
+    def get_recent_calls(self, client_id: str, n: int = 3) -> List[Dict[str, Any]]:
+        """
+        Последние n звонков клиента: сводка, отдел и начало транскрипта.
+        Один запрос по индексам calls(client_id, timestamp) и call_transcripts(call_id, segment_id) —
+        можно вызывать прямо во время звонка. Если в живой базе звонков меньше n,
+        недостающие берутся только из архивов месяцев, где у клиента были звонки (от новых к старым).
+        """
+        try:
+            return self.partitions.recent_calls(self.connections.connection(), client_id, n)
+        except Exception as e:
+            logger.error(f"Ошибка при получении истории звонков клиента {client_id}: {e}")
+            return []
 
     def update_client_profile(self, client_id: str, field: str, value: Any) -> bool:
         """
@@ -363,30 +448,35 @@ class DatabaseManager:
 
         Пример: update_client_profile("uuid-123", "Имя клиента", "Александр")
         """
-        conn = None
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            # Карта полей
-            field_map = {
-                "Имя клиента": "name",
-                "Телефон": "phone",
-                "Город": "city_name",
-                "ИНН": "inn",
-                "Организация": "organization",
-                "Комментарии": "comment",
-                "Отдел": "department",
-                "Объект": "object",
-            }
-
-            db_field = field_map.get(field)
-            if not db_field:
-                logger.warning(f"Поле '{field}' не найдено в карте обновлений.")
-                return False
+        # Карта полей
+        field_map = {
+            "Имя клиента": "name",
+            "Телефон": "phone",
+            "Город": "city_name",
+            "ИНН": "inn",
+            "Организация": "organization",
+            "Комментарии": "comment",
+            "Отдел": "department",
+            "Объект": "object",
+        }
 
-            cursor.execute(f"UPDATE clients_info SET {db_field} = ? WHERE client_id = ?", (value, client_id))
-            conn.commit()
+        db_field = field_map.get(field)
+        if not db_field:
+            logger.warning(f"Поле '{field}' не найдено в карте обновлений.")
+            return False
+
+        try:
+            with self.connections.transaction() as conn:
+                cursor = conn.cursor()
+                if db_field == "phone":
+                    cursor.execute(
+                        "UPDATE clients_info SET phone = ?, phone_e164 = ? WHERE client_id = ?",
+                        (value, normalize_phone(value), client_id),
+                    )
+                else:
+                    cursor.execute(f"UPDATE clients_info SET {db_field} = ? WHERE client_id = ?", (value, client_id))
+                if cursor.rowcount > 0:
+                    mark_client_changed(conn, client_id)
 
             if cursor.rowcount > 0:
                 logger.info(f"Поле '{field}' для клиента {client_id} обновлено на '{value}'.")
@@ -398,21 +488,14 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Ошибка при обновлении поля '{field}' для клиента {client_id}: {e}")
             return False
-        finally:
-            if conn:
-                conn.close()
 
     def get_product_by_id(self, product_id: str) -> Optional[Dict[str, Any]]:
         """
         Получает информацию о продукте по product_id.
         Используется для консультаций (в будущем, если LLM не найдёт в тексте).
         """
-        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
+            cursor = self._cursor()
             cursor.execute('SELECT * FROM products WHERE product_id = ?', (product_id,))
             row = cursor.fetchone()
             return dict(row) if row else None
@@ -420,40 +503,32 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Ошибка при получении продукта {product_id}: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
 
-    def get_region_by_city(self, city: str) -> Optional[Dict[str, Any]]:
+    def _get_city_resolver(self) -> CityResolver:
+        """Индекс городов строится из cities_map один раз при первом запросе."""
+        if self._city_resolver is None:
+            self._city_resolver = CityResolver(CityIndex.from_db(self.connections.connection(), "cities_map"))
+        return self._city_resolver
+
+    def get_region_by_city(self, city: str, region_hint: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
         """
-        Находит регион по названию города (с учётом синонимов).
-        Используется при заполнении профиля.
+        Находит регион по названию города (с учётом синонимов и опечаток).
+        Используется при заполнении профиля. region_hint — вероятные регионы
+        по номеру звонящего, выбирают один из одноимённых городов.
+
+        Возвращает словарь resolve_city(): city_name, region_code, region_name,
+        is_duplicate, phone_route_code, score — или None.
         """
-        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            city_lower = city.lower().strip()
-
-            # Поиск по city_name
-            cursor.execute('SELECT * FROM regions_map WHERE LOWER(city_name) = ?', (city_lower,))
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
-
-            # Поиск по aliases
-            cursor.execute('SELECT * FROM regions_map WHERE aliases LIKE ?', (f'%{city_lower}%',))
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
-
-            return None
-
+            return self._get_city_resolver().resolve_city(city, region_hint)
         except Exception as e:
             logger.error(f"Ошибка при поиске региона по городу {city}: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
\ No newline at end of file
+
+    def get_region_names(self) -> Dict[str, str]:
+        """Названия регионов cities_map по region_code (для прогноза региона по номеру)."""
+        try:
+            return self._get_city_resolver().index.region_names()
+        except Exception as e:
+            logger.error(f"Ошибка при чтении названий регионов: {e}")
+            return {}
@@ -0,0 +1,253 @@
+"""
+Групповой коммит: один поток записи склеивает записи звонков в executemany
+и коммитит группу одной транзакцией.
+"""
+
+import functools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from src.database.client_repository import mark_clients_changed
+from src.database.connection import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать попутчиков для группы, секунды: задания, пришедшие во время
+# предыдущего коммита, и так попадают в следующую группу, долгое ожидание только добавляет задержку
+FLUSH_INTERVAL = 0.002
+# Строк в группе, после которых она коммитится сразу
+MAX_BATCH_ROWS = 5000
+
+
+@dataclass
+class WriteJob:
+    """
+    Одна логическая запись (например, звонок целиком).
+
+    statements — пары (запрос, строки параметров) в порядке выполнения; в группе
+    INSERT выполняются раньше остальных запросов (см. apply_jobs);
+    changed_clients — клиенты, которым нужно проставить change_version;
+    result — что получит вызывающий код после коммита (например, call_id);
+    prepare — если задан, вызывается с соединением в транзакции группы и заполняет
+    statements/changed_clients по данным базы (например, ищет клиента по номеру).
+    """
+    statements: List[Tuple[str, List[Sequence[Any]]]]
+    changed_clients: List[str] = field(default_factory=list)
+    result: Any = None
+    prepare: Optional[Callable[[Any], None]] = None
+
+    @property
+    def rows(self) -> int:
+        return sum(len(rows) for _, rows in self.statements)
+
+
+def _is_insert(sql: str) -> bool:
+    return sql.lstrip().upper().startswith("INSERT")
+
+
+def apply_jobs(conn, jobs: Sequence[WriteJob]):
+    """
+    Выполняет задания в транзакции вызывающего кода: строки одинаковых
+    запросов склеиваются в один executemany (в порядке первого появления запроса).
+
+    Склейка переставляет запросы разных заданий, поэтому сначала выполняются все
+    INSERT группы, а затем остальные запросы (UPDATE по уже записанным строкам,
+    например ATTACH_TRANSCRIPT_CLIENT_SQL): такой запрос видит и строки, вставленные
+    заданиями, стоящими в очереди после него.
+
+    Задания с prepare выполняются после склеенных, по одному и в порядке очереди:
+    prepare второго звонка с того же нового номера уже видит клиента, записанного первым.
+    """
+    merged: Dict[str, List[Sequence[Any]]] = {}
+    changed: List[str] = []
+    for job in jobs:
+        if job.prepare is not None:
+            continue
+        for sql, rows in job.statements:
+            merged.setdefault(sql, []).extend(rows)
+        changed.extend(job.changed_clients)
+    ordered = [sql for sql in merged if _is_insert(sql)] + [sql for sql in merged if not _is_insert(sql)]
+    for sql in ordered:
+        if merged[sql]:
+            conn.executemany(sql, merged[sql])
+    for job in jobs:
+        if job.prepare is None:
+            continue
+        job.prepare(conn)
+        for sql, rows in job.statements:
+            if rows:
+                conn.executemany(sql, rows)
+        changed.extend(job.changed_clients)
+    if changed:
+        mark_clients_changed(conn, changed)
+
+
+class WriterMetrics:
+    """Счётчики GroupCommitWriter (потокобезопасные)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.groups = 0
+        self.jobs = 0
+        self.rows = 0
+        self.failed_groups = 0
+        self.max_group_jobs = 0
+        self.commit_ms_total = 0.0
+        self.last_commit_ms = 0.0
+        self.max_commit_ms = 0.0
+
+    def record(self, jobs: int, rows: int, commit_ms: float):
+        with self._lock:
+            self.groups += 1
+            self.jobs += jobs
+            self.rows += rows
+            self.max_group_jobs = max(self.max_group_jobs, jobs)
+            self.commit_ms_total += commit_ms
+            self.last_commit_ms = commit_ms
+            self.max_commit_ms = max(self.max_commit_ms, commit_ms)
+
+    def record_failure(self):
+        with self._lock:
+            self.failed_groups += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Для /health/full и логов: средний размер группы и задержка коммита."""
+        with self._lock:
+            groups = self.groups or 1
+            return {
+                "groups": self.groups,
+                "jobs": self.jobs,
+                "rows": self.rows,
+                "failed_groups": self.failed_groups,
+                "avg_group_jobs": round(self.jobs / groups, 2),
+                "max_group_jobs": self.max_group_jobs,
+                "avg_commit_ms": round(self.commit_ms_total / groups, 3),
+                "last_commit_ms": round(self.last_commit_ms, 3),
+                "max_commit_ms": round(self.max_commit_ms, 3),
+            }
+
+
+_Item = Tuple[Union[WriteJob, Callable[[], Any]], Future]
+
+
+class GroupCommitWriter(threading.Thread):
+    """
+    Единственный поток записи. Принимает WriteJob (группируются) и обычные
+    функции (submit: выполняются по одной, между группами, в порядке очереди).
+    """
+
+    def __init__(
+        self,
+        connections: ConnectionManager,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_rows: int = MAX_BATCH_ROWS,
+        synchronous: str = "FULL",
+        name: str = "db-writer",
+    ):
+        """
+        Args:
+            connections (ConnectionManager): Соединения с базой (у потока записи — своё).
+            flush_interval (float): Сколько ждать попутчиков после первого задания группы, секунды.
+            max_rows (int): Строк, после которых группа коммитится, не дожидаясь интервала.
+            synchronous (str): PRAGMA synchronous соединения записи; FULL — коммит
+                переживает и сбой ОС, fsync всё равно один на группу.
+        """
+        super().__init__(name=name, daemon=True)
+        self.connections = connections
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.synchronous = synchronous
+        self.metrics = WriterMetrics()
+        self._queue: "queue.Queue[Optional[_Item]]" = queue.Queue()
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> Future:
+        """Ставит в очередь функцию (она сама управляет своей транзакцией)."""
+        future: Future = Future()
+        self._queue.put((functools.partial(func, *args, **kwargs), future))
+        return future
+
+    def submit_job(self, job: WriteJob) -> Future:
+        """Ставит в очередь запись; Future завершится после коммита её группы."""
+        future: Future = Future()
+        self._queue.put((job, future))
+        return future
+
+    def run(self):
+        conn = self.connections.connection()
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        pending: Optional[_Item] = None
+        stop = False
+        while not stop:
+            item = pending or self._queue.get()
+            pending = None
+            if item is None:
+                break
+            task, future = item
+            if not isinstance(task, WriteJob):
+                self._run_call(task, future)
+                continue
+
+            group = [item]
+            rows = task.rows
+            deadline = time.monotonic() + self.flush_interval
+            while rows < self.max_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    # Остановка — после коммита текущей группы
+                    stop = True
+                    break
+                if not isinstance(nxt[0], WriteJob):
+                    # Обычная функция выполняется после группы, порядок очереди сохраняется
+                    pending = nxt
+                    break
+                group.append(nxt)
+                rows += nxt[0].rows
+            self._commit_group(conn, group, rows)
+
+    def _run_call(self, func: Callable[[], Any], future: Future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _commit_group(self, conn, group: List[_Item], rows: int):
+        group = [(job, future) for job, future in group if future.set_running_or_notify_cancel()]
+        if not group:
+            return
+        start = time.perf_counter()
+        try:
+            with self.connections.transaction():
+                apply_jobs(conn, [job for job, _ in group])
+        except Exception as e:
+            self.metrics.record_failure()
+            logger.error(f"Групповой коммит ({len(group)} записей) не удался, записываем по одной: {e}")
+            for job, future in group:
+                try:
+                    with self.connections.transaction():
+                        apply_jobs(conn, [job])
+                except Exception as job_error:
+                    future.set_exception(job_error)
+                else:
+                    future.set_result(job.result)
+            return
+        self.metrics.record(len(group), rows, (time.perf_counter() - start) * 1000)
+        for job, future in group:
+            future.set_result(job.result)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Дописывает уже поставленные задания и останавливает поток."""
+        self._queue.put(None)
+        self.join(timeout)
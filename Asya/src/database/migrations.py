@@ -0,0 +1,271 @@
+"""
+Версионированные миграции схемы clients.db и индексы горячих запросов.
+"""
+
+import logging
+import sqlite3
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from src.database.call_history import ensure_call_history_indexes
+from src.database.city_aliases import CREATE_CITY_ALIASES_SQL, install_region_triggers, rebuild_city_aliases
+from src.database.client_repository import ensure_change_tracking
+from src.database.partitions import CREATE_ARCHIVED_CALL_MONTHS_SQL
+from src.database.phone_keys import migrate_phone_keys
+
+logger = logging.getLogger(__name__)
+
+CREATE_SCHEMA_VERSION_SQL = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Колонки таблиц: (имя, объявление). Ключевые колонки (PRIMARY KEY / UNIQUE)
+# создаются только вместе с таблицей.
+TABLES: Dict[str, List[Tuple[str, str]]] = {
+    "clients_info": [
+        ("client_id", "TEXT PRIMARY KEY"),
+        ("phone", "TEXT UNIQUE"),
+        ("phone_e164", "TEXT"),  # Канонический номер +7XXXXXXXXXX (validation.normalize_phone)
+        ("name", "TEXT"),
+        ("city_name", "TEXT"),
+        ("region_code", "TEXT"),
+        ("region_name", "TEXT"),
+        ("inn", "TEXT"),
+        ("organization", "TEXT"),
+        ("comment", "TEXT"),
+        ("object", "TEXT"),
+        ("last_call_summary", "TEXT"),
+        ("call_summary_history", "TEXT"),
+        ("call_history", "TEXT"),  # JSON
+        ("is_duplicate_city", "BOOLEAN DEFAULT FALSE"),
+        ("is_repeat_call", "BOOLEAN DEFAULT FALSE"),
+        ("assigned_manager_id", "TEXT"),
+        ("assigned_manager_id1", "TEXT"),
+        ("assigned_manager_id2", "TEXT"),
+        ("created_at", "DATETIME DEFAULT CURRENT_TIMESTAMP"),
+        ("change_version", "INTEGER DEFAULT 0"),  # Версия "clients" в data_versions при последнем изменении
+    ],
+    "cities_map": [
+        ("city_id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("city_name", "TEXT"),
+        ("region_code", "TEXT"),
+        ("region_name", "TEXT"),
+        ("is_duplicate", "BOOLEAN"),
+        ("aliases", "TEXT"),  # CSV или JSON-список
+        ("phone_route_code", "TEXT"),
+    ],
+    "calls": [
+        ("call_id", "TEXT PRIMARY KEY"),
+        ("client_id", "TEXT REFERENCES clients_info(client_id)"),
+        ("timestamp", "DATETIME"),  # ISO
+        ("department", "TEXT"),
+        ("product_service", "TEXT"),
+        ("request_text", "TEXT"),
+        ("next_step", "TEXT"),
+        ("target_department", "TEXT"),
+        ("manager_id", "TEXT"),
+        ("is_repeat_call", "BOOLEAN DEFAULT FALSE"),
+        ("is_work_time", "BOOLEAN DEFAULT TRUE"),
+        ("llm_retry_count", "INTEGER DEFAULT 0"),
+        ("sip_status", "TEXT"),
+        ("fallback_triggered", "BOOLEAN DEFAULT FALSE"),
+    ],
+    "call_transcripts": [
+        ("transcript_id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("call_id", "TEXT REFERENCES calls(call_id)"),
+        ("client_id", "TEXT REFERENCES clients_info(client_id)"),
+        ("speaker", "TEXT"),
+        ("text", "TEXT"),
+        ("segment_id", "TEXT"),
+        ("segment_time", "DATETIME"),  # ISO
+        ("llm_response", "BOOLEAN DEFAULT FALSE"),
+    ],
+    "jsons": [
+        ("call_id", "TEXT PRIMARY KEY REFERENCES calls(call_id)"),
+        ("client_id", "TEXT REFERENCES clients_info(client_id)"),
+        ("timestamp", "DATETIME"),
+        ("json_data", "TEXT"),  # Старые записи; новые — сжатые в json_blob
+        ("json_blob", "BLOB"),  # zlib(компактный JSON), src.database.call_json
+        ("json_format", "TEXT"),
+    ],
+    "products": [
+        ("product_id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("official_name", "TEXT"),
+        ("slang_name", "TEXT"),  # CSV
+        ("department", "TEXT"),
+        ("is_archived", "BOOLEAN DEFAULT FALSE"),
+        ("weight_priority", "INTEGER DEFAULT 0"),
+        ("needs_clarification", "BOOLEAN"),
+        ("clarification_text", "TEXT"),
+        # Заполняются компилятором каталога (src.database.catalog_compiler)
+        ("description", "TEXT"),
+        ("technical_specs", "TEXT"),  # JSON {характеристика: значение}
+        ("price", "TEXT"),
+        ("url", "TEXT"),
+        ("content_hash", "TEXT"),
+    ],
+}
+
+# Индексы горячих запросов, которых нет в других модулях
+HOT_QUERY_INDEXES_SQL = [
+    # JSON-дампы клиента (история, отчёты)
+    "CREATE INDEX IF NOT EXISTS idx_jsons_client_timestamp ON jsons(client_id, timestamp)",
+    # Города региона (подсказка региона по номеру, выгрузки справочника)
+    "CREATE INDEX IF NOT EXISTS idx_cities_region ON cities_map(region_code)",
+]
+# Архивация по месяцам (src.database.partitions) выбирает звонки закрытого месяца пачками
+CALLS_TIMESTAMP_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_calls_timestamp ON calls(timestamp)"
+# В базах db_create.py у jsons нет первичного ключа — get_call_json сканировал таблицу
+JSONS_CALL_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_jsons_call_id ON jsons(call_id)"
+
+
+def _is_key_column(declaration: str) -> bool:
+    upper = declaration.upper()
+    return "PRIMARY KEY" in upper or "UNIQUE" in upper
+
+
+def create_table_sql(table: str) -> str:
+    columns = ",\n        ".join(f"{name} {declaration}" for name, declaration in TABLES[table])
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n        {columns}\n    )"
+
+
+def ensure_table(conn: sqlite3.Connection, table: str) -> List[str]:
+    """
+    Создаёт таблицу по TABLES или добавляет в существующую недостающие колонки.
+
+    Returns:
+        list: Добавленные колонки.
+    """
+    conn.execute(create_table_sql(table))
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    added = []
+    for name, declaration in TABLES[table]:
+        if name in existing or _is_key_column(declaration):
+            continue
+        # ALTER TABLE ADD COLUMN не принимает неконстантное значение по умолчанию
+        declaration = declaration.replace(" DEFAULT CURRENT_TIMESTAMP", "")
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+        added.append(name)
+    if added:
+        logger.info(f"Миграция схемы: в {table} добавлены колонки {', '.join(added)}")
+    return added
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+# --- Миграции ---
+
+def _baseline_tables(conn: sqlite3.Connection):
+    """Все таблицы по TABLES, phone_e164, change_version и data_versions."""
+    for table in TABLES:
+        ensure_table(conn, table)
+    migrate_phone_keys(conn)
+    ensure_change_tracking(conn)
+
+
+def _regions_map_to_cities_map(conn: sqlite3.Connection):
+    """Строки regions_map (схема DatabaseManager) переносятся в cities_map, алиасы и триггеры региона — по cities_map."""
+    if _table_exists(conn, "regions_map"):
+        moved = conn.execute('''
+            INSERT INTO cities_map (city_name, region_code, region_name, is_duplicate, aliases, phone_route_code)
+            SELECT r.city_name, r.region_code, r.region_name, FALSE, r.aliases, r.phone_route_code
+            FROM regions_map AS r
+            WHERE r.city_name IS NOT NULL AND NOT EXISTS (
+                SELECT 1 FROM cities_map AS c
+                WHERE c.city_name = r.city_name AND c.region_code IS r.region_code
+            )
+        ''').rowcount
+        conn.execute("DROP TABLE regions_map")
+        logger.info(f"Миграция схемы: regions_map перенесена в cities_map ({moved} городов)")
+    conn.execute(CREATE_CITY_ALIASES_SQL)
+    rebuild_city_aliases(conn)
+    install_region_triggers(conn)
+
+
+def _hot_query_indexes(conn: sqlite3.Connection):
+    """Индексы истории звонков, реплик, JSON-дампов и городов региона."""
+    ensure_call_history_indexes(conn)
+    for sql in HOT_QUERY_INDEXES_SQL:
+        conn.execute(sql)
+    call_id_is_key = any(row[1] == "call_id" and row[5] for row in conn.execute("PRAGMA table_info(jsons)"))
+    if not call_id_is_key:
+        conn.execute(JSONS_CALL_INDEX_SQL)
+
+
+def _calls_timestamp_index(conn: sqlite3.Connection):
+    """Индекс calls(timestamp) для выборки звонков месяца при архивации."""
+    conn.execute(CALLS_TIMESTAMP_INDEX_SQL)
+
+
+def _archived_call_months(conn: sqlite3.Connection):
+    """Месяцы архивов со звонками клиента: история читает только нужные архивы."""
+    conn.execute(CREATE_ARCHIVED_CALL_MONTHS_SQL)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Connection], None]
+
+
+# Новая миграция — функция (conn) -> None в конце списка со следующим номером;
+# уже применённые миграции не меняются
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline_tables", _baseline_tables),
+    Migration(2, "regions_map_to_cities_map", _regions_map_to_cities_map),
+    Migration(3, "hot_query_indexes", _hot_query_indexes),
+    Migration(4, "calls_timestamp_index", _calls_timestamp_index),
+    Migration(5, "archived_call_months", _archived_call_months),
+]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """Номер последней применённой миграции (0 — база без schema_version)."""
+    if not _table_exists(conn, "schema_version"):
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, migrations: Sequence[Migration] = MIGRATIONS) -> List[int]:
+    """
+    Применяет недостающие миграции по порядку, каждую в своей транзакции.
+    Вызывать вне транзакции (соединение ConnectionManager или обычное).
+
+    Returns:
+        list: Номера применённых сейчас миграций.
+    """
+    if conn.in_transaction:
+        raise RuntimeError("migrate() нужно вызывать вне транзакции")
+    conn.execute(CREATE_SCHEMA_VERSION_SQL)
+    conn.commit()
+    applied = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version <= current_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Другой процесс мог применить миграцию, пока мы ждали блокировку
+            if migration.version <= current_version(conn):
+                conn.rollback()
+                continue
+            migration.apply(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)", (migration.version, migration.name)
+            )
+        except BaseException:
+            conn.rollback()
+            logger.error(f"Миграция схемы {migration.version} ({migration.name}) не применена, изменения откатаны")
+            raise
+        conn.commit()
+        applied.append(migration.version)
+        logger.info(f"Миграция схемы {migration.version} ({migration.name}) применена")
+    return applied
@@ -0,0 +1,303 @@
+"""
+Инкрементальная выгрузка звонков, реплик и полей JSON-дампов в Parquet по месяцам.
+
+Запуск (из папки Asya, например каждые 15 минут из cron):
+    python -m src.database.parquet_export ../clients.db ../reports/parquet [--chunk-size 2000]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.database.call_json import COMPACT_JSON_FORMAT, decode_call_json
+
+logger = logging.getLogger(__name__)
+
+# Звонков в одной пачке
+CHUNK_SIZE = 2000
+STATE_FILE = "_state.json"
+
+# Колонки наборов: (имя, тип). "dict" — строка со словарным кодированием,
+# "timestamp" — ISO-время из базы, разобранное в datetime.
+DATASETS: Dict[str, List[Tuple[str, str]]] = {
+    "calls": [
+        ("call_id", "string"),
+        ("client_id", "string"),
+        ("timestamp", "timestamp"),
+        ("department", "dict"),
+        ("product_service", "dict"),
+        ("request_text", "string"),
+        ("next_step", "dict"),
+        ("target_department", "dict"),
+        ("manager_id", "dict"),
+        ("is_repeat_call", "bool"),
+        ("is_work_time", "bool"),
+        ("llm_retry_count", "int"),
+        ("sip_status", "dict"),
+        ("fallback_triggered", "bool"),
+    ],
+    "call_transcripts": [
+        ("call_id", "string"),
+        ("client_id", "string"),
+        ("turn", "int"),
+        ("speaker", "dict"),
+        ("text", "string"),
+        ("segment_time", "timestamp"),
+        ("llm_response", "bool"),
+    ],
+    "call_details": [
+        ("call_id", "string"),
+        ("client_id", "string"),
+        ("city", "dict"),
+        ("region_code", "dict"),
+        ("region_name", "dict"),
+        ("company", "string"),
+        ("inn", "string"),
+        ("is_duplicate_city", "bool"),
+        ("product_service", "dict"),
+        ("transcript_turns", "int"),
+    ],
+}
+
+CALLS_CHUNK_SQL = '''
+    SELECT rowid, call_id, client_id, timestamp, department, product_service, request_text, next_step,
+           target_department, manager_id, is_repeat_call, is_work_time, llm_retry_count, sip_status,
+           fallback_triggered
+    FROM calls
+    WHERE rowid > ?
+    ORDER BY rowid
+    LIMIT ?
+'''
+# Список call_id пачки — один параметр (JSON-массив), без ограничения на число переменных
+TRANSCRIPTS_CHUNK_SQL = '''
+    SELECT call_id, client_id, speaker, text, segment_time, llm_response
+    FROM call_transcripts
+    WHERE call_id IN (SELECT value FROM json_each(?))
+    ORDER BY call_id, rowid
+'''
+JSONS_CHUNK_SQL = '''
+    SELECT call_id, client_id, json_data, json_blob, json_format
+    FROM jsons
+    WHERE call_id IN (SELECT value FROM json_each(?))
+'''
+
+
+def load_state(root: str) -> Dict[str, Any]:
+    """Отметка выгрузки ({"calls_rowid": N, ...}) или пустое состояние."""
+    try:
+        with open(os.path.join(root, STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"calls_rowid": 0}
+
+
+def save_state(root: str, state: Dict[str, Any]):
+    """Атомарная запись отметки (через временный файл и os.replace)."""
+    path = os.path.join(root, STATE_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _month(value: Any) -> str:
+    text = str(value or "")
+    return text[:7] if len(text) >= 7 and text[4] == "-" else "unknown"
+
+
+def _bool(value: Any) -> Optional[bool]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "да")
+    return bool(value)
+
+
+def call_detail_row(call_id: str, client_id: Optional[str], json_data: Optional[str],
+                    json_blob: Optional[bytes], json_format: Optional[str]) -> Dict[str, Any]:
+    """
+    Поля JSON-дампа звонка, нужные отчётам (без транскрипции).
+    Регион в дампе — словарь {"code", "name"} или строка с кодом.
+    """
+    if json_blob is not None and json_format == COMPACT_JSON_FORMAT:
+        document = decode_call_json(json_blob)
+    elif json_data:
+        document = json.loads(json_data)
+    else:
+        document = {}
+    client_data = document.get("client_data") or {}
+    request_details = document.get("request_details") or {}
+    region = client_data.get("region")
+    if not isinstance(region, dict):
+        region = {"code": region, "name": None}
+    transcription = document.get("transcription")
+    return {
+        "call_id": call_id,
+        "client_id": client_id,
+        "city": client_data.get("city"),
+        "region_code": region.get("code"),
+        "region_name": region.get("name"),
+        "company": client_data.get("company"),
+        "inn": client_data.get("inn"),
+        "is_duplicate_city": _bool(client_data.get("is_duplicate_city")),
+        "product_service": request_details.get("product_service"),
+        # Транскрипция ссылкой на call_transcripts — число реплик берётся из набора реплик
+        "transcript_turns": len(transcription) if isinstance(transcription, list) and transcription else None,
+    }
+
+
+def build_chunk(conn: sqlite3.Connection, calls: List[tuple]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """
+    Строки наборов для пачки звонков, сгруппированные по месяцу звонка.
+
+    Returns:
+        dict: {набор: {месяц: [строки]}}.
+    """
+    chunk: Dict[str, Dict[str, List[Dict[str, Any]]]] = {name: defaultdict(list) for name in DATASETS}
+    months: Dict[str, str] = {}
+    call_columns = [name for name, _ in DATASETS["calls"]]
+    for row in calls:
+        record = dict(zip(call_columns, row[1:]))
+        months[record["call_id"]] = _month(record["timestamp"])
+        chunk["calls"][months[record["call_id"]]].append(record)
+
+    call_ids = json.dumps(list(months))
+    turns: Dict[str, int] = defaultdict(int)
+    for call_id, client_id, speaker, text, segment_time, llm_response in conn.execute(TRANSCRIPTS_CHUNK_SQL, (call_ids,)):
+        turns[call_id] += 1
+        chunk["call_transcripts"][months[call_id]].append({
+            "call_id": call_id, "client_id": client_id, "turn": turns[call_id], "speaker": speaker,
+            "text": text, "segment_time": segment_time, "llm_response": llm_response,
+        })
+    for call_id, client_id, json_data, json_blob, json_format in conn.execute(JSONS_CHUNK_SQL, (call_ids,)):
+        try:
+            detail = call_detail_row(call_id, client_id, json_data, json_blob, json_format)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Выгрузка Parquet: не удалось разобрать JSON звонка {call_id}: {e}")
+            continue
+        if detail["transcript_turns"] is None:
+            detail["transcript_turns"] = turns.get(call_id, 0)
+        chunk["call_details"][months[call_id]].append(detail)
+    return chunk
+
+
+def _arrow_table(dataset: str, rows: Iterable[Dict[str, Any]]):
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(),
+        "dict": pa.dictionary(pa.int32(), pa.string()),
+        "timestamp": pa.timestamp("us"),
+        "bool": pa.bool_(),
+        "int": pa.int64(),
+    }
+    converters = {"timestamp": _parse_time, "bool": _bool, "dict": lambda v: None if v is None else str(v),
+                  "string": lambda v: None if v is None else str(v), "int": lambda v: None if v is None else int(v)}
+    rows = list(rows)
+    arrays, fields = [], []
+    for name, kind in DATASETS[dataset]:
+        values = [converters[kind](row.get(name)) for row in rows]
+        if kind == "dict":
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=types[kind]))
+        fields.append(pa.field(name, types[kind]))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def write_chunk(root: str, chunk: Dict[str, Dict[str, List[Dict[str, Any]]]], first_rowid: int,
+                compression: str = "zstd") -> int:
+    """
+    Пишет пачку: по файлу part-<первый rowid>.parquet на набор и месяц.
+
+    Returns:
+        int: Записано файлов.
+    """
+    import pyarrow.parquet as pq
+
+    written = 0
+    for dataset, by_month in chunk.items():
+        for month, rows in by_month.items():
+            if not rows:
+                continue
+            directory = os.path.join(root, dataset, f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            name = f"part-{first_rowid:012d}.parquet"
+            # Файлы на "." наборы pyarrow пропускают — недописанный файл не попадёт в отчёт
+            tmp_path = os.path.join(directory, f".{name}.tmp")
+            pq.write_table(_arrow_table(dataset, rows), tmp_path, compression=compression)
+            os.replace(tmp_path, os.path.join(directory, name))
+            written += 1
+    return written
+
+
+def export_incremental(db_path: str, root: str, chunk_size: int = CHUNK_SIZE,
+                       max_chunks: Optional[int] = None) -> Dict[str, int]:
+    """
+    Выгружает звонки после отметки в Parquet-наборы папки root.
+    Запускается чаще, чем архивация месяцев (src.database.partitions), — она удаляет звонки из живой базы.
+
+    Args:
+        db_path (str): База звонков (открывается только для чтения).
+        root (str): Папка выгрузки (наборы и _state.json).
+        chunk_size (int): Звонков в пачке (ограничивает память).
+        max_chunks (int): Остановиться после стольких пачек (None — до конца).
+
+    Returns:
+        dict: calls — выгружено звонков, chunks — пачек, files — файлов, calls_rowid — новая отметка.
+    """
+    os.makedirs(root, exist_ok=True)
+    state = load_state(root)
+    stats = {"calls": 0, "chunks": 0, "files": 0}
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        while max_chunks is None or stats["chunks"] < max_chunks:
+            calls = conn.execute(CALLS_CHUNK_SQL, (state["calls_rowid"], chunk_size)).fetchall()
+            if not calls:
+                break
+            chunk = build_chunk(conn, calls)
+            stats["files"] += write_chunk(root, chunk, calls[0][0])
+            stats["calls"] += len(calls)
+            stats["chunks"] += 1
+            state["calls_rowid"] = calls[-1][0]
+            state["exported_at"] = datetime.now().isoformat(timespec="seconds")
+            save_state(root, state)
+    finally:
+        conn.close()
+    stats["calls_rowid"] = state["calls_rowid"]
+    logger.info(f"Выгрузка Parquet: {stats['calls']} звонков, {stats['files']} файлов, отметка {state['calls_rowid']}")
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Инкрементальная выгрузка звонков в Parquet")
+    parser.add_argument("db_path", help="база звонков (clients.db)")
+    parser.add_argument("root", help="папка Parquet-наборов")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="звонков в одной пачке")
+    parser.add_argument("--max-chunks", type=int, default=None, help="остановиться после стольких пачек")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    stats = export_incremental(args.db_path, args.root, args.chunk_size, args.max_chunks)
+    print(f"Выгружено звонков: {stats['calls']} ({stats['chunks']} пачек, {stats['files']} файлов), "
+          f"отметка rowid {stats['calls_rowid']}")
+
+
+if __name__ == "__main__":
+    main()
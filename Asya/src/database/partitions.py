@@ -0,0 +1,297 @@
+"""
+Архивация звонков закрытых месяцев в archive_YYYY_MM.db и чтение истории через ATTACH.
+
+Запуск (из папки Asya, раз в месяц, например из cron):
+    python -m src.database.partitions ../clients.db --keep-months 3 [--vacuum]
+"""
+
+import argparse
+import glob
+import logging
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from src.database.call_history import fetch_recent_calls
+from src.database.call_json import load_call_json
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, которые уходят в архив (все связаны со звонком через call_id)
+ARCHIVED_TABLES = ("calls", "call_transcripts", "jsons")
+# Месяцев (включая текущий), которые остаются в живой базе
+KEEP_MONTHS = 3
+# Звонков в одной пачке переноса
+BATCH_SIZE = 500
+
+PARTITION_FILE_RE = re.compile(r"^archive_(\d{4})_(\d{2})\.db$")
+ARCHIVE_SCHEMA = "archive"
+
+# Месяцы архивов, в которых есть звонки клиента (таблица живой базы, миграция 5)
+CREATE_ARCHIVED_CALL_MONTHS_SQL = '''
+    CREATE TABLE IF NOT EXISTS archived_call_months (
+        client_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        PRIMARY KEY (client_id, month)
+    ) WITHOUT ROWID
+'''
+CLIENT_MONTHS_SQL = "SELECT month FROM main.archived_call_months WHERE client_id = ? ORDER BY month DESC"
+
+# Звонки месяца идут по индексу idx_calls_timestamp (миграция 4); перенесённые
+# строки удаляются, поэтому следующая пачка снова начинается с начала диапазона
+MONTH_BATCH_SQL = '''
+    SELECT call_id FROM main.calls
+    WHERE timestamp >= :start AND timestamp < :end
+    ORDER BY timestamp
+    LIMIT :limit
+'''
+
+
+def partition_name(month: str) -> str:
+    """Файл архива месяца "YYYY-MM"."""
+    return f"archive_{month.replace('-', '_')}.db"
+
+
+def _next_month(month: str) -> str:
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+
+
+def _month_shift(today: date, months_back: int) -> str:
+    index = today.year * 12 + today.month - 1 - months_back
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _placeholders(values: Sequence[Any]) -> str:
+    return ", ".join("?" * len(values))
+
+
+def _columns(conn: sqlite3.Connection, schema: str, table: str) -> List[tuple]:
+    return conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()
+
+
+def _ensure_archive_schema(conn: sqlite3.Connection, schema: str):
+    """Таблицы и индексы архивных таблиц по образцу живой базы плюс недостающие колонки."""
+    for table in ARCHIVED_TABLES:
+        create_sql = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        if create_sql is None:
+            raise ValueError(f"Таблица {table} не найдена в живой базе")
+        conn.execute(re.sub(
+            r"^CREATE TABLE\s+\"?\w+\"?", f"CREATE TABLE IF NOT EXISTS {schema}.{table}",
+            create_sql[0], count=1, flags=re.IGNORECASE,
+        ))
+        archived = {row[1] for row in _columns(conn, schema, table)}
+        for row in _columns(conn, "main", table):
+            if row[1] not in archived:
+                conn.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {row[1]} {row[2]}")
+        for (index_sql,) in conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+        ).fetchall():
+            conn.execute(re.sub(
+                r"^CREATE (UNIQUE )?INDEX\s+(IF NOT EXISTS\s+)?", lambda m: f"CREATE {m.group(1) or ''}INDEX IF NOT EXISTS {schema}.",
+                index_sql, count=1, flags=re.IGNORECASE,
+            ))
+
+
+def _copy_batch(conn: sqlite3.Connection, schema: str, call_ids: List[str]):
+    """Копия звонков пачки в архив (одна транзакция архива; повтор безопасен)."""
+    marks = _placeholders(call_ids)
+    try:
+        for table in ARCHIVED_TABLES:
+            columns = ", ".join(row[1] for row in _columns(conn, "main", table))
+            conn.execute(f"DELETE FROM {schema}.{table} WHERE call_id IN ({marks})", call_ids)
+            conn.execute(
+                f"INSERT INTO {schema}.{table} ({columns}) "
+                f"SELECT {columns} FROM main.{table} WHERE call_id IN ({marks}) ORDER BY rowid",
+                call_ids,
+            )
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def _delete_batch(conn: sqlite3.Connection, call_ids: List[str], month: str):
+    """Удаление перенесённых звонков из живой базы; месяц архива запоминается за их клиентами."""
+    marks = _placeholders(call_ids)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            f"INSERT OR IGNORE INTO main.archived_call_months (client_id, month) "
+            f"SELECT DISTINCT client_id, ? FROM main.calls WHERE call_id IN ({marks}) AND client_id IS NOT NULL",
+            [month, *call_ids],
+        )
+        for table in ARCHIVED_TABLES:
+            conn.execute(f"DELETE FROM main.{table} WHERE call_id IN ({marks})", call_ids)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def closed_months(conn: sqlite3.Connection, keep_months: int = KEEP_MONTHS, today: Optional[date] = None) -> List[str]:
+    """Месяцы ("YYYY-MM") со звонками старше keep_months последних месяцев (по индексу calls(timestamp))."""
+    cutoff = _month_shift(today or date.today(), keep_months - 1)
+    months = []
+    start = ""
+    while True:
+        row = conn.execute(
+            "SELECT MIN(timestamp) FROM main.calls WHERE timestamp >= ? AND timestamp < ?", (start, cutoff)
+        ).fetchone()
+        if not row or not row[0]:
+            return months
+        months.append(row[0][:7])
+        start = _next_month(months[-1])
+
+
+def archive_month(conn: sqlite3.Connection, db_dir: str, month: str, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Переносит звонки месяца в archive_YYYY_MM.db.
+    conn — отдельное соединение задачи архивации вне транзакции.
+
+    Returns:
+        int: Перенесено звонков.
+    """
+    path = os.path.join(db_dir, partition_name(month))
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+    try:
+        # Архив пишется редко: обычный журнал и полный fsync
+        conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.synchronous=FULL")
+        _ensure_archive_schema(conn, ARCHIVE_SCHEMA)
+        conn.execute(CREATE_ARCHIVED_CALL_MONTHS_SQL)
+        conn.commit()
+        moved = 0
+        while True:
+            call_ids = [row[0] for row in conn.execute(
+                MONTH_BATCH_SQL, {"start": month, "end": _next_month(month), "limit": batch_size}
+            ).fetchall()]
+            if not call_ids:
+                break
+            _copy_batch(conn, ARCHIVE_SCHEMA, call_ids)
+            _delete_batch(conn, call_ids, month)
+            moved += len(call_ids)
+        logger.info(f"Архивация {month}: перенесено {moved} звонков в {path}")
+        return moved
+    finally:
+        conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+
+def archive_closed_months(
+    db_path: str,
+    keep_months: int = KEEP_MONTHS,
+    batch_size: int = BATCH_SIZE,
+    vacuum: bool = False,
+    today: Optional[date] = None,
+) -> Dict[str, int]:
+    """
+    Переносит все закрытые месяцы в архивы.
+
+    Args:
+        db_path (str): Живая база (clients.db).
+        keep_months (int): Сколько последних месяцев (включая текущий) оставить.
+        batch_size (int): Звонков в одной пачке переноса.
+        vacuum (bool): После переноса ужать файл живой базы (VACUUM блокирует
+            её на время выполнения — запускать в тихое время).
+
+    Returns:
+        dict: {месяц: перенесено звонков}.
+    """
+    conn = sqlite3.connect(db_path, timeout=30.0)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        result = {
+            month: archive_month(conn, db_dir, month, batch_size)
+            for month in closed_months(conn, keep_months, today)
+        }
+        if result:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            if vacuum:
+                conn.execute("VACUUM")
+        return result
+    finally:
+        conn.close()
+
+
+class CallPartitions:
+    """
+    Чтение истории звонков с учётом архивов archive_YYYY_MM.db рядом с базой.
+    Архивы присоединяются к соединению потока только на время запроса.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_dir = None if db_path == ":memory:" else os.path.dirname(os.path.abspath(db_path))
+
+    def months(self) -> List[str]:
+        """Месяцы архивов, от новых к старым."""
+        if self.db_dir is None:
+            return []
+        months = []
+        for path in glob.glob(os.path.join(self.db_dir, "archive_*.db")):
+            match = PARTITION_FILE_RE.match(os.path.basename(path))
+            if match:
+                months.append(f"{match.group(1)}-{match.group(2)}")
+        return sorted(months, reverse=True)
+
+    @contextmanager
+    def attached(self, conn: sqlite3.Connection, month: str) -> Iterator[str]:
+        """Присоединяет архив месяца к соединению (вне транзакции); возвращает имя схемы."""
+        schema = f"p_{month.replace('-', '_')}"
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (os.path.join(self.db_dir, partition_name(month)),))
+        try:
+            yield schema
+        finally:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+    def client_months(self, conn: sqlite3.Connection, client_id: Any) -> List[str]:
+        """Месяцы архивов со звонками клиента, от новых к старым (по archived_call_months)."""
+        if self.db_dir is None:
+            return []
+        return [month for (month,) in conn.execute(CLIENT_MONTHS_SQL, (str(client_id),))]
+
+    def recent_calls(self, conn: sqlite3.Connection, client_id: Any, n: int = 3) -> List[Dict[str, Any]]:
+        """Последние n звонков клиента: живая база, затем архивы его месяцев от новых к старым."""
+        calls = fetch_recent_calls(conn, client_id, n)
+        if len(calls) >= n:
+            return calls
+        for month in self.client_months(conn, client_id):
+            if len(calls) >= n:
+                break
+            with self.attached(conn, month) as schema:
+                calls.extend(fetch_recent_calls(conn, client_id, n - len(calls), schema=schema))
+        return calls
+
+    def call_json(self, conn: sqlite3.Connection, call_id: str) -> Optional[Dict[str, Any]]:
+        """JSON-дамп звонка из живой базы или из архива."""
+        document = load_call_json(conn, call_id)
+        for month in self.months():
+            if document is not None:
+                break
+            with self.attached(conn, month) as schema:
+                document = load_call_json(conn, call_id, schema=schema)
+        return document
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Архивация закрытых месяцев звонков в archive_YYYY_MM.db")
+    parser.add_argument("db_path", help="живая база (clients.db)")
+    parser.add_argument("--keep-months", type=int, default=KEEP_MONTHS, help="сколько месяцев оставить в живой базе")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="звонков в одной пачке")
+    parser.add_argument("--vacuum", action="store_true", help="ужать файл живой базы после переноса")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    result = archive_closed_months(args.db_path, args.keep_months, args.batch_size, args.vacuum)
+    for month, moved in result.items():
+        print(f"{month}: перенесено звонков {moved} -> {partition_name(month)}")
+    if not result:
+        print("Закрытых месяцев для архивации нет.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Канонический ключ телефона клиента (E.164, "+7XXXXXXXXXX") в колонке
+clients_info.phone_e164 под уникальным индексом — поиск клиента по номеру.
+"""
+
+import logging
+import sqlite3
+from typing import Dict
+
+from src.utils.validation import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+PHONE_KEY_COLUMN = "phone_e164"
+
+CREATE_PHONE_KEY_INDEX_SQL = '''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_clients_phone_e164 ON clients_info(phone_e164)
+'''
+
+
+def migrate_phone_keys(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Добавляет в clients_info колонку phone_e164, заполняет её для строк, где она
+    пуста, и создаёт уникальный индекс. Повторный запуск дозаполняет только новые
+    строки. Коммит — на стороне вызывающего кода.
+
+    Если у нескольких клиентов один и тот же номер, ключ получает первый из них
+    (по rowid), у остальных phone_e164 остаётся NULL.
+
+    Returns:
+        dict: updated — заполнено ключей, duplicates — номеров-дублей,
+            invalid — номеров, которые не удалось нормализовать.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(clients_info)")}
+    if PHONE_KEY_COLUMN not in columns:
+        conn.execute(f"ALTER TABLE clients_info ADD COLUMN {PHONE_KEY_COLUMN} TEXT")
+
+    taken = {
+        key for (key,) in conn.execute(
+            f"SELECT {PHONE_KEY_COLUMN} FROM clients_info WHERE {PHONE_KEY_COLUMN} IS NOT NULL"
+        )
+    }
+    updates, duplicates, invalid = [], 0, 0
+    for rowid, phone in conn.execute(f'''
+        SELECT rowid, phone FROM clients_info
+        WHERE {PHONE_KEY_COLUMN} IS NULL AND phone IS NOT NULL AND phone != ''
+        ORDER BY rowid
+    ''').fetchall():
+        key = normalize_phone(phone)
+        if key is None:
+            invalid += 1
+        elif key in taken:
+            duplicates += 1
+        else:
+            taken.add(key)
+            updates.append((key, rowid))
+
+    conn.executemany(f"UPDATE clients_info SET {PHONE_KEY_COLUMN} = ? WHERE rowid = ?", updates)
+    conn.execute(CREATE_PHONE_KEY_INDEX_SQL)
+
+    if duplicates or invalid:
+        logger.warning(
+            f"phone_e164: {duplicates} номеров-дублей и {invalid} ненормализуемых номеров оставлены без ключа"
+        )
+    logger.info(f"phone_e164 заполнена для {len(updates)} клиентов")
+    return {"updated": len(updates), "duplicates": duplicates, "invalid": invalid}
+
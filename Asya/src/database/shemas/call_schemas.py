@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 class CallRequest(BaseModel):
     destination: str
@@ -14,4 +14,17 @@ class CallResponse(BaseModel):
     message: str
 
 class HangupRequest(BaseModel):
-    call_id: str
\ No newline at end of file
+    call_id: str
+
+class RecentCall(BaseModel):
+    call_id: str
+    timestamp: Optional[str] = None
+    department: Optional[str] = None
+    product_service: Optional[str] = None
+    summary: Optional[str] = None
+    next_step: Optional[str] = None
+    transcript_excerpt: Optional[str] = None
+
+class RecentCallsResponse(BaseModel):
+    client_id: str
+    calls: List[RecentCall]
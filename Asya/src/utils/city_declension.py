@@ -0,0 +1,119 @@
+"""
+Падежные формы названий городов для точного поиска в CityIndex.
+
+Клиенты говорят "из Москвы", "в Питере", "из Новоржева" — после отрезания
+предлога остаётся косвенный падеж, который fuzz.ratio сравнивает с
+именительным хуже, чем опечатку. Здесь по окончаниям строятся формы
+родительного, дательного, винительного, творительного и предложного
+падежей, чтобы такие упоминания находились одним поиском в словаре.
+
+Правила простые (без словарей морфологии): лишняя неправильная форма
+безвредна — она просто никогда не встретится в речи.
+"""
+
+from typing import List, Set
+
+# Падежи: родительный, дательный, винительный, творительный, предложный
+CASES = ("gen", "dat", "acc", "ins", "prep")
+
+# Части составных названий, которые не склоняются ("санкт петербург", "усть илимск")
+INDECLINABLE_WORDS = {"санкт", "усть", "нью", "на", "дону", "амуре", "волге"}
+
+# После этих согласных в родительном пишется "и", а не "ы"
+_VELAR_HUSHING = set("гкхжшчщ")
+_HUSHING = set("жшчщц")
+
+# Окончания прилагательных: (окончание, род, формы по CASES)
+_ADJECTIVE_ENDINGS = [
+    ("ний", "m", ("него", "нему", "ний", "ним", "нем")),
+    ("кий", "m", ("кого", "кому", "кий", "ким", "ком")),
+    ("ый", "m", ("ого", "ому", "ый", "ым", "ом")),
+    ("ий", "m", ("его", "ему", "ий", "им", "ем")),
+    ("ой", "m", ("ого", "ому", "ой", "ым", "ом")),
+    ("ая", "f", ("ой", "ой", "ую", "ой", "ой")),
+    ("яя", "f", ("ей", "ей", "юю", "ей", "ей")),
+    ("ое", "n", ("ого", "ому", "ое", "ым", "ом")),
+    ("ие", "p", ("их", "им", "ие", "ими", "их")),
+    ("ые", "p", ("ых", "ым", "ые", "ыми", "ых")),
+]
+
+
+def _adjective_forms(word: str) -> List[str]:
+    for ending, _, forms in _ADJECTIVE_ENDINGS:
+        if word.endswith(ending) and len(word) > len(ending) + 1:
+            stem = word[: -len(ending)]
+            return [stem + form for form in forms]
+    return []
+
+
+def _noun_forms(word: str) -> List[List[str]]:
+    """Варианты склонения существительного: список наборов форм по CASES."""
+    if len(word) < 3:
+        return []
+    last, stem = word[-1], word[:-1]
+
+    if last == "а":
+        gen = stem + ("и" if stem[-1] in _VELAR_HUSHING else "ы")
+        ins = stem + ("ей" if stem[-1] in _HUSHING else "ой")
+        return [[gen, stem + "е", stem + "у", ins, stem + "е"]]
+    if last == "я":
+        if stem.endswith("и"):
+            return [[stem + "и", stem + "и", stem + "ю", stem + "ей", stem + "и"]]
+        return [[stem + "и", stem + "е", stem + "ю", stem + "ей", stem + "е"]]
+    if last == "ь":
+        # Пермь, Тверь (ж. р.) или Ярославль, Царицын... (м. р.) — строим оба варианта
+        feminine = [stem + "и", stem + "и", word, word + "ю", stem + "и"]
+        masculine = [stem + "я", stem + "ю", word, stem + "ем", stem + "е"]
+        return [feminine, masculine]
+    if last == "й":
+        return [[stem + "я", stem + "ю", word, stem + "ем", stem + "е"]]
+    if last == "о":
+        # Иваново, Пушкино: "из Иванова", "в Иванове" (в разговоре часто не склоняют)
+        return [[stem + "а", stem + "у", word, stem + "ом", stem + "е"]]
+    if last in "еиуюыэ":
+        # Сочи, Тольятти, Улан-Удэ — не склоняются
+        return []
+    # Твёрдая согласная: Омск, Новоржев, Екатеринбург
+    ins = word + ("ем" if last in _HUSHING else "ом")
+    return [[word + "а", word + "у", word, ins, word + "е"]]
+
+
+def _word_variants(word: str) -> List[List[str]]:
+    if word in INDECLINABLE_WORDS:
+        return [[word] * len(CASES)]
+    adjective = _adjective_forms(word)
+    if adjective:
+        return [adjective]
+    return _noun_forms(word) or [[word] * len(CASES)]
+
+
+def city_case_forms(name: str) -> Set[str]:
+    """
+    Падежные формы названия (в нижнем регистре, без исходной формы).
+
+    Составные названия склоняются по словам ("нижний новгород" ->
+    "нижнего новгорода"), слова после "на" не меняются ("ростова на дону").
+    """
+    words = str(name).strip().lower().replace("-", " ").split()
+    if not words:
+        return set()
+    if "на" in words:
+        split = words.index("на")
+        head, tail = words[:split], words[split:]
+    else:
+        head, tail = words, []
+
+    # Для каждого падежа перебираем варианты слов (обычно вариант один)
+    phrases: Set[str] = set()
+    for case_idx in range(len(CASES)):
+        case_phrases = [[]]
+        for word in head:
+            case_phrases = [
+                prefix + [variant[case_idx]]
+                for prefix in case_phrases
+                for variant in _word_variants(word)
+            ]
+        phrases.update(" ".join(phrase + tail) for phrase in case_phrases)
+
+    phrases.discard(" ".join(words))
+    return phrases
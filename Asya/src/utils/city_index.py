@@ -0,0 +1,487 @@
+"""
+Индекс городов для быстрого определения города и региона клиента.
+
+Заменяет полный перебор таблицы cities_map (iterrows + fuzz.ratio по каждому
+городу и каждому алиасу) на три шага:
+1. точный поиск по нормализованному названию/алиасу в словаре;
+2. отбор кандидатов по общим триграммам;
+3. fuzz.ratio только для нескольких десятков кандидатов.
+
+На шаге 1 учитываются и падежные формы названий ("москвы", "в питере" ->
+"питере"), сгенерированные при построении индекса (city_declension), так что
+fuzzy-поиск остаётся для настоящих опечаток и ошибок распознавания речи.
+Доля точных попаданий видна в lookup_stats().
+
+Порог совпадения тот же, что и раньше: score > 70.
+
+resolve_city() — единый API поверх индекса для скриптов диалога и
+DatabaseManager: город, регион, is_duplicate и phone_route_code за один
+проход, с LRU-кэшем последних запросов.
+"""
+
+import csv
+import heapq
+import json
+import logging
+import re
+import sqlite3
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz as rapid_fuzz
+from rapidfuzz import process
+from thefuzz import fuzz
+
+from src.utils.city_declension import city_case_forms
+
+logger = logging.getLogger(__name__)
+
+# Порог fuzzy-совпадения (как в старом get_region / normalize_city_name)
+FUZZY_THRESHOLD = 70
+
+# Сколько кандидатов после триграммного фильтра проверяем через fuzz.ratio
+MAX_CANDIDATES = 40
+
+# Размер LRU-кэша resolve_city: звонящие называют одни и те же несколько десятков городов
+RESOLVE_CACHE_SIZE = 1024
+
+# Фразы вида "я из Москвы", "город Тула", "г. Казань"
+CITY_PHRASE_PATTERNS = [
+    re.compile(r'из\s+([а-яА-ЯёЁ\-]+)'),
+    re.compile(r'в\s+([а-яА-ЯёЁ\-]+)'),
+    re.compile(r'город\s+([а-яА-ЯёЁ\-]+)'),
+    re.compile(r'г\.\s*([а-яА-ЯёЁ\-]+)'),
+    re.compile(r'г\s+([а-яА-ЯёЁ\-]+)'),
+]
+
+
+def _is_missing(value: Any) -> bool:
+    """None, NaN из pandas или пустая строка."""
+    if value is None:
+        return True
+    if isinstance(value, float) and value != value:
+        return True
+    return not str(value).strip()
+
+
+def normalize_city_key(text: str) -> str:
+    """
+    Ключ для точного поиска: нижний регистр, ё -> е,
+    дефисы и повторяющиеся пробелы схлопываются в один пробел.
+    """
+    text = str(text).strip().lower().replace("ё", "е").replace("-", " ")
+    return " ".join(text.split())
+
+
+def parse_aliases(raw: Any) -> List[str]:
+    """
+    Разбирает поле aliases из cities_map.
+
+    В CSV алиасы лежат JSON-списком (["питер", "спб"]), в ручных записях —
+    строкой через запятую ("мск,moskva"). Поддерживаем оба формата.
+    """
+    if _is_missing(raw):
+        return []
+    text = str(raw).strip()
+    if text.startswith("["):
+        try:
+            parsed = json.loads(text)
+            if isinstance(parsed, list):
+                return [str(a).strip().lower() for a in parsed if not _is_missing(a)]
+        except ValueError:
+            pass
+    aliases = []
+    for alias in text.split(","):
+        alias = alias.strip().strip('[]"\'').strip().lower()
+        if alias:
+            aliases.append(alias)
+    return aliases
+
+
+def extract_city_phrase(text: str) -> str:
+    """Вырезает название города из фраз "из ...", "в ...", "город ...", "г. ..."."""
+    text = str(text).strip().lower()
+    for pattern in CITY_PHRASE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1).strip()
+    return text
+
+
+def _as_bool(value: Any) -> bool:
+    if _is_missing(value):
+        return False
+    return str(value).strip().lower() in ("1", "true")
+
+
+def _trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CityIndex:
+    """
+    Индекс по названиям городов и их алиасам.
+
+    Строится один раз из cities_map (DataFrame, CSV или таблица SQLite),
+    после чего lookup() работает за микросекунды вместо полного скана.
+    """
+
+    def __init__(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        name_field: str = "city_name",
+        aliases_field: str = "aliases",
+        threshold: int = FUZZY_THRESHOLD,
+        max_candidates: int = MAX_CANDIDATES,
+        declensions: bool = True,
+    ):
+        """
+        Args:
+            rows: Строки cities_map в виде словарей (порядок строк важен:
+                при равном score побеждает более ранняя строка, как в старом скане).
+            name_field: Колонка с названием города ("city_name" в SQLite,
+                "Город" в Clients.xlsx).
+            aliases_field: Колонка с алиасами.
+            threshold: Порог fuzz.ratio, выше которого город считается найденным.
+            max_candidates: Сколько кандидатов проверять через fuzz.ratio.
+            declensions: Добавить в точный поиск падежные формы названий и алиасов.
+        """
+        self.name_field = name_field
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+
+        self._rows: List[Dict[str, Any]] = []
+        # Термины (название или алиас) в порядке старого перебора
+        self._terms: List[str] = []
+        self._term_rows: List[int] = []
+        # Точное совпадение и совпадение после нормализации (ё/дефисы/пробелы)
+        self._exact: Dict[str, int] = {}
+        self._folded: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        # Падежные формы -> термин в именительном падеже (только точный поиск)
+        self._forms: Dict[str, int] = {}
+        # Одноимённые города (is_duplicate): нормализованное название -> строки
+        self._namesakes: Dict[str, List[int]] = {}
+        # Счётчики lookup: exact / declension / fuzzy / miss
+        self._stats: Dict[str, int] = dict.fromkeys(("exact", "declension", "fuzzy", "miss"), 0)
+
+        for row in rows:
+            if _is_missing(row.get(name_field)):
+                continue
+            row_idx = len(self._rows)
+            self._rows.append(row)
+            self._namesakes.setdefault(normalize_city_key(row[name_field]), []).append(row_idx)
+            terms = [str(row[name_field]).strip().lower()]
+            terms.extend(parse_aliases(row.get(aliases_field)))
+            for term in terms:
+                self._add_term(term, row_idx)
+
+        if declensions:
+            self._add_case_forms()
+
+        logger.info(
+            f"Индекс городов построен: {len(self._rows)} городов, {len(self._terms)} названий и алиасов, "
+            f"{len(self._forms)} падежных форм"
+        )
+
+    def _add_term(self, term: str, row_idx: int):
+        term_id = len(self._terms)
+        self._terms.append(term)
+        self._term_rows.append(row_idx)
+        self._exact.setdefault(term, term_id)
+        self._folded.setdefault(normalize_city_key(term), term_id)
+        for gram in _trigrams(term):
+            self._postings.setdefault(gram, []).append(term_id)
+
+    def _add_case_forms(self):
+        # Формы добавляются после всех названий: настоящее название другого
+        # города всегда важнее совпавшей с ним падежной формы
+        for term_id, term in enumerate(self._terms):
+            for form in city_case_forms(term):
+                key = normalize_city_key(form)
+                if key not in self._folded:
+                    self._forms.setdefault(key, term_id)
+
+    @classmethod
+    def from_dataframe(cls, df, **kwargs) -> "CityIndex":
+        """Строит индекс из pandas DataFrame (df_regions)."""
+        return cls(df.to_dict("records"), **kwargs)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, **kwargs) -> "CityIndex":
+        """Строит индекс из _Cities_maps_.csv."""
+        with open(csv_path, "r", encoding="utf-8-sig") as f:
+            return cls(list(csv.DictReader(f)), **kwargs)
+
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection, table: str = "cities_map", **kwargs) -> "CityIndex":
+        """Строит индекс из таблицы SQLite (cities_map или regions_map)."""
+        cursor = conn.execute(f"SELECT * FROM {table}")
+        columns = [col[0] for col in cursor.description]
+        return cls([dict(zip(columns, row)) for row in cursor.fetchall()], **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def surface_forms(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Все ключи точного поиска (названия, алиасы, падежные формы)
+        и строки их городов — для словарных детекторов вроде IntentDetector.
+        """
+        for key, term_id in self._folded.items():
+            yield key, self._rows[self._term_rows[term_id]]
+        for key, term_id in self._forms.items():
+            yield key, self._rows[self._term_rows[term_id]]
+
+    def region_names(self) -> Dict[str, str]:
+        """region_code -> region_name по строкам справочника (для текста прогноза региона)."""
+        return {
+            row["region_code"]: row["region_name"]
+            for row in self._rows
+            if not _is_missing(row.get("region_code")) and not _is_missing(row.get("region_name"))
+        }
+
+    def namesakes(self, row: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Все строки с тем же названием города (сама строка — тоже в списке)."""
+        key = normalize_city_key(row.get(self.name_field))
+        return [self._rows[i] for i in self._namesakes.get(key, ())]
+
+    def _candidates(self, query: str) -> List[int]:
+        """Кандидаты с общими триграммами, которые по длине могут пройти порог."""
+        counts: Dict[int, int] = {}
+        for gram in _trigrams(query):
+            for term_id in self._postings.get(gram, ()):
+                counts[term_id] = counts.get(term_id, 0) + 1
+
+        query_len = len(query)
+        candidates = []
+        for term_id in counts:
+            term_len = len(self._terms[term_id])
+            # Верхняя граница fuzz.ratio при идеальном совпадении более короткой строки
+            if 200 * min(query_len, term_len) / (query_len + term_len) > self.threshold:
+                candidates.append(term_id)
+
+        if len(candidates) > self.max_candidates:
+            candidates = heapq.nlargest(
+                self.max_candidates, candidates, key=lambda t: (counts[t], -t)
+            )
+        return sorted(candidates)
+
+    def _exact_match(self, query: str) -> Optional[Tuple[Dict[str, Any], int]]:
+        term_id = self._exact.get(query)
+        if term_id is None:
+            key = normalize_city_key(query)
+            term_id = self._folded.get(key)
+            if term_id is None:
+                term_id = self._forms.get(key)
+                if term_id is None:
+                    return None
+                # Падежная форма — тот же город, что и в именительном падеже
+                self._stats["declension"] += 1
+                return self._rows[self._term_rows[term_id]], 100
+        self._stats["exact"] += 1
+        term = self._terms[term_id]
+        score = 100 if term == query else fuzz.ratio(query, term)
+        return self._rows[self._term_rows[term_id]], score
+
+    def lookup(self, text: str, fuzzy: bool = True) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        Ищет город по названию или алиасу.
+
+        Args:
+            text: Название города в любом регистре и падеже.
+            fuzzy: False — только точный поиск (промах не попадает в статистику).
+
+        Returns:
+            (строка cities_map или None, лучший score). Строка возвращается,
+            только если score > threshold.
+        """
+        if _is_missing(text):
+            return None, 0
+        query = str(text).strip().lower()
+
+        exact = self._exact_match(query)
+        if exact is not None:
+            return exact
+        if not fuzzy:
+            return None, 0
+
+        best_term, best_score = None, 0
+        for term_id in self._candidates(query):
+            score = fuzz.ratio(query, self._terms[term_id])
+            if score > best_score:
+                best_term, best_score = term_id, score
+
+        if best_term is not None and best_score > self.threshold:
+            self._stats["fuzzy"] += 1
+            return self._rows[self._term_rows[best_term]], best_score
+        self._stats["miss"] += 1
+        return None, best_score
+
+    def lookup_many(self, texts: List[str], workers: int = 1) -> List[Tuple[Optional[Dict[str, Any]], int]]:
+        """
+        Пакетный lookup для массовой обработки (например, заполнения регионов).
+
+        Точные совпадения берутся из словаря, остальные уникальные строки
+        сравниваются со всеми названиями и алиасами одной матрицей
+        rapidfuzz.process.cdist — без фильтра кандидатов, т.е. как полный перебор.
+        """
+        results: List[Tuple[Optional[Dict[str, Any]], int]] = [(None, 0)] * len(texts)
+        pending: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            if _is_missing(text):
+                continue
+            query = str(text).strip().lower()
+            exact = self._exact_match(query)
+            if exact is not None:
+                results[i] = exact
+            else:
+                pending.setdefault(query, []).append(i)
+
+        if not pending or not self._terms:
+            return results
+
+        queries = list(pending)
+        # Округляем как thefuzz.fuzz.ratio, чтобы порог > 70 совпадал с lookup()
+        scores = np.rint(process.cdist(queries, self._terms, scorer=rapid_fuzz.ratio, dtype=np.float32, workers=workers))
+        # argmax берёт первый максимум — та же строка, что и в последовательном переборе
+        best_terms = scores.argmax(axis=1)
+        for q_idx, query in enumerate(queries):
+            term_id = int(best_terms[q_idx])
+            score = int(scores[q_idx, term_id])
+            row = self._rows[self._term_rows[term_id]] if score > self.threshold else None
+            self._stats["fuzzy" if row is not None else "miss"] += len(pending[query])
+            for i in pending[query]:
+                results[i] = (row, score)
+        return results
+
+    def lookup_stats(self) -> Dict[str, Any]:
+        """
+        Сколько lookup закончились точным поиском (название/алиас или падежная
+        форма), fuzzy-совпадением или не нашли город; exact_ratio — доля точных.
+        """
+        stats: Dict[str, Any] = dict(self._stats)
+        total = sum(self._stats.values())
+        found_exact = stats["exact"] + stats["declension"]
+        stats["total"] = total
+        stats["exact_ratio"] = found_exact / total if total else 0.0
+        return stats
+
+    def reset_stats(self):
+        for key in self._stats:
+            self._stats[key] = 0
+
+
+class CityResolver:
+    """
+    Единая точка определения города: каноническое название, регион,
+    is_duplicate, phone_route_code и score за один проход по индексу.
+
+    Результаты кэшируются в ограниченном LRU-кэше, счётчики попаданий
+    и промахов доступны через cache_info().
+    """
+
+    def __init__(self, index: CityIndex, cache_size: int = RESOLVE_CACHE_SIZE):
+        self.index = index
+        self._resolve_cached = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _resolve(self, query: str, region_hint: Tuple[str, ...] = ()) -> Optional[Dict[str, Any]]:
+        # Сначала вся строка ("ростов на дону"), затем город из фразы ("я из москвы");
+        # точный поиск (с падежными формами) по обоим вариантам идёт раньше fuzzy
+        city = extract_city_phrase(query)
+        candidates = [query] if city == query else [query, city]
+        row, score = None, 0
+        for fuzzy in (False, True):
+            for text in candidates:
+                row, score = self.index.lookup(text, fuzzy=fuzzy)
+                if row is not None:
+                    break
+            if row is not None:
+                break
+        if row is None:
+            return None
+        if region_hint and _as_bool(row.get("is_duplicate")) and row.get("region_code") not in region_hint:
+            # Одноимённые города: выбираем тот, что в регионе по номеру звонящего
+            for namesake in self.index.namesakes(row):
+                if namesake.get("region_code") in region_hint:
+                    row = namesake
+                    break
+        return {
+            "city_name": row.get(self.index.name_field),
+            "region_code": row.get("region_code"),
+            "region_name": row.get("region_name"),
+            "is_duplicate": _as_bool(row.get("is_duplicate")),
+            "phone_route_code": None if _is_missing(row.get("phone_route_code")) else row.get("phone_route_code"),
+            "score": score,
+        }
+
+    def resolve_city(self, text: str, region_hint: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Определяет город по тексту клиента.
+
+        Args:
+            text: Фраза или название города.
+            region_hint: Вероятные region_code (например, по номеру звонящего,
+                см. phone_regions.predict_region) — для выбора среди одноимённых городов.
+
+        Returns:
+            Словарь с ключами city_name, region_code, region_name, is_duplicate,
+            phone_route_code, score — или None, если город не найден.
+        """
+        if _is_missing(text):
+            return None
+        hint = tuple(region_hint) if region_hint else ()
+        result = self._resolve_cached(str(text).strip().lower(), hint)
+        # Копия, чтобы вызывающий код не испортил закэшированный результат
+        return dict(result) if result is not None else None
+
+    def cache_info(self) -> Dict[str, int]:
+        """Счётчики кэша — для подбора RESOLVE_CACHE_SIZE."""
+        info = self._resolve_cached.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+    def cache_clear(self):
+        self._resolve_cached.cache_clear()
+
+
+# Резолвер процесса диалога (final_sql.py и др.), ставится через set_city_index()
+_resolver: Optional[CityResolver] = None
+
+
+def set_city_index(index: CityIndex, cache_size: int = RESOLVE_CACHE_SIZE) -> CityResolver:
+    """Устанавливает индекс для resolve_city(). Старый кэш отбрасывается вместе со старым резолвером."""
+    global _resolver
+    _resolver = CityResolver(index, cache_size)
+    return _resolver
+
+
+def get_city_resolver() -> Optional[CityResolver]:
+    return _resolver
+
+
+def resolve_city(text: str, region_hint: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+    """resolve_city() поверх индекса, установленного через set_city_index()."""
+    if _resolver is None:
+        raise RuntimeError("Индекс городов не загружен: вызовите set_city_index()")
+    return _resolver.resolve_city(text, region_hint)
+
+
+# --- Для отладки: замер скорости на реальном справочнике ---
+if __name__ == "__main__":
+    import sys
+    import time
+
+    index = CityIndex.from_csv(sys.argv[1] if len(sys.argv) > 1 else "_Cities_maps_.csv")
+    queries = ["москва", "питер", "новосибирк", "екатеринбур", "кондопога", "неизвестноград"]
+    for q in queries:
+        row, score = index.lookup(q)
+        print(f"{q!r} -> {row[index.name_field] if row else None} (score: {score})")
+
+    n = 10000
+    start = time.perf_counter()
+    for i in range(n):
+        index.lookup(queries[i % len(queries)])
+    print(f"Среднее время lookup: {(time.perf_counter() - start) / n * 1e6:.1f} мкс")
+    print(f"Статистика: {index.lookup_stats()}")
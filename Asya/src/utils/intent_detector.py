@@ -0,0 +1,341 @@
+"""
+Словарный детектор упоминаний в репликах клиента.
+
+Заменяет проверку check_for_product_question (перебор списков ключевых слов
+и re.search по каждому вопросительному шаблону на каждую реплику):
+словарь из названий товаров каталога и их сленга, отделов
+(validation.VALID_DEPARTMENTS), городов (CityIndex, с падежными формами) и
+вопросительных фраз один раз компилируется в автомат Ахо-Корасик. Реплика
+просматривается за один проход, результат — типизированные фрагменты
+(product, department, city, question, number) с позициями в тексте.
+
+Совпадение засчитывается только с начала слова; после термина допускается
+короткое окончание ("маты", "бухгалтерию"), поэтому "мат" больше не
+находится внутри "материала" или "автомата". После коротких терминов (меньше
+пяти букв) — только грамматическое окончание: "матов", но не "матрас".
+
+Детектор перестраивается, только когда меняется каталог или справочник
+городов (ensure_intent_detector сравнивает отпечаток каталога).
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.utils.product_index import _as_bool, _is_missing, normalize_product_text, suffix_allowed
+from src.utils.validation import VALID_DEPARTMENTS
+
+logger = logging.getLogger(__name__)
+
+# Типы фрагментов; при одинаковой длине совпадения побеждает тип левее
+SPAN_TYPES = ("product", "department", "city", "question", "number")
+
+# Общие слова о продукции (были в check_for_product_question): товар по ним
+# не определить, но это вопрос о продукции
+PRODUCT_KEYWORDS = [
+    "мат", "вата", "утеплитель", "изоляция", "изолятор", "минвата", "минеральная вата",
+    "прошивной", "базальтовый", "теплоизоляция", "звукоизоляция", "огнезащита",
+]
+
+# Как клиенты называют отделы -> отдел из VALID_DEPARTMENTS
+DEPARTMENT_ALIASES = {
+    "коммерческ": "коммерческий",
+    "отдел продаж": "коммерческий",
+    "продаж": "коммерческий",
+    "менеджер": "коммерческий",
+    "бухгалтер": "бухгалтерский",
+    "логист": "логистика",
+    "доставк": "логистика",
+    "закупк": "закупки",
+    "снабжени": "закупки",
+    "маркетинг": "маркетинг",
+}
+
+# Вопросительные фразы (были в check_for_product_question)
+QUESTION_PATTERNS = [
+    "что такое", "расскажи", "информация", "характеристики", "сколько стоит", "сколько стоят",
+    "цена", "наличие", "есть ли", "продаете", "какая", "какой", "какие",
+]
+
+# Сколько букв окончания допускается после термина каждого типа
+SUFFIX_LIMITS = {"product": 3, "department": 4, "city": 0, "question": 3}
+
+# Названия городов короче не ищем: "мир", "бор" и т. п. совпадают с обычными словами
+MIN_CITY_LENGTH = 4
+
+
+@dataclass
+class IntentSpan:
+    """Найденный фрагмент реплики."""
+    type: str
+    start: int
+    end: int
+    text: str
+    # product — строка products (None для общих слов вроде "вата"),
+    # department — отдел из VALID_DEPARTMENTS, city — строка cities_map,
+    # question — фраза-шаблон, number — int или float
+    value: Any = None
+
+
+def normalize_scan_text(text: str) -> str:
+    """
+    Нижний регистр, ё -> е, всё кроме букв и цифр -> пробел.
+    Длина строки сохраняется, поэтому позиции совпадают с исходным текстом.
+    """
+    chars = []
+    for ch in str(text):
+        low = ch.lower()
+        if len(low) != 1:
+            low = ch
+        chars.append(low if low.isalnum() else " ")
+    return "".join(chars).replace("ё", "е")
+
+
+def catalog_fingerprint(products: Iterable[Dict[str, Any]]) -> str:
+    """Отпечаток названий товаров каталога: меняется, только если детектор нужно перестроить."""
+    digest = hashlib.sha1()
+    for row in products:
+        for field in ("official_name", "slang_name"):
+            value = row.get(field)
+            digest.update(b"" if _is_missing(value) else str(value).encode("utf-8"))
+            digest.update(b"\x1f")
+        digest.update(b"1" if _as_bool(row.get("is_archived")) else b"0")
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+class IntentDetector:
+    """
+    Автомат Ахо-Корасик по словарю товаров, отделов, городов и вопросов.
+
+    Строится один раз (при загрузке каталога), scan() работает за один
+    проход по реплике независимо от размера словаря.
+    """
+
+    def __init__(
+        self,
+        products: Iterable[Dict[str, Any]] = (),
+        city_index=None,
+        departments: Optional[Dict[str, str]] = None,
+        product_keywords: Iterable[str] = PRODUCT_KEYWORDS,
+        question_patterns: Iterable[str] = QUESTION_PATTERNS,
+    ):
+        """
+        Args:
+            products: Строки products (архивные товары пропускаются).
+            city_index: CityIndex — названия, алиасы и падежные формы городов.
+            departments: Термин -> отдел; по умолчанию VALID_DEPARTMENTS и DEPARTMENT_ALIASES.
+            product_keywords: Общие слова о продукции без привязки к товару.
+            question_patterns: Вопросительные фразы.
+        """
+        products = list(products)
+        self.fingerprint = catalog_fingerprint(products)
+        self.city_index = city_index
+
+        # Автомат: переходы, суффиксные ссылки, номера терминов в каждом состоянии
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        # Термины: (длина, тип, значение, допустимое окончание, последнее слово термина)
+        self._patterns: List[Tuple[int, str, Any, int, str]] = []
+        self._seen: set = set()
+
+        for row in products:
+            if _as_bool(row.get("is_archived")):
+                continue
+            names = []
+            if not _is_missing(row.get("official_name")):
+                names.append(row["official_name"])
+            if not _is_missing(row.get("slang_name")):
+                names.extend(str(row["slang_name"]).split(","))
+            for name in names:
+                self._add("product", normalize_product_text(name), row)
+        for keyword in product_keywords:
+            self._add("product", normalize_product_text(keyword), None)
+
+        if departments is None:
+            departments = {d: d for d in VALID_DEPARTMENTS}
+            departments.update(DEPARTMENT_ALIASES)
+        for term, department in departments.items():
+            self._add("department", normalize_scan_text(term).strip(), department)
+
+        if city_index is not None:
+            for key, row in city_index.surface_forms():
+                if len(key) >= MIN_CITY_LENGTH:
+                    self._add("city", key, row)
+
+        for pattern in question_patterns:
+            self._add("question", normalize_scan_text(pattern).strip(), pattern)
+
+        self._build_failure_links()
+        del self._seen
+        logger.info(
+            f"Детектор упоминаний построен: {len(self._patterns)} терминов, {len(self._goto)} состояний"
+        )
+
+    def _add(self, span_type: str, term: str, value: Any):
+        if not term:
+            return
+        # Один и тот же термин одного товара (официальное = сленговое) — один раз
+        key = (span_type, term, id(value) if isinstance(value, dict) else value)
+        if key in self._seen:
+            return
+        self._seen.add(key)
+
+        state = 0
+        for ch in term:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append(len(self._patterns))
+        self._patterns.append((len(term), span_type, value, SUFFIX_LIMITS[span_type], term.rsplit(" ", 1)[-1]))
+
+    def _build_failure_links(self):
+        # Обход в ширину: суффиксная ссылка состояния ведёт в самый длинный
+        # собственный суффикс, который тоже есть в автомате
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                # Термины, заканчивающиеся в суффиксе, заканчиваются и здесь
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def scan(self, text: str) -> List[IntentSpan]:
+        """
+        Все упоминания в реплике за один проход, без пересечений: слева
+        направо, при общем начале — самое длинное (при равной длине — по SPAN_TYPES).
+        """
+        if _is_missing(text):
+            return []
+        text = str(text)
+        norm = normalize_scan_text(text)
+        n = len(norm)
+        found: List[Tuple[int, int, int, str, Any]] = []
+
+        state = 0
+        num_start = -1
+        for i, ch in enumerate(norm):
+            # Числа: "50", "2,5", "0.8" (разделитель — между цифрами)
+            if ch.isdigit():
+                if num_start < 0:
+                    num_start = i
+            elif num_start >= 0 and not (text[i] in ",." and i + 1 < n and norm[i + 1].isdigit()):
+                found.append(self._number_span(text, num_start, i))
+                num_start = -1
+
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for pattern_id in self._out[state]:
+                length, span_type, value, max_suffix, last_word = self._patterns[pattern_id]
+                start = i - length + 1
+                if start > 0 and norm[start - 1].isalnum():
+                    continue
+                end = i + 1
+                while end < n and norm[end].isalpha():
+                    end += 1
+                if not suffix_allowed(last_word, norm[i + 1:end], max_suffix) or (end < n and norm[end].isdigit()):
+                    continue
+                found.append((start, end, SPAN_TYPES.index(span_type), span_type, value))
+        if num_start >= 0:
+            found.append(self._number_span(text, num_start, n))
+
+        # Слева направо, при общем начале — длинные первыми
+        found.sort(key=lambda f: (f[0], f[0] - f[1], f[2]))
+        spans: List[IntentSpan] = []
+        last_end = 0
+        for start, end, _, span_type, value in found:
+            if start < last_end:
+                continue
+            spans.append(IntentSpan(span_type, start, end, text[start:end], value))
+            last_end = end
+        return spans
+
+    @staticmethod
+    def _number_span(text: str, start: int, end: int) -> Tuple[int, int, int, str, Any]:
+        raw = text[start:end].replace(",", ".")
+        value = float(raw) if "." in raw else int(raw)
+        return start, end, SPAN_TYPES.index("number"), "number", value
+
+    def products(self, text: str) -> Tuple[bool, List[Dict[str, Any]]]:
+        """
+        Упоминание продукции в реплике: (есть ли упоминание, строки
+        названных товаров без повторов в порядке упоминания).
+        """
+        mentioned, rows, seen = False, [], set()
+        for span in self.scan(text):
+            if span.type != "product":
+                continue
+            mentioned = True
+            if span.value is not None and id(span.value) not in seen:
+                seen.add(id(span.value))
+                rows.append(span.value)
+        return mentioned, rows
+
+
+# Детектор процесса диалога, перестраивается через ensure_intent_detector()
+_detector: Optional[IntentDetector] = None
+
+
+def ensure_intent_detector(products: Iterable[Dict[str, Any]], city_index=None) -> IntentDetector:
+    """
+    Возвращает текущий детектор, перестраивая его только если изменились
+    названия товаров каталога или справочник городов (другой CityIndex).
+    """
+    global _detector
+    products = list(products)
+    if (
+        _detector is None
+        or _detector.city_index is not city_index
+        or _detector.fingerprint != catalog_fingerprint(products)
+    ):
+        _detector = IntentDetector(products, city_index=city_index)
+    return _detector
+
+
+def get_intent_detector() -> Optional[IntentDetector]:
+    return _detector
+
+
+# --- Для отладки: замер скорости на синтетическом каталоге ---
+if __name__ == "__main__":
+    import random
+    import time
+
+    random.seed(0)
+    stems = ["мат", "вата", "шнур", "плита", "цилиндр", "лента", "мастика", "ткань", "картон", "рулон"]
+    kinds = ["базальтовый", "прошивной", "минеральный", "огнезащитный", "теплоизоляционный"]
+    rows = [
+        {"official_name": f"{random.choice(kinds)} {random.choice(stems)} {i}", "slang_name": f"{random.choice(stems)}{i}"}
+        for i in range(5000)
+    ]
+    start = time.perf_counter()
+    detector = IntentDetector(rows)
+    print(f"Построение: {(time.perf_counter() - start) * 1000:.0f} мс, {len(detector)} терминов")
+    utterances = [
+        "Здравствуйте, сколько стоит прошивной мат 120, нужно 50 рулонов",
+        "соедините с бухгалтерией пожалуйста",
+        "а есть ли в наличии шнур базальтовый?",
+    ]
+    n = 5000
+    start = time.perf_counter()
+    for i in range(n):
+        detector.scan(utterances[i % len(utterances)])
+    print(f"Среднее время scan: {(time.perf_counter() - start) / n * 1e6:.1f} мкс")
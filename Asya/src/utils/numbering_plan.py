@@ -0,0 +1,166 @@
+"""
+Префиксы мобильных номеров (DEF) по федеральным округам из выписки реестра плана нумерации.
+
+Обновление (из папки Asya, после скачивания выписки с opendata.digital.gov.ru):
+    python -m src.utils.numbering_plan DEF-9xx.csv [ABC-3xx.csv ...] -o data/phone_def_prefixes.csv
+"""
+
+import argparse
+import csv
+import logging
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+from src.utils.phone_regions import DEF_PREFIXES_PATH
+
+logger = logging.getLogger(__name__)
+
+# Цифр номера после кода ABC/DEF
+LOCAL_DIGITS = 7
+
+# Основы названий субъектов -> федеральный округ (region_code cities_map).
+# Сверяются от длинных к коротким, совпавшая основа вырезается из строки:
+# "ямало-ненецк" не даёт лишнего совпадения "ненецк", "томск" — "омск".
+SUBJECT_DISTRICTS: Dict[str, str] = {
+    # Центральный ФО
+    "белгород": "сentral_fd", "брянск": "сentral_fd", "владимир": "сentral_fd", "воронеж": "сentral_fd",
+    "иванов": "сentral_fd", "калуж": "сentral_fd", "костром": "сentral_fd", "курск": "сentral_fd",
+    "липецк": "сentral_fd", "москв": "сentral_fd", "московск": "сentral_fd", "орлов": "сentral_fd",
+    "рязан": "сentral_fd", "смолен": "сentral_fd", "тамбов": "сentral_fd", "твер": "сentral_fd",
+    "тульск": "сentral_fd", "ярослав": "сentral_fd",
+    # Северо-Западный ФО
+    "карел": "north-western_fd", "коми": "north-western_fd", "архангел": "north-western_fd",
+    "ненецк": "north-western_fd", "вологод": "north-western_fd", "калининград": "north-western_fd",
+    "ленинград": "north-western_fd", "петербург": "north-western_fd", "мурман": "north-western_fd",
+    "новгород": "north-western_fd", "псков": "north-western_fd",
+    # Южный ФО
+    "адыге": "southern_fd", "калмык": "southern_fd", "крым": "southern_fd", "севастопол": "southern_fd",
+    "краснодар": "southern_fd", "астрахан": "southern_fd", "волгоград": "southern_fd", "ростов": "southern_fd",
+    "донецк": "southern_fd", "луганск": "southern_fd", "запорож": "southern_fd", "херсон": "southern_fd",
+    # Северо-Кавказский ФО
+    "дагестан": "north-caucasian_fd", "ингуш": "north-caucasian_fd", "кабардин": "north-caucasian_fd",
+    "карачаев": "north-caucasian_fd", "осети": "north-caucasian_fd", "чечен": "north-caucasian_fd",
+    "ставрополь": "north-caucasian_fd",
+    # Приволжский ФО
+    "башкор": "privolzhsky_fd", "марий": "privolzhsky_fd", "мордов": "privolzhsky_fd",
+    "татарстан": "privolzhsky_fd", "удмурт": "privolzhsky_fd", "чуваш": "privolzhsky_fd",
+    "перм": "privolzhsky_fd", "коми-пермяцк": "privolzhsky_fd", "киров": "privolzhsky_fd",
+    "нижегород": "privolzhsky_fd", "нижний новгород": "privolzhsky_fd", "оренбург": "privolzhsky_fd",
+    "пенз": "privolzhsky_fd", "самар": "privolzhsky_fd", "саратов": "privolzhsky_fd", "ульянов": "privolzhsky_fd",
+    # Уральский ФО
+    "курган": "ural_fd", "свердлов": "ural_fd", "тюмен": "ural_fd", "челябин": "ural_fd",
+    "ханты": "ural_fd", "югра": "ural_fd", "ямал": "ural_fd", "ямало-ненецк": "ural_fd",
+    # Сибирский ФО
+    "алтай": "siberian_fd", "тыва": "siberian_fd", "тува": "siberian_fd", "хакас": "siberian_fd",
+    "краснояр": "siberian_fd", "иркут": "siberian_fd", "кемеров": "siberian_fd", "кузбасс": "siberian_fd",
+    "новосибир": "siberian_fd", "омск": "siberian_fd", "томск": "siberian_fd",
+    # Дальневосточный ФО (Бурятия и Забайкалье — с 2018 года)
+    "бурят": "eastern_fd", "якут": "eastern_fd", "саха": "eastern_fd", "забайкал": "eastern_fd",
+    "камчат": "eastern_fd", "примор": "eastern_fd", "хабаровск": "eastern_fd", "амурск": "eastern_fd",
+    "магадан": "eastern_fd", "сахалин": "eastern_fd", "еврейск": "eastern_fd", "чукот": "eastern_fd",
+}
+_SUBJECT_KEYS = sorted(SUBJECT_DISTRICTS, key=len, reverse=True)
+
+
+def subject_districts(region_text: str) -> FrozenSet[str]:
+    """Федеральные округа субъектов из колонки "Регион" реестра (пустое множество — не распознано)."""
+    text = " ".join(str(region_text or "").lower().replace("ё", "е").split())
+    districts: Set[str] = set()
+    for key in _SUBJECT_KEYS:
+        if key in text:
+            districts.add(SUBJECT_DISTRICTS[key])
+            text = text.replace(key, " ")
+    return frozenset(districts)
+
+
+def range_prefixes(start: int, end: int, width: int = LOCAL_DIGITS) -> List[str]:
+    """Минимальный набор десятичных префиксов длины <= width, покрывающий [start, end]."""
+    prefixes = []
+    while start <= end:
+        power = 0
+        while power < width and start % 10 ** (power + 1) == 0 and start + 10 ** (power + 1) - 1 <= end:
+            power += 1
+        prefixes.append(str(start).zfill(width)[:width - power])
+        start += 10 ** power
+    return prefixes
+
+
+def _read_rows(path: str) -> Iterator[List[str]]:
+    # Свежие выписки в UTF-8, старые — в cp1251
+    for encoding in ("utf-8-sig", "cp1251"):
+        try:
+            with open(path, "r", encoding=encoding, newline="") as f:
+                rows = list(csv.reader(f, delimiter=";"))
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError(f"Не удалось определить кодировку {path}")
+    for row in rows[1:]:
+        if len(row) >= 6:
+            yield row
+
+
+def registry_prefixes(paths: Iterable[str]) -> Dict[str, FrozenSet[str]]:
+    """
+    Префиксы номера (10 цифр без +7) -> федеральные округа по выпискам реестра.
+    Строки без распознанного субъекта (например, "Российская Федерация") пропускаются.
+    """
+    prefixes: Dict[str, Set[str]] = defaultdict(set)
+    skipped = 0
+    for path in paths:
+        for row in _read_rows(path):
+            code, start, end, region_text = row[0].strip(), row[1].strip(), row[2].strip(), row[5]
+            districts = subject_districts(region_text)
+            if not (code.isdigit() and start.isdigit() and end.isdigit()) or not districts:
+                skipped += 1
+                continue
+            for local_prefix in range_prefixes(int(start), int(end)):
+                prefixes[code + local_prefix] |= districts
+    if skipped:
+        logger.info(f"Реестр нумерации: пропущено {skipped} строк без распознанного субъекта")
+    return collapse_prefixes({prefix: frozenset(districts) for prefix, districts in prefixes.items()})
+
+
+def collapse_prefixes(prefixes: Dict[str, FrozenSet[str]]) -> Dict[str, FrozenSet[str]]:
+    """Сворачивает десять дочерних префиксов с одинаковыми округами в родительский."""
+    result = dict(prefixes)
+    for length in range(max(map(len, result), default=0), 1, -1):
+        children: Dict[str, List[FrozenSet[str]]] = defaultdict(list)
+        for prefix, districts in result.items():
+            if len(prefix) == length:
+                children[prefix[:-1]].append(districts)
+        for parent, child_districts in children.items():
+            if len(child_districts) == 10 and len(set(child_districts)) == 1 and parent not in result:
+                for digit in "0123456789":
+                    del result[parent + digit]
+                result[parent] = child_districts[0]
+    return result
+
+
+def write_prefixes(prefixes: Dict[str, FrozenSet[str]], output_path: str = str(DEF_PREFIXES_PATH)) -> int:
+    """Пишет файл prefix,region_code,comment (по строке на округ префикса). Возвращает число строк."""
+    rows: List[Tuple[str, str]] = sorted(
+        (prefix, district) for prefix, districts in prefixes.items() for district in sorted(districts)
+    )
+    with open(output_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["prefix", "region_code", "comment"])
+        for prefix, district in rows:
+            writer.writerow([prefix, district, "реестр нумерации"])
+    return len(rows)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Префиксы DEF/ABC из выписки реестра плана нумерации")
+    parser.add_argument("registry", nargs="+", help="файлы выписки (DEF-9xx.csv, ABC-*.csv)")
+    parser.add_argument("-o", "--output", default=str(DEF_PREFIXES_PATH), help="файл префиксов")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    written = write_prefixes(registry_prefixes(args.registry), args.output)
+    print(f"Записано префиксов: {written} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
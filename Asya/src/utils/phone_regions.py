@@ -0,0 +1,170 @@
+"""
+Предварительное определение региона по номеру звонящего.
+
+Префиксное дерево (trie) по цифрам номера без кода страны: коды ABC
+стационарных номеров из data/phone_prefixes.csv, диапазоны DEF мобильных
+номеров из data/phone_def_prefixes.csv (строится из реестра плана нумерации,
+см. src.utils.numbering_plan), плюс phone_route_code из cities_map. Побеждает
+самый длинный совпавший префикс, поэтому диапазоны DEF (например, 9122)
+лежат рядом с трёхзначными кодами.
+
+Прогноз доступен уже на StasisStart — до того, как клиент назвал город:
+бот может подтвердить регион вместо вопроса, а CityResolver использует его,
+чтобы выбрать один из одноимённых городов (is_duplicate).
+"""
+
+import csv
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.utils.validation import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFIXES_PATH = Path(__file__).resolve().parents[2] / "data" / "phone_prefixes.csv"
+DEF_PREFIXES_PATH = Path(__file__).resolve().parents[2] / "data" / "phone_def_prefixes.csv"
+
+
+def phone_digits(phone: str) -> Optional[str]:
+    """Десять цифр номера после кода страны (+7) или None для некорректного номера."""
+    normalized = normalize_phone(phone)
+    if normalized:
+        return normalized[2:]
+    # Городской номер без восьмёрки (3431234567) normalize_phone не принимает
+    digits = "".join(filter(str.isdigit, str(phone or "")))
+    return digits if len(digits) == 10 else None
+
+
+class PhonePrefixTrie:
+    """Дерево префиксов номера -> список возможных region_code."""
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+        self._size = 0
+
+    def insert(self, prefix: str, region_code: str):
+        prefix = "".join(filter(str.isdigit, str(prefix)))
+        if not prefix or not region_code:
+            return
+        node = self._root
+        for digit in prefix:
+            node = node.setdefault(digit, {})
+        regions = node.setdefault("regions", [])
+        if region_code not in regions:
+            regions.append(region_code)
+            self._size += 1
+
+    def longest_match(self, digits: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns:
+            {"prefix": ..., "region_codes": [...]} для самого длинного
+            совпавшего префикса или None.
+        """
+        node, best, best_len = self._root, None, 0
+        for depth, digit in enumerate(digits, start=1):
+            node = node.get(digit)
+            if node is None:
+                break
+            if "regions" in node:
+                best, best_len = node["regions"], depth
+        if best is None:
+            return None
+        return {"prefix": digits[:best_len], "region_codes": list(best)}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add_csv(self, csv_path) -> int:
+        """Добавляет файл prefix,region_code[,comment]. Возвращает число добавленных префиксов."""
+        before = self._size
+        with open(csv_path, "r", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                self.insert(row.get("prefix") or "", (row.get("region_code") or "").strip())
+        logger.info(f"Загружено {self._size - before} телефонных префиксов из {csv_path}")
+        return self._size - before
+
+    @classmethod
+    def from_csv(cls, csv_path=DEFAULT_PREFIXES_PATH) -> "PhonePrefixTrie":
+        """Загружает файл prefix,region_code[,comment]."""
+        trie = cls()
+        trie.add_csv(csv_path)
+        return trie
+
+    def add_route_codes(self, cities: Iterable[Dict[str, Any]]) -> int:
+        """Добавляет phone_route_code из строк cities_map. Возвращает число добавленных кодов."""
+        added = 0
+        for row in cities:
+            route_code = row.get("phone_route_code")
+            if route_code is None or route_code != route_code or not str(route_code).strip():
+                continue
+            self.insert(str(route_code), row.get("region_code"))
+            added += 1
+        return added
+
+
+def predict_region(phone: str, trie: PhonePrefixTrie) -> Optional[Dict[str, Any]]:
+    """
+    Прогноз региона по номеру звонящего.
+
+    Returns:
+        {"phone": "+7...", "prefix": "343", "region_codes": ["ural_fd"]} или None.
+    """
+    digits = phone_digits(phone)
+    if not digits:
+        return None
+    match = trie.longest_match(digits)
+    if match is None:
+        return None
+    match["phone"] = "+7" + digits
+    return match
+
+
+def region_prediction_text(prediction: Optional[Dict[str, Any]], region_names: Dict[str, str]) -> str:
+    """Строка для первого контекста LLM: бот подтверждает регион, а не спрашивает с нуля."""
+    if not prediction:
+        return ""
+    names = [region_names.get(code, code) for code in prediction["region_codes"]]
+    return (
+        f"По номеру телефона (код {prediction['prefix']}) клиент вероятно из региона: "
+        f"{' / '.join(names)}. Уточните город, предложив этот регион для подтверждения. "
+    )
+
+
+_trie: Optional[PhonePrefixTrie] = None
+
+
+def load_phone_trie(
+    csv_path=DEFAULT_PREFIXES_PATH, cities: Optional[Iterable[Dict[str, Any]]] = None,
+    def_path=DEF_PREFIXES_PATH,
+) -> PhonePrefixTrie:
+    """Строит дерево префиксов процесса (коды ABC + диапазоны DEF + phone_route_code городов)."""
+    global _trie
+    trie = PhonePrefixTrie()
+    for path in (csv_path, def_path):
+        if path and Path(path).exists():
+            trie.add_csv(path)
+    if def_path and not Path(def_path).exists():
+        logger.warning(f"Нет файла диапазонов DEF {def_path}: мобильные номера без прогноза региона "
+                       f"(см. python -m src.utils.numbering_plan)")
+    if cities is not None:
+        trie.add_route_codes(cities)
+    _trie = trie
+    return trie
+
+
+def load_phone_trie_from_db(conn: sqlite3.Connection, table: str = "cities_map",
+                            csv_path=DEFAULT_PREFIXES_PATH) -> PhonePrefixTrie:
+    cursor = conn.execute(f"SELECT region_code, phone_route_code FROM {table}")
+    cities: List[Dict[str, Any]] = [
+        {"region_code": region_code, "phone_route_code": route_code} for region_code, route_code in cursor
+    ]
+    return load_phone_trie(csv_path, cities)
+
+
+def get_phone_trie() -> PhonePrefixTrie:
+    """Дерево префиксов процесса; при первом обращении загружается из файла."""
+    if _trie is None:
+        return load_phone_trie()
+    return _trie
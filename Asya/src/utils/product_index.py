@@ -0,0 +1,268 @@
+"""
+Индекс товаров для быстрого поиска по official_name и slang_name.
+
+Заменяет полный перебор products в search_product (iterrows + подстрока и
+fuzz.ratio по каждому названию и каждому сленговому варианту):
+1. архивные товары (is_archived) не попадают в индекс;
+2. кандидаты отбираются по общим триграммам слов запроса;
+3. fuzz.ratio и проверка вхождения — только для кандидатов; название внутри
+   фразы клиента ищется по границам слов с допустимым окончанием ("маты"),
+   поэтому сленг "мат" не находится в "автоматический" или "материал";
+4. найденное сортируется с учётом weight_priority.
+
+Порог совпадения тот же, что и раньше: score > 70.
+"""
+
+import heapq
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+from thefuzz import fuzz
+
+logger = logging.getLogger(__name__)
+
+# Порог fuzzy-совпадения (как в старом search_product)
+FUZZY_THRESHOLD = 70
+
+# Сколько названий после триграммного фильтра проверяем через fuzz.ratio
+MAX_CANDIDATES = 50
+
+# Сколько товаров возвращать по умолчанию
+TOP_K = 10
+
+_WORD_RE = re.compile(r"[0-9a-zа-я]+")
+
+# Сколько букв окончания допускается после слова названия в реплике
+MAX_SUFFIX = 3
+
+# Слова короче — только с грамматическим окончанием: "маты", "матов", но не "матрас"
+SHORT_TERM_LENGTH = 5
+WORD_ENDINGS = frozenset({
+    "а", "у", "е", "ы", "и", "о", "ю", "я", "ь",
+    "ом", "ой", "ою", "ей", "ем", "ам", "ям", "ах", "ях", "ов", "ев", "ью",
+    "ами", "ями",
+})
+
+
+def _is_missing(value: Any) -> bool:
+    """None, NaN из pandas или пустая строка."""
+    if value is None:
+        return True
+    if isinstance(value, float) and value != value:
+        return True
+    return not str(value).strip()
+
+
+def _as_bool(value: Any) -> bool:
+    if _is_missing(value):
+        return False
+    return str(value).strip().lower() in ("1", "true")
+
+
+def _as_int(value: Any) -> int:
+    if _is_missing(value):
+        return 0
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def normalize_product_text(text: Any) -> str:
+    """Нижний регистр, ё -> е, только буквы и цифры через один пробел."""
+    return " ".join(_WORD_RE.findall(str(text).lower().replace("ё", "е")))
+
+
+def suffix_allowed(word: str, suffix: str, max_suffix: int = MAX_SUFFIX) -> bool:
+    """Можно ли считать word + suffix формой слова word (короткие слова — только с окончанием из WORD_ENDINGS)."""
+    if not suffix:
+        return True
+    if len(suffix) > max_suffix:
+        return False
+    return len(word) >= SHORT_TERM_LENGTH or suffix in WORD_ENDINGS
+
+
+def _words_match(name_words: List[str], words: List[str]) -> bool:
+    """Слова названия подряд встречаются в запросе (каждое — целиком или с окончанием)."""
+    size = len(name_words)
+    for start in range(len(words) - size + 1):
+        if all(
+            word.startswith(name_word) and suffix_allowed(name_word, word[len(name_word):])
+            for name_word, word in zip(name_words, words[start:start + size])
+        ):
+            return True
+    return False
+
+
+def _trigrams(text: str) -> set:
+    grams = set()
+    for word in text.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ProductIndex:
+    """
+    Инвертированный индекс по названиям товаров (официальным и сленговым).
+
+    Строится один раз при загрузке products, search() проверяет через
+    fuzz.ratio только несколько десятков кандидатов.
+    """
+
+    def __init__(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        threshold: int = FUZZY_THRESHOLD,
+        max_candidates: int = MAX_CANDIDATES,
+    ):
+        """
+        Args:
+            rows: Строки products в виде словарей.
+            threshold: Порог fuzz.ratio, выше которого товар считается найденным.
+            max_candidates: Сколько названий проверять через fuzz.ratio.
+        """
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+
+        self._rows: List[Dict[str, Any]] = []
+        self._priorities: List[int] = []
+        # Названия (официальное и сленговые) и номер товара для каждого
+        self._names: List[str] = []
+        self._name_rows: List[int] = []
+        self._postings: Dict[str, Any] = {}
+
+        archived = 0
+        for row in rows:
+            if _as_bool(row.get("is_archived")):
+                archived += 1
+                continue
+            names = []
+            if not _is_missing(row.get("official_name")):
+                names.append(row["official_name"])
+            if not _is_missing(row.get("slang_name")):
+                names.extend(str(row["slang_name"]).split(","))
+            names = [n for n in (normalize_product_text(n) for n in names) if n]
+            if not names:
+                continue
+            row_idx = len(self._rows)
+            self._rows.append(row)
+            self._priorities.append(_as_int(row.get("weight_priority")))
+            for name in dict.fromkeys(names):
+                self._add_name(name, row_idx)
+
+        # Списки позиций -> numpy: подсчёт общих триграмм одним bincount
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in self._postings.items()}
+
+        logger.info(
+            f"Индекс товаров построен: {len(self._rows)} товаров, {len(self._names)} названий "
+            f"(архивных пропущено: {archived})"
+        )
+
+    def _add_name(self, name: str, row_idx: int):
+        name_id = len(self._names)
+        self._names.append(name)
+        self._name_rows.append(row_idx)
+        for gram in _trigrams(name):
+            self._postings.setdefault(gram, []).append(name_id)
+
+    @classmethod
+    def from_dataframe(cls, df, **kwargs) -> "ProductIndex":
+        """Строит индекс из pandas DataFrame (df_products)."""
+        if df is None:
+            return cls([], **kwargs)
+        return cls(df.to_dict("records"), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _candidates(self, query: str) -> List[int]:
+        """Названия с наибольшим числом общих с запросом триграмм."""
+        lists = [self._postings[g] for g in _trigrams(query) if g in self._postings]
+        if not lists:
+            return []
+        counts = np.bincount(np.concatenate(lists), minlength=len(self._names))
+        found = np.flatnonzero(counts)
+        if len(found) > self.max_candidates:
+            # Стабильный отбор: при равном числе триграмм — более ранние названия
+            order = np.lexsort((found, -counts[found]))
+            found = found[order[:self.max_candidates]]
+        return found.tolist()
+
+    def _score(self, query: str, words: List[str], name: str) -> int:
+        """
+        Совпадение названия с запросом: запрос внутри названия или название
+        словами внутри запроса ("сколько стоит прошивной мат") — 100, иначе
+        лучший fuzz.ratio со всем запросом или с окном запроса из стольких же
+        слов, сколько в названии ("сколько стоят прошивные маты").
+        """
+        if query in name or _words_match(name.split(), words):
+            return 100
+        score = fuzz.ratio(query, name)
+        size = name.count(" ") + 1
+        if len(words) > size:
+            for start in range(len(words) - size + 1):
+                score = max(score, fuzz.ratio(" ".join(words[start:start + size]), name))
+        return score
+
+    def search_scored(self, query: str, top_k: int = TOP_K) -> List[Tuple[Dict[str, Any], int]]:
+        """
+        Ищет товары по фразе клиента.
+
+        Returns:
+            До top_k пар (строка products, score) с score > threshold: сначала
+            точные вхождения названия, затем по weight_priority и score.
+        """
+        if _is_missing(query):
+            return []
+        query = normalize_product_text(query)
+        if not query:
+            return []
+        words = query.split()
+
+        best: Dict[int, int] = {}
+        for name_id in self._candidates(query):
+            score = self._score(query, words, self._names[name_id])
+            if score > self.threshold:
+                row_idx = self._name_rows[name_id]
+                if score > best.get(row_idx, 0):
+                    best[row_idx] = score
+
+        ranked = heapq.nsmallest(
+            top_k,
+            best,
+            key=lambda r: (best[r] < 100, -self._priorities[r], -best[r], r),
+        )
+        return [(self._rows[r], best[r]) for r in ranked]
+
+    def search(self, query: str, top_k: int = TOP_K) -> List[Dict[str, Any]]:
+        """Как search_scored, но только строки товаров (замена search_product)."""
+        return [row for row, _ in self.search_scored(query, top_k)]
+
+
+# --- Для отладки: замер скорости на синтетическом каталоге ---
+if __name__ == "__main__":
+    import random
+    import time
+
+    random.seed(0)
+    stems = ["мат", "вата", "шнур", "плита", "цилиндр", "лента", "мастика", "ткань", "картон", "рулон"]
+    kinds = ["базальтовый", "прошивной", "минеральный", "огнезащитный", "теплоизоляционный", "фольгированный"]
+    rows = [
+        {
+            "official_name": f"{random.choice(kinds)} {random.choice(stems)} {random.choice('АБВГДМПТ')}{i}",
+            "slang_name": f"{random.choice(stems)} {i}",
+            "is_archived": i % 20 == 0,
+            "weight_priority": random.randint(0, 10),
+        }
+        for i in range(int(__import__("sys").argv[1]) if len(__import__("sys").argv) > 1 else 5000)
+    ]
+    index = ProductIndex(rows)
+    queries = ["сколько стоит прошивной мат", "шнур базальтовый", "есть ли огнезащитная мастика", "вата"]
+    n = 2000
+    start = time.perf_counter()
+    for i in range(n):
+        index.search(queries[i % len(queries)])
+    print(f"{len(index)} товаров, среднее время search: {(time.perf_counter() - start) / n * 1e6:.1f} мкс")
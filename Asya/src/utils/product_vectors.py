@@ -0,0 +1,308 @@
+"""
+Векторный поиск товаров по символьным n-граммам (TF-IDF), устойчивый к ошибкам ASR.
+
+Названия вроде "ШБТ-50", "ОБМ" или "EXPERT FIRE-M" распознаются как
+"ш б т 50", "о б м", "эксперт файр м" — fuzz.ratio по всей фразе их не
+находит. Здесь название и запрос приводятся к одной форме (латиница ->
+кириллица, без пробелов и дефисов) и сравниваются по косинусу векторов
+символьных n-грамм. Внешняя модель эмбеддингов не нужна.
+
+Индекс строится офлайн из каталога и сохраняется в .npz без сжатия:
+при старте массивы отображаются в память (np.memmap), а словарь n-грамм
+хранится отсортированным и ищется через searchsorted — без разбора в dict.
+
+    python -m src.utils.product_vectors build clients.db data/product_vectors.npz
+    python -m src.utils.product_vectors bench
+"""
+
+import logging
+import math
+import sqlite3
+import zipfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from src.utils.product_index import _as_bool, _is_missing, normalize_product_text
+
+logger = logging.getLogger(__name__)
+
+# Длины символьных n-грамм
+NGRAM_RANGE = (2, 4)
+
+# Минимальный косинус, с которого товар считается найденным
+MIN_SCORE = 0.3
+
+TOP_K = 5
+
+# Латиница -> кириллица: ASR пишет "EXPERT" как "эксперт"
+_TRANSLIT = str.maketrans({
+    "a": "а", "b": "б", "c": "к", "d": "д", "e": "е", "f": "ф", "g": "г", "h": "х", "i": "и",
+    "j": "ж", "k": "к", "l": "л", "m": "м", "n": "н", "o": "о", "p": "п", "q": "к", "r": "р",
+    "s": "с", "t": "т", "u": "у", "v": "в", "w": "в", "x": "кс", "y": "и", "z": "з", "э": "е",
+    "й": "и", "ъ": "", "ь": "",
+})
+
+
+def vector_text(text: Any) -> str:
+    """Общая форма названия и запроса: кириллица, без пробелов, дефисов и мягких знаков."""
+    return normalize_product_text(text).translate(_TRANSLIT).replace(" ", "")
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> Dict[str, int]:
+    """Частоты символьных n-грамм строки (с границами " ")."""
+    padded = f" {text} "
+    counts: Dict[str, int] = {}
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def _mmap_npz(path: str) -> Dict[str, np.ndarray]:
+    """
+    Отображает массивы несжатого .npz в память.
+    np.load(mmap_mode=...) для .npz это не умеет: файлы внутри zip читаются целиком.
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: массив {info.filename} сжат, нужен np.savez без сжатия")
+            # Локальный заголовок zip: 30 байт + имя файла + extra
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+                continue
+            arrays[name] = np.memmap(
+                path, dtype=dtype, mode="r", shape=shape,
+                order="F" if fortran_order else "C", offset=f.tell(),
+            )
+    return arrays
+
+
+class ProductVectorIndex:
+    """
+    TF-IDF по символьным n-граммам названий товаров.
+
+    Матрица хранится по столбцам (CSC: для каждой n-граммы — список названий
+    и весов), поэтому на запрос читаются только столбцы его n-грамм.
+    """
+
+    def __init__(
+        self,
+        vocab: np.ndarray,
+        idf: np.ndarray,
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        product_ids: np.ndarray,
+        names: np.ndarray,
+    ):
+        self.vocab = vocab
+        self.idf = idf
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.product_ids = product_ids
+        self.names = names
+        self._rows: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]], ngram_range: Tuple[int, int] = NGRAM_RANGE) -> "ProductVectorIndex":
+        """Строит индекс по official_name и slang_name (архивные товары пропускаются)."""
+        names: List[str] = []
+        product_ids: List[str] = []
+        for row in rows:
+            if _as_bool(row.get("is_archived")):
+                continue
+            variants = []
+            if not _is_missing(row.get("official_name")):
+                variants.append(row["official_name"])
+            if not _is_missing(row.get("slang_name")):
+                variants.extend(str(row["slang_name"]).split(","))
+            for variant in dict.fromkeys(v for v in (vector_text(v) for v in variants) if v):
+                names.append(variant)
+                product_ids.append(str(row.get("product_id")))
+
+        grams = [char_ngrams(name, ngram_range) for name in names]
+        vocab = np.array(sorted({g for doc in grams for g in doc}), dtype=str)
+        columns = {g: i for i, g in enumerate(vocab.tolist())}
+
+        n_docs = len(names)
+        df = np.zeros(len(vocab), dtype=np.float64)
+        rows_idx, cols_idx, values = [], [], []
+        for doc_id, doc in enumerate(grams):
+            for gram, tf in doc.items():
+                col = columns[gram]
+                df[col] += 1
+                rows_idx.append(doc_id)
+                cols_idx.append(col)
+                values.append(1 + math.log(tf))
+        idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+
+        matrix = sparse.csr_matrix(
+            (np.asarray(values, dtype=np.float32), (rows_idx, cols_idx)), shape=(n_docs, len(vocab))
+        )
+        matrix = matrix.multiply(idf).tocsr()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        matrix = sparse.diags(1 / norms).dot(matrix).tocsc()
+        matrix.sort_indices()
+
+        logger.info(f"Векторный индекс товаров: {n_docs} названий, {len(vocab)} n-грамм")
+        return cls(
+            vocab, idf, matrix.indptr.astype(np.int64), matrix.indices.astype(np.int32),
+            matrix.data.astype(np.float32), np.array(product_ids, dtype=str), np.array(names, dtype=str),
+        )
+
+    def save(self, path: str):
+        """Сохраняет индекс в несжатый .npz (для отображения в память при загрузке)."""
+        np.savez(
+            path, vocab=self.vocab, idf=self.idf, indptr=self.indptr, doc_ids=self.doc_ids,
+            weights=self.weights, product_ids=self.product_ids, names=self.names,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ProductVectorIndex":
+        """Открывает сохранённый индекс; массивы не читаются в память, а отображаются."""
+        arrays = _mmap_npz(path)
+        index = cls(**{key: arrays[key] for key in (
+            "vocab", "idf", "indptr", "doc_ids", "weights", "product_ids", "names",
+        )})
+        logger.info(f"Векторный индекс товаров загружен из {path}: {len(index.names)} названий")
+        return index
+
+    def attach_rows(self, rows: Iterable[Dict[str, Any]]) -> "ProductVectorIndex":
+        """Связывает product_id индекса со строками products, чтобы search() возвращал строки."""
+        self._rows = {str(row.get("product_id")): row for row in rows}
+        return self
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _query_vector(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Столбцы n-грамм запроса, известных индексу, и их нормированные веса TF-IDF."""
+        grams = char_ngrams(vector_text(query))
+        keys = np.array(list(grams), dtype=self.vocab.dtype)
+        tf = np.array([1 + math.log(c) for c in grams.values()], dtype=np.float32)
+
+        pos = np.searchsorted(self.vocab, keys)
+        known = pos < len(self.vocab)
+        known[known] = self.vocab[pos[known]] == keys[known]
+        cols = pos[known]
+
+        # Незнакомые n-граммы получают idf как у самой редкой и уменьшают сходство через норму
+        unseen_idf = math.log(1 + len(self.names)) + 1
+        weights = tf[known] * self.idf[cols]
+        norm = math.sqrt(float((weights ** 2).sum()) + float(((tf[~known] * unseen_idf) ** 2).sum()))
+        return cols, weights / (norm or 1.0)
+
+    def search_ids(self, query: str, top_k: int = TOP_K, min_score: float = MIN_SCORE) -> List[Tuple[str, float]]:
+        """
+        Returns:
+            До top_k пар (product_id, косинус) — по лучшему из названий товара.
+        """
+        if _is_missing(query) or not len(self.names):
+            return []
+        cols, q_weights = self._query_vector(query)
+        scores = np.zeros(len(self.names), dtype=np.float32)
+        for col, q_weight in zip(cols.tolist(), q_weights.tolist()):
+            start, end = self.indptr[col], self.indptr[col + 1]
+            scores[self.doc_ids[start:end]] += q_weight * self.weights[start:end]
+
+        found = np.flatnonzero(scores >= min_score)
+        order = found[np.argsort(-scores[found], kind="stable")]
+        results: List[Tuple[str, float]] = []
+        seen = set()
+        for doc_id in order:
+            if len(results) >= top_k:
+                break
+            score = float(scores[doc_id])
+            product_id = str(self.product_ids[doc_id])
+            if product_id not in seen:
+                seen.add(product_id)
+                results.append((product_id, score))
+        return results
+
+    def search(self, query: str, top_k: int = TOP_K, min_score: float = MIN_SCORE) -> List[Dict[str, Any]]:
+        """Строки products (см. attach_rows) в порядке убывания сходства."""
+        return [self._rows[pid] for pid, _ in self.search_ids(query, top_k, min_score) if pid in self._rows]
+
+
+def load_or_build(path: Optional[str], rows: List[Dict[str, Any]]) -> ProductVectorIndex:
+    """Загружает индекс из .npz, а если файла нет — строит в памяти по текущим товарам."""
+    try:
+        if path:
+            return ProductVectorIndex.load(path).attach_rows(rows)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Не удалось загрузить векторный индекс {path}: {e}. Строим в памяти.")
+    return ProductVectorIndex.build(rows).attach_rows(rows)
+
+
+def _bench():
+    """Сравнение полноты и скорости: ProductIndex (триграммы + fuzz) и векторный поиск."""
+    import random
+    import time
+
+    from src.utils.product_index import ProductIndex
+
+    random.seed(1)
+    catalog = [
+        "Шнур базальтовый теплоизоляционный ШБТ-50", "Обрезь базальтовая", "Мат базальтовый прошивной ОБМ-50",
+        "Огнезащитное покрытие Expert Standart FROST", "Огнезащитная краска EXPERT FIRE-M",
+        "Огнезащитная краска EXPERT FIRE-OM", "Огнезащитный базальтовый материал ОБМ",
+        "Противопожарные подушки ППУ", "Цилиндры базальтовые EXPERT ISOL", "Мастика огнезащитная МОБ",
+    ]
+    rows = [{"product_id": i, "official_name": name} for i, name in enumerate(catalog)]
+    rows += [
+        {"product_id": 1000 + i, "official_name": f"Изделие {random.choice('АБВГДЕЖЗ')}{random.choice('КЛМНПРСТ')}-{i}"}
+        for i in range(1000 - len(catalog))
+    ]
+
+    def mangle(name: str) -> str:
+        text = name.lower().replace("-", " ")
+        ops = [
+            lambda t: " ".join(t),                          # побуквенно: "ш б т"
+            lambda t: t.replace("expert", "эксперт").replace("fire", "файр").replace("isol", "изол"),
+            lambda t: t.replace("о", "а", 1),               # безударная гласная
+            lambda t: t[:-1],                               # проглоченный конец
+        ]
+        for op in random.sample(ops, 2):
+            text = op(text)
+        return f"сколько стоит {text}"
+
+    queries = [(mangle(rows[i]["official_name"]), i) for i in range(len(catalog)) for _ in range(20)]
+    token_index = ProductIndex(rows)
+    vectors = ProductVectorIndex.build(rows).attach_rows(rows)
+
+    for label, search in (("ProductIndex", token_index.search), ("Векторы", vectors.search)):
+        start = time.perf_counter()
+        hits = sum(any(r["product_id"] == pid for r in search(q)[:TOP_K]) for q, pid in queries)
+        elapsed = (time.perf_counter() - start) / len(queries) * 1e6
+        print(f"{label:12s} recall@{TOP_K}: {hits / len(queries):.2f}, {elapsed:.0f} мкс на запрос")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        conn = sqlite3.connect(sys.argv[2])
+        cursor = conn.execute("SELECT * FROM products")
+        columns = [col[0] for col in cursor.description]
+        index = ProductVectorIndex.build(dict(zip(columns, row)) for row in cursor.fetchall())
+        conn.close()
+        index.save(sys.argv[3])
+        print(f"✅ Сохранено {len(index)} названий в {sys.argv[3]}")
+    else:
+        _bench()
@@ -50,10 +50,12 @@ def extract_city(text: str) -> Optional[str]:
                 return city
     return None
 
+# Отделы, на которые Ася переводит звонок
+VALID_DEPARTMENTS = ["коммерческий", "бухгалтерский", "логистика", "закупки", "маркетинг"]
+
 def is_valid_department(department: str) -> bool:
     """Проверяет, относится ли отдел к одному из допустимых"""
-    valid = ["коммерческий", "бухгалтерский", "логистика", "закупки", "маркетинг"]
-    return department.lower().strip() in valid
+    return department.lower().strip() in VALID_DEPARTMENTS
 
 def validate_call_id(call_id: str) -> bool:
     """
@@ -0,0 +1,24 @@
+import sqlite3
+
+import pytest
+
+from src.database.migrations import migrate
+
+
+@pytest.fixture
+def db_conn():
+    """Пустая база в памяти по текущей схеме (все миграции)."""
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Файл clients.db по текущей схеме — для кода, который открывает базу сам."""
+    path = str(tmp_path / "clients.db")
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.close()
+    return path
@@ -0,0 +1,45 @@
+import asyncio
+import sqlite3
+
+from src.database.async_db import AsyncDatabaseManager
+from src.database.db_manager import DatabaseManager
+from test_db_manager import Profile
+
+
+def test_async_methods_mirror_database_manager(tmp_path):
+    db = DatabaseManager(str(tmp_path / "clients.db"))
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("INSERT INTO clients_info (client_id, phone, phone_e164, name) VALUES ('1', '+79161234567', '+79161234567', 'Анна')")
+    conn.commit()
+    conn.close()
+    async_db = AsyncDatabaseManager(db)
+
+    async def scenario():
+        assert await async_db.check_connection() is True
+        assert await async_db.update_client_profile("1", "Имя клиента", "Анна Петровна") is True
+        client = await async_db.find_client_by_phone("8 (916) 123-45-67")
+        assert client["name"] == "Анна Петровна"
+        assert await async_db.get_recent_calls("1") == []
+
+    asyncio.run(scenario())
+    async_db.close()
+
+
+def test_concurrent_first_calls_from_new_number_share_one_client(tmp_path):
+    async_db = AsyncDatabaseManager(DatabaseManager(str(tmp_path / "clients.db")))
+
+    async def scenario():
+        return await asyncio.gather(
+            async_db.save_call_data(Profile(**{"Телефон": "+79161234567"}), [], []),
+            async_db.save_call_data(Profile(**{"Телефон": "8 916 123 45 67"}), [], []),
+        )
+
+    first, second = asyncio.run(scenario())
+    async_db.close()
+    conn = sqlite3.connect(str(tmp_path / "clients.db"))
+    assert conn.execute("SELECT COUNT(*) FROM clients_info").fetchone() == (1,)
+    (client_id,) = conn.execute("SELECT client_id FROM clients_info").fetchone()
+    calls = dict(conn.execute("SELECT call_id, client_id FROM calls").fetchall())
+    assert calls == {first: client_id, second: client_id}
+    assert conn.execute("SELECT DISTINCT client_id FROM jsons").fetchall() == [(client_id,)]
+    conn.close()
@@ -0,0 +1,41 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+# backfill_regions.py лежит в корне репозитория, рядом с папкой Asya
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from backfill_regions import REGION_COMMENT, backfill_regions  # noqa: E402
+
+CITIES = [
+    ("москва", "сentral_fd", "Центральный ФО", "мск"),
+    ("санкт-петербург", "north-western_fd", "Северо-Западный ФО", "питер, спб"),
+    ("ростов-на-дону", "southern_fd", "Южный ФО", None),
+]
+CLIENTS = [
+    ("1", "Москва", None),
+    ("2", "  МСК ", REGION_COMMENT),
+    ("3", "питер", None),
+    ("4", "Ростов на Дону", None),
+    ("5", None, None),
+]
+
+
+def test_backfill_fills_regions_once(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO cities_map (city_name, region_code, region_name, aliases) VALUES (?, ?, ?, ?)", CITIES)
+    conn.executemany("INSERT INTO clients_info (client_id, city_name, comment) VALUES (?, ?, ?)", CLIENTS)
+    conn.commit()
+
+    assert backfill_regions(db_path, chunk_size=2, workers=1) == 4
+    rows = conn.execute("SELECT client_id, region_code, region_name, comment FROM clients_info ORDER BY client_id").fetchall()
+    assert rows == [
+        ("1", "сentral_fd", "Центральный ФО", None),
+        ("2", "сentral_fd", "Центральный ФО", None),
+        ("3", "north-western_fd", "Северо-Западный ФО", None),
+        ("4", "southern_fd", "Южный ФО", None),
+        ("5", None, None, None),
+    ]
+
+    # Повторный запуск: клиентов без региона не осталось
+    assert backfill_regions(db_path, chunk_size=2, workers=1) == 0
+    conn.close()
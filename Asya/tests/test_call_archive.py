@@ -0,0 +1,79 @@
+import json
+import os
+
+from src.database.call_archive import CallArchive, main, pack_call_files
+
+
+def document(call_id, text="Нужна мастика"):
+    return {"call_id": call_id, "transcription": [{"speaker": "client", "text": text}]}
+
+
+def test_append_and_get_before_and_after_sync(tmp_path):
+    archive = CallArchive(str(tmp_path), sync_every=3)
+    archive.append("c1", document("c1"))
+    # Ещё не в индексе, но уже читается
+    assert archive.get("c1") == document("c1")
+    archive.append("c2", document("c2", "Доставка в Казань"))
+    archive.append("c3", document("c3"))
+    indexed = archive.connections.connection().execute("SELECT COUNT(*) FROM archive_index").fetchone()[0]
+    assert indexed == 3
+    assert archive.get("c2")["transcription"][0]["text"] == "Доставка в Казань"
+    assert archive.get("missing") is None
+    assert archive.count() == 3
+    archive.close()
+
+
+def test_segments_rotate_by_size_and_age(tmp_path):
+    archive = CallArchive(str(tmp_path), max_segment_bytes=200)
+    for i in range(6):
+        archive.append(f"c{i}", document(f"c{i}"))
+    assert len(archive.segments()) >= 3
+    assert all(archive.get(f"c{i}")["call_id"] == f"c{i}" for i in range(6))
+    archive.close()
+
+    aged = CallArchive(str(tmp_path), max_segment_age=0)
+    before = len(aged.segments())
+    aged.append("c6", document("c6"))
+    assert len(aged.segments()) == before + 1
+    aged.close()
+
+
+def test_reopen_reindexes_unsynced_tail_and_drops_partial_line(tmp_path):
+    archive = CallArchive(str(tmp_path), sync_every=100, sync_interval=3600)
+    archive.append("c1", document("c1"))
+    archive.flush()
+    archive.append("c2", document("c2"))
+    # Имитация сбоя: индекс для c2 не записан, в конце — оборванная строка
+    segment = archive.segments()[-1]
+    archive._file.write(b'{"call_id":"c3","transcr')
+    archive._file.flush()
+    archive._file.close()
+    archive.connections.close_all()
+
+    reopened = CallArchive(str(tmp_path))
+    assert reopened.get("c2") == document("c2")
+    assert reopened.get("c3") is None
+    reopened.append("c4", document("c4"))
+    reopened.close()
+    with open(os.path.join(str(tmp_path), segment), "rb") as f:
+        assert [json.loads(line)["call_id"] for line in f] == ["c1", "c2", "c4"]
+
+
+def test_pack_call_files_is_idempotent(tmp_path):
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "call_data_a1.json").write_text(json.dumps(document("a1"), ensure_ascii=False, indent=2), encoding="utf-8")
+    (legacy / "b2.json").write_text(json.dumps({"transcription": []}), encoding="utf-8")
+    (legacy / "broken.json").write_text("{", encoding="utf-8")
+
+    archive = CallArchive(str(tmp_path / "archive"))
+    assert pack_call_files(archive, [str(legacy)]) == {"packed": 2, "skipped": 0, "failed": 1}
+    assert archive.get("a1") == document("a1")
+    assert archive.get("b2") == {"transcription": [], "call_id": "b2"}
+    archive.close()
+
+    main(["pack", str(tmp_path / "archive"), str(legacy), "--remove"])
+    assert sorted(os.listdir(legacy)) == ["broken.json"]
+    reopened = CallArchive(str(tmp_path / "archive"))
+    assert reopened.count() == 2
+    reopened.close()
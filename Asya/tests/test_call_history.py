@@ -0,0 +1,63 @@
+import pytest
+
+from src.database.call_history import fetch_recent_calls, fetch_unfinished_calls
+
+
+@pytest.fixture
+def conn(db_conn):
+    for day in range(1, 6):
+        call_id = f"c{day}"
+        db_conn.execute(
+            "INSERT INTO calls (call_id, client_id, timestamp, department, request_text, next_step) "
+            "VALUES (?, '1', ?, 'Отдел продаж', ?, 'transfer')",
+            (call_id, f"2025-05-0{day}T10:00:00", f"Запрос {day}"),
+        )
+        db_conn.executemany(
+            "INSERT INTO call_transcripts (call_id, speaker, text, segment_id) VALUES (?, ?, ?, ?)",
+            [(call_id, "bot" if i % 2 == 0 else "client", f"реплика {i}", f"seg_{i}") for i in range(12)],
+        )
+    db_conn.execute(
+        "INSERT INTO calls (call_id, client_id, timestamp, department, request_text) "
+        "VALUES ('x', '2', '2025-06-01T10:00:00', 'Бухгалтерия', 'Чужой')"
+    )
+    return db_conn
+
+
+def test_recent_calls_newest_first_with_excerpt(conn):
+    calls = fetch_recent_calls(conn, "1", n=2)
+    assert [call["call_id"] for call in calls] == ["c5", "c4"]
+    assert calls[0]["summary"] == "Запрос 5" and calls[0]["department"] == "Отдел продаж"
+    # Начало разговора в порядке записи, а не в строковом порядке segment_id
+    assert calls[0]["transcript_excerpt"].splitlines() == [
+        "bot: реплика 0", "client: реплика 1", "bot: реплика 2", "client: реплика 3",
+    ]
+    assert fetch_recent_calls(conn, "нет такого") == []
+
+
+def test_recent_calls_use_indexes(conn):
+    plan = " ".join(
+        row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT call_id FROM calls WHERE client_id = ? ORDER BY timestamp DESC LIMIT 3",
+            ("1",),
+        )
+    )
+    assert "COVERING INDEX idx_calls_client_timestamp" in plan
+    plan = " ".join(
+        row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT text FROM call_transcripts WHERE call_id = ?", ("c1",)
+        )
+    )
+    assert "idx_transcripts_call_segment" in plan
+
+
+def test_unfinished_calls_are_transcripts_without_call_row(conn):
+    conn.executemany(
+        "INSERT INTO call_transcripts (call_id, speaker, text, segment_id, segment_time) VALUES (?, ?, ?, ?, ?)",
+        [
+            ("оборван", "client", "алло", "seg_0001", "2025-05-06T10:00:00"),
+            ("оборван", "bot", "здравствуйте", "seg_0002", "2025-05-06T10:00:05"),
+            ("идёт", "client", "алло", "seg_0001", "2025-05-06T11:59:00"),
+        ],
+    )
+    calls = fetch_unfinished_calls(conn, before="2025-05-06T11:30:00")
+    assert [(c["call_id"], c["turns"], c["started_at"]) for c in calls] == [("оборван", 2, "2025-05-06T10:00:00")]
@@ -0,0 +1,41 @@
+import json
+
+from src.database.call_json import COMPACT_JSON_FORMAT, decode_call_json, encode_call_json, load_call_json
+
+DOCUMENT = {
+    "call_id": "c1",
+    "client_data": {"name": "Иван", "city": "Казань"},
+    "transcription": [
+        {"speaker": "client", "text": "Здравствуйте, нужна мастика", "timestamp": "10:00:01"},
+        {"speaker": "bot", "text": "Какой объём?", "timestamp": "10:00:04"},
+    ],
+    "metadata": {"is_repeat_call": False},
+}
+
+
+def test_transcript_is_stored_by_reference_and_rebuilt(db_conn):
+    conn = db_conn
+    conn.executemany(
+        "INSERT INTO call_transcripts (call_id, speaker, text, segment_time) VALUES ('c1', ?, ?, ?)",
+        [(t["speaker"], t["text"], f"2025-05-06T{t['timestamp']}.123456") for t in DOCUMENT["transcription"]],
+    )
+    blob = encode_call_json(DOCUMENT)
+    assert decode_call_json(blob)["transcription"] == []
+    assert len(blob) < len(json.dumps(DOCUMENT, ensure_ascii=False, indent=2).encode("utf-8")) / 2
+
+    conn.execute(
+        "INSERT INTO jsons (call_id, json_blob, json_format) VALUES ('c1', ?, ?)", (blob, COMPACT_JSON_FORMAT)
+    )
+    assert load_call_json(conn, "c1") == DOCUMENT
+
+
+def test_inline_and_legacy_rows(db_conn):
+    conn = db_conn
+    conn.execute(
+        "INSERT INTO jsons (call_id, json_blob, json_format) VALUES ('c2', ?, ?)",
+        (encode_call_json(DOCUMENT, transcript_by_ref=False), COMPACT_JSON_FORMAT),
+    )
+    conn.execute("INSERT INTO jsons (call_id, json_data) VALUES ('c3', ?)", (json.dumps(DOCUMENT, indent=2),))
+    assert load_call_json(conn, "c2") == DOCUMENT
+    assert load_call_json(conn, "c3") == DOCUMENT
+    assert load_call_json(conn, "нет") is None
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from src.asya_core.caller_prefetch import CallerContext, CallerPrefetcher
+from src.utils.city_index import CityIndex
+
+CLIENT = {"client_id": "1", "name": "Иван", "city_name": "Казань", "region_code": None}
+CALLS = [{"timestamp": "2025-05-01 10:00:00", "department": "Отдел продаж", "request_text": "Мастика"}]
+REGION = {"region_code": "16", "operator": "МТС", "probability": 0.9}
+
+
+def make_prefetcher(**overrides):
+    sources = {
+        "find_client": lambda phone: CLIENT,
+        "recent_calls": lambda phone, n: CALLS[:n],
+        "predict": lambda phone: REGION,
+    }
+    sources.update(overrides)
+    return CallerPrefetcher(timeout=0.3, **sources)
+
+
+def test_sources_run_concurrently():
+    def slow(value):
+        def source(*args):
+            time.sleep(0.1)
+            return value
+        return source
+
+    prefetcher = make_prefetcher(find_client=slow(CLIENT), recent_calls=slow(CALLS), predict=slow(REGION))
+    context = asyncio.run(prefetcher.fetch("+79161234567"))
+    assert context.client == CLIENT
+    assert context.recent_calls == CALLS
+    assert context.region_prediction == REGION
+    assert context.missing == []
+    # Три источника по 100 мс — меньше, чем их сумма
+    assert context.elapsed_ms < 250
+
+
+def test_slow_or_failing_source_is_skipped():
+    def hang(phone, n):
+        time.sleep(0.6)
+        return CALLS
+
+    def fail(phone):
+        raise RuntimeError("база недоступна")
+
+    context = asyncio.run(make_prefetcher(recent_calls=hang, find_client=fail).fetch("+79161234567"))
+    assert sorted(context.missing) == ["client", "recent_calls"]
+    assert context.client is None and context.recent_calls == []
+    assert context.region_prediction == REGION
+    assert context.elapsed_ms < 500
+
+
+def test_no_caller_skips_prefetch():
+    context = asyncio.run(make_prefetcher(find_client=None).fetch(None))
+    assert context == CallerContext(caller=None)
+
+
+def test_system_messages():
+    context = CallerContext(caller="+79161234567", client=CLIENT, recent_calls=CALLS)
+    contents = [message["content"] for message in context.system_messages()]
+    assert contents[0].startswith("Клиент найден в базе: Иван, город Казань")
+    assert "2025-05-01 — Отдел продаж: Мастика" in contents[1]
+
+    context = CallerContext(caller="+79161234567", client={**CLIENT, "last_call_summary": "Заказ мастики"})
+    assert context.system_messages()[-1]["content"] == "Информация о последнем звонке: Заказ мастики"
+
+
+def test_region_prediction_uses_region_names():
+    index = CityIndex([
+        {"city_name": "москва", "region_code": "сentral_fd", "region_name": "Центральный ФО", "aliases": None},
+        {"city_name": "казань", "region_code": "privolzhsky_fd", "region_name": "Приволжский ФО", "aliases": None},
+    ])
+    prediction = {"prefix": "916", "region_codes": ["сentral_fd"], "phone": "+79161234567"}
+    context = CallerContext(caller="+79161234567", region_prediction=prediction)
+    content = context.system_messages(index.region_names())[-1]["content"]
+    assert "региона: Центральный ФО" in content and "сentral_fd" not in content
@@ -0,0 +1,117 @@
+import sqlite3
+
+from src.asya_core.knowledge_base import chunk_markdown
+from src.database.catalog_compiler import compile_catalog, derive_slang_names, parse_products_txt
+from src.utils.product_vectors import ProductVectorIndex
+
+SHNUR_TEXT = (
+    "Шнур теплоизоляционный из супертонкого базальтового волокна с базальтовой оплеткой "
+    "для термоизоляции труб и дымоходов."
+)
+MAT_TEXT = (
+    "Маты прошивные ОБМ-50 предназначены для изоляции дымоходов, повышения стойкости воздуховодов "
+    "и систем вентиляции при устройстве бань и саун."
+)
+
+SOURCE = f"""===PRODUCT===
+1. Шнур базальтовый теплоизоляционный ШБТ
+https://mikizol.ru/products/shnur-bazaltovyy-shbt/
++7 (800) 707-41-93звонок по России бесплатный crm@mikizol.ru
+
+Продукция
+Воздуховодов
+Мастика {SHNUR_TEXT}Купить на OZON {SHNUR_TEXT}
+Описание
+Преимущества
+Инструкция
+Универсальность
+Базальтовый шнур – удобный и гибкий теплоизолятор для фланцевых соединений и оборудования сложной геометрии.
+
+Цвет: Серый
+Цена: 1 250 руб. за метр
+Обязательный пожарный сертификат НГ
+Универсальность
+Базальтовый шнур – удобный и гибкий теплоизолятор для фланцевых соединений и оборудования сложной геометрии.
+Энергетика
+Полезные статьи Применяемые на данном интернет-сайте названия
+
+===PRODUCT===
+2. Мат базальтовый прошивной ОБМ-50
+https://mikizol.ru/products/obm-50/
+Мастика {MAT_TEXT}
+| Плотность, кг/м3 | 50 |
+Снят с производства
+"""
+
+
+def make_conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute('''
+        CREATE TABLE products (
+            product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            official_name TEXT, slang_name TEXT, department TEXT,
+            is_archived BOOLEAN, weight_priority INTEGER
+        )
+    ''')
+    conn.execute(
+        "INSERT INTO products (official_name, slang_name, department, weight_priority) "
+        "VALUES ('Шнур базальтовый теплоизоляционный ШБТ', 'шнурок', 'Продажи', 5)"
+    )
+    conn.commit()
+    return conn
+
+
+def test_parse_products_txt_structured_records():
+    shnur, mat = parse_products_txt(SOURCE)
+    assert shnur.name == "Шнур базальтовый теплоизоляционный ШБТ"
+    assert shnur.url == "https://mikizol.ru/products/shnur-bazaltovyy-shbt/"
+    # Меню и дубль после "Купить на OZON" отрезаны, повтор вкладок не задваивает разделы
+    assert shnur.description == SHNUR_TEXT
+    assert [h for h, _ in shnur.advantages] == ["Универсальность"]
+    assert shnur.specs == {"Цвет": "Серый", "Цена": "1 250 руб. за метр"}
+    assert shnur.price == 1250
+    assert shnur.certificates == ["Обязательный пожарный сертификат НГ"]
+    assert not shnur.is_archived
+
+    assert mat.is_archived and mat.specs == {"Плотность, кг/м3": "50"}
+    assert mat.slang_names == ["ОБМ-50", "ОБМ 50", "Мат базальтовый прошивной"]
+    assert derive_slang_names("Обрезь базальтовая") == []
+
+
+def test_compile_upserts_only_changed_products(tmp_path):
+    conn = make_conn()
+    kb_path, vectors_path = str(tmp_path / "products_kb.md"), str(tmp_path / "product_vectors.npz")
+
+    first = compile_catalog(conn, SOURCE, kb_path, vectors_path)
+    assert (first["inserted"], first["updated"], first["version"]) == (1, 1, 1)
+    # Ручные колонки и сленг сохраняются
+    row = conn.execute(
+        "SELECT slang_name, department, weight_priority, price FROM products WHERE product_id = 1"
+    ).fetchone()
+    assert row == ("ШБТ,Шнур базальтовый теплоизоляционный,шнурок", "Продажи", 5, "1250")
+
+    # Архивный товар не попадает ни в базу знаний, ни в векторный индекс
+    chunks = chunk_markdown(open(kb_path, encoding="utf-8").read())
+    assert {c.product for c in chunks} == {"Шнур базальтовый теплоизоляционный ШБТ"}
+    assert "Технические характеристики" in {c.section for c in chunks}
+    index = ProductVectorIndex.load(vectors_path)
+    assert set(index.product_ids.tolist()) == {"1"}
+
+    again = compile_catalog(conn, SOURCE, kb_path, vectors_path)
+    assert (again["inserted"], again["updated"], again["unchanged"], again["version"]) == (0, 0, 2, 1)
+
+    changed = compile_catalog(conn, SOURCE.replace("1 250", "1 300"), kb_path, vectors_path)
+    assert (changed["updated"], changed["unchanged"], changed["version"]) == (1, 1, 2)
+
+
+def test_products_missing_from_source_are_archived(tmp_path):
+    conn = make_conn()
+    compile_catalog(conn, SOURCE.replace("Снят с производства", ""), None, None)
+    only_shnur = SOURCE.split("===PRODUCT===\n2.")[0]
+
+    result = compile_catalog(conn, only_shnur, None, None)
+    assert result["archived"] == 1
+    archived = conn.execute(
+        "SELECT is_archived FROM products WHERE official_name = 'Мат базальтовый прошивной ОБМ-50'"
+    ).fetchone()[0]
+    assert archived == 1
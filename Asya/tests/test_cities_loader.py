@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+from src.database.cities_loader import CitiesReloader, get_data_version, swap_cities_map
+from src.database.city_aliases import install_region_triggers, rebuild_city_aliases
+
+NEW_ROWS = [
+    ("москва", "сentral_fd", "Центральный ФО", False, '["мск"]', ""),
+    ("казань", "privolzhsky_fd", "Приволжский ФО", False, "", ""),
+]
+
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE cities_map (
+            city_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            city_name TEXT, region_code TEXT, region_name TEXT,
+            is_duplicate BOOLEAN, aliases TEXT, phone_route_code TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_cities_region ON cities_map(region_code)")
+    conn.execute("CREATE TABLE clients_info (client_id TEXT PRIMARY KEY, city_name TEXT, region_code TEXT, region_name TEXT)")
+    conn.execute(
+        "INSERT INTO cities_map (city_name, region_code, region_name) VALUES ('москва', 'сentral_fd', 'Центральный ФО')"
+    )
+    rebuild_city_aliases(conn)
+    install_region_triggers(conn)
+    conn.commit()
+    return conn
+
+
+def test_swap_replaces_table_and_keeps_triggers(tmp_path):
+    conn = make_db(str(tmp_path / "clients.db"))
+    result = swap_cities_map(conn, NEW_ROWS)
+    assert result == {"cities": 2, "aliases": 3, "version": 1}
+    assert get_data_version(conn) == 1
+
+    # Триггеры clients_info и индексы cities_map пережили RENAME
+    conn.execute("INSERT INTO clients_info (client_id, city_name) VALUES ('1', 'казань')")
+    assert conn.execute("SELECT region_code FROM clients_info").fetchone()[0] == "privolzhsky_fd"
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert "idx_cities_region" in names and "cities_map_new" not in names and "cities_map_old" not in names
+
+
+def test_invalid_rows_leave_old_table(tmp_path):
+    conn = make_db(str(tmp_path / "clients.db"))
+    with pytest.raises(ValueError):
+        swap_cities_map(conn, [("", "сentral_fd", "Центральный ФО", False, "", "")])
+    with pytest.raises(ValueError):
+        swap_cities_map(conn, [])
+    assert conn.execute("SELECT city_name FROM cities_map").fetchall() == [("москва",)]
+    assert get_data_version(conn) == 0
+
+
+def test_reloader_picks_up_new_version(tmp_path):
+    db_path = str(tmp_path / "clients.db")
+    conn = make_db(db_path)
+    loaded = []
+    reloader = CitiesReloader(db_path, on_reload=loaded.append)
+    assert reloader.check() is False
+
+    swap_cities_map(conn, NEW_ROWS)
+    assert reloader.check() is True
+    assert [row["city_name"] for row in loaded[0]] == ["москва", "казань"]
+    assert reloader.version == 1 and reloader.check() is False
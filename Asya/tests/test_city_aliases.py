@@ -0,0 +1,63 @@
+import sqlite3
+
+from src.database.city_aliases import install_region_triggers, rebuild_city_aliases
+
+
+def make_conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute('''
+        CREATE TABLE cities_map (
+            city_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            city_name TEXT, region_code TEXT, region_name TEXT,
+            is_duplicate BOOLEAN, aliases TEXT, phone_route_code TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE clients_info (
+            client_id TEXT PRIMARY KEY, phone TEXT UNIQUE, name TEXT,
+            city_name TEXT, region_code TEXT, region_name TEXT
+        )
+    ''')
+    conn.executemany(
+        "INSERT INTO cities_map (city_name, region_code, region_name, aliases) VALUES (?, ?, ?, ?)",
+        [
+            ("москва", "сentral_fd", "Центральный ФО", "мск,moskva"),
+            ("санкт петербург", "north-western_fd", "Северо-Западный ФО", '["питер", "спб"]'),
+            ("берёзовский", "siberian_fd", "Сибирский ФО", ""),
+            ("берёзовский", "ural_fd", "Уральский ФО", ""),
+        ],
+    )
+    rebuild_city_aliases(conn)
+    install_region_triggers(conn)
+    return conn
+
+
+def test_triggers_resolve_json_and_csv_aliases():
+    conn = make_conn()
+    conn.execute("INSERT INTO clients_info (client_id, city_name) VALUES ('1', 'питер')")
+    conn.execute("INSERT INTO clients_info (client_id, city_name) VALUES ('2', 'MSK')")
+    conn.execute("UPDATE clients_info SET city_name = 'мск' WHERE client_id = '2'")
+    rows = dict(conn.execute("SELECT client_id, region_code FROM clients_info").fetchall())
+    assert rows == {"1": "north-western_fd", "2": "сentral_fd"}
+
+
+def test_duplicate_city_takes_first_row_and_unknown_keeps_region():
+    conn = make_conn()
+    # "березовский" без ё — через вариант ключа, первый город из cities_map
+    conn.execute("INSERT INTO clients_info (client_id, city_name) VALUES ('1', 'березовский')")
+    # Неизвестный город не затирает регион, записанный приложением
+    conn.execute(
+        "INSERT INTO clients_info (client_id, city_name, region_code) VALUES ('2', 'неизвестноград', 'ural_fd')"
+    )
+    rows = dict(conn.execute("SELECT client_id, region_code FROM clients_info").fetchall())
+    assert rows == {"1": "siberian_fd", "2": "ural_fd"}
+
+
+def test_trigger_lookup_uses_alias_index():
+    conn = make_conn()
+    plan = " ".join(
+        row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT city_id FROM city_aliases WHERE alias_lower = ?", ("мск",)
+        )
+    )
+    assert "USING PRIMARY KEY" in plan
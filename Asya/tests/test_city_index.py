@@ -0,0 +1,123 @@
+import csv
+import os
+
+import pytest
+from thefuzz import fuzz
+from src.utils.city_declension import city_case_forms
+from src.utils.city_index import CityIndex, CityResolver, parse_aliases
+
+CITIES_CSV = os.path.join(os.path.dirname(__file__), "..", "..", "_Cities_maps_.csv")
+
+ROWS = [
+    {"city_name": "москва", "region_code": "сentral_fd", "region_name": "Центральный ФО", "aliases": "мск,moskva"},
+    {"city_name": "санкт петербург", "region_code": "north-western_fd", "region_name": "Северо-Западный ФО",
+     "aliases": '["питер", "ленинград", "спб"]'},
+    {"city_name": "новосибирск", "region_code": "siberian_fd", "region_name": "Сибирский ФО", "aliases": None},
+    {"city_name": "озёрск", "region_code": "ural_fd", "region_name": "Уральский ФО", "aliases": ""},
+]
+
+
+def test_parse_aliases_json_and_csv():
+    # В CSV алиасы лежат JSON-списком, в ручных записях — через запятую
+    assert parse_aliases('["питер", "СПб"]') == ["питер", "спб"]
+    assert parse_aliases("мск, moskva") == ["мск", "moskva"]
+    assert parse_aliases(float("nan")) == []
+
+
+def test_exact_lookup_by_name_and_alias():
+    index = CityIndex(ROWS)
+    row, score = index.lookup("  Москва ")
+    assert row["region_code"] == "сentral_fd" and score == 100
+
+    row, score = index.lookup("питер")
+    assert row["city_name"] == "санкт петербург" and score == 100
+
+    # ё и дефисы не мешают точному поиску
+    assert index.lookup("озерск")[0]["city_name"] == "озёрск"
+    assert index.lookup("Санкт-Петербург")[0]["city_name"] == "санкт петербург"
+
+
+def test_fuzzy_lookup_respects_threshold():
+    index = CityIndex(ROWS)
+    row, score = index.lookup("новосибирк")
+    assert row["city_name"] == "новосибирск" and score > 70
+
+    row, score = index.lookup("владивосток")
+    assert row is None and score <= 70
+
+
+def test_resolve_city_single_pass_and_cache():
+    resolver = CityResolver(CityIndex(ROWS), cache_size=2)
+    info = resolver.resolve_city("Я из Москвы")
+    assert info["city_name"] == "москва"
+    assert info["region_code"] == "сentral_fd"
+    assert info["is_duplicate"] is False and info["phone_route_code"] is None
+
+    # Повторный запрос берётся из кэша, изменение результата не портит кэш
+    info["city_name"] = "испорчено"
+    assert resolver.resolve_city("я из москвы")["city_name"] == "москва"
+    assert resolver.cache_info()["hits"] == 1
+    assert resolver.cache_info()["misses"] == 1
+
+    assert resolver.resolve_city("владивосток") is None
+
+
+def test_matches_full_scan_on_real_map():
+    # Индекс должен выбирать тот же город, что и старый полный перебор
+    if not os.path.exists(CITIES_CSV):
+        pytest.skip("_Cities_maps_.csv не найден")
+    with open(CITIES_CSV, encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f))
+    index = CityIndex(rows)
+
+    def full_scan(query):
+        best_match, best_score = None, 0
+        for row in rows:
+            for term in [row["city_name"].strip().lower()] + parse_aliases(row["aliases"]):
+                score = fuzz.ratio(query, term)
+                if score > best_score:
+                    best_match, best_score = row, score
+        return best_match if best_score > 70 else None
+
+    for query in ["екатеринбур", "новгородд", "кондапога", "челябинс", "питер", "ростов на дону", "абвгд"]:
+        expected = full_scan(query)
+        row, _ = index.lookup(query)
+        assert (row["city_name"] if row else None) == (expected["city_name"] if expected else None), query
+
+
+def test_lookup_many_matches_lookup():
+    index = CityIndex(ROWS)
+    queries = ["Москва", "питер", "новосибирк", "владивосток", None, "новосибирк"]
+    results = index.lookup_many(queries)
+    assert [row["city_name"] if row else None for row, _ in results] == [
+        "москва", "санкт петербург", "новосибирск", None, None, "новосибирск",
+    ]
+    assert results[2][1] == index.lookup("новосибирк")[1]
+
+
+def test_city_case_forms():
+    assert {"москвы", "москве", "москву", "москвой"} <= city_case_forms("Москва")
+    assert "нижнего новгорода" in city_case_forms("нижний новгород")
+    assert "ростова на дону" in city_case_forms("ростов-на-дону")
+    assert "санкт петербурге" in city_case_forms("санкт петербург")
+    # Несклоняемые названия и исходная форма не добавляются
+    assert city_case_forms("сочи") == set()
+    assert "москва" not in city_case_forms("москва")
+
+
+def test_declined_forms_resolve_by_exact_lookup():
+    index = CityIndex(ROWS)
+    row, score = index.lookup("Москвы")
+    assert row["city_name"] == "москва" and score == 100
+    assert index.lookup("питере")[0]["city_name"] == "санкт петербург"
+    assert index.lookup("санкт-петербурга")[0]["city_name"] == "санкт петербург"
+    assert index.lookup("новосибирк")[0]["city_name"] == "новосибирск"
+    assert index.lookup("владивосток")[0] is None
+
+    stats = index.lookup_stats()
+    assert stats == {"exact": 0, "declension": 3, "fuzzy": 1, "miss": 1, "total": 5, "exact_ratio": 0.6}
+
+    # Без падежных форм "москвы" находится только fuzzy-поиском
+    plain = CityIndex(ROWS, declensions=False)
+    assert plain.lookup("москвы")[1] < 100
+    assert plain.lookup_stats()["fuzzy"] == 1
@@ -0,0 +1,64 @@
+import sqlite3
+
+from src.database.client_repository import ClientRepository, mark_client_changed
+from src.database.phone_keys import migrate_phone_keys
+
+
+def make_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE clients_info (
+            client_id TEXT PRIMARY KEY, phone TEXT UNIQUE, name TEXT, city_name TEXT
+        )
+    ''')
+    conn.executemany(
+        "INSERT INTO clients_info (client_id, phone, name) VALUES (?, ?, ?)",
+        [("1", "+79161234567", "Анна"), ("2", "89031112233", "Борис")],
+    )
+    migrate_phone_keys(conn)
+    conn.commit()
+    return conn
+
+
+def test_lookup_by_phone_in_any_format(tmp_path):
+    repo = ClientRepository.load(make_db(str(tmp_path / "clients.db")))
+    assert len(repo) == 2
+    assert repo.find_by_phone("8 (916) 123-45-67")["name"] == "Анна"
+    assert repo.find_by_phone("+79031112233")["client_id"] == "2"
+    assert repo.find_by_phone("89990000000") is None
+
+
+def test_apply_committed_updates_one_client(tmp_path):
+    conn = make_db(str(tmp_path / "clients.db"))
+    repo = ClientRepository.load(conn)
+
+    conn.execute("UPDATE clients_info SET phone = '89990001122', phone_e164 = '+79990001122' WHERE client_id = '1'")
+    conn.execute("INSERT INTO clients_info (client_id, phone, phone_e164, name) VALUES ('3', '+79260000000', '+79260000000', 'Вера')")
+    mark_client_changed(conn, "1")
+    mark_client_changed(conn, "3")
+    conn.commit()
+    repo.apply_committed(conn, "1")
+    repo.apply_committed(conn, "3")
+
+    assert repo.find_by_phone("+79161234567") is None
+    assert repo.find_by_phone("89990001122")["name"] == "Анна"
+    assert repo.get("3")["name"] == "Вера"
+    assert repo.version == 2
+
+
+def test_refresh_reads_only_changed_rows(tmp_path):
+    db_path = str(tmp_path / "clients.db")
+    make_db(db_path).close()
+    reader = sqlite3.connect(db_path)
+    repo = ClientRepository.load(reader)
+    assert repo.refresh(reader) == 0
+
+    # Другой процесс меняет клиента
+    writer = sqlite3.connect(db_path)
+    writer.execute("UPDATE clients_info SET city_name = 'казань' WHERE client_id = '2'")
+    mark_client_changed(writer, "2")
+    writer.commit()
+
+    assert repo.refresh(reader) == 1
+    assert repo.get("2")["city_name"] == "казань"
+    assert repo.refresh(reader) == 0
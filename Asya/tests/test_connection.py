@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+
+import pytest
+from src.database.connection import ConnectionManager, get_connection_manager
+
+
+def test_connection_is_per_thread_and_tuned(tmp_path):
+    manager = ConnectionManager(str(tmp_path / "clients.db"))
+    conn = manager.connection()
+    assert manager.connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(manager.connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+    manager.close_all()
+
+
+def test_transaction_commits_or_rolls_back(tmp_path):
+    manager = ConnectionManager(str(tmp_path / "clients.db"))
+    with manager.transaction() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+    with pytest.raises(RuntimeError):
+        with manager.transaction(immediate=True) as conn:
+            conn.execute("INSERT INTO t VALUES (2)")
+            raise RuntimeError("сбой")
+
+    # Изменения видны другим соединениям, откат — нет
+    reader = sqlite3.connect(manager.db_path)
+    assert reader.execute("SELECT x FROM t").fetchall() == [(1,)]
+    reader.close()
+    manager.close_all()
+
+
+def test_readers_do_not_wait_for_writer(tmp_path):
+    manager = ConnectionManager(str(tmp_path / "clients.db"), busy_timeout=0.1)
+    with manager.transaction() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (1)")
+
+    writer = sqlite3.connect(manager.db_path)
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("INSERT INTO t VALUES (2)")
+    # WAL: чтение идёт по последнему коммиту, пока писатель держит блокировку
+    assert manager.connection().execute("SELECT count(*) FROM t").fetchone()[0] == 1
+    writer.rollback()
+    writer.close()
+    manager.close_all()
+
+
+def test_manager_is_shared_per_file(tmp_path):
+    path = str(tmp_path / "clients.db")
+    assert get_connection_manager(path) is get_connection_manager(str(tmp_path / "." / "clients.db"))
@@ -0,0 +1,118 @@
+import sqlite3
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from src.database.db_manager import DatabaseManager
+from src.database.group_commit import apply_jobs
+
+
+def make_db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "clients.db"))
+    conn = sqlite3.connect(db.db_path)
+    conn.executemany(
+        "INSERT INTO cities_map (region_code, region_name, city_name, aliases, phone_route_code) VALUES (?, ?, ?, ?, ?)",
+        [
+            ("сentral_fd", "Центральный ФО", "москва", "мск,moskva", "495"),
+            ("north-western_fd", "Северо-Западный ФО", "санкт петербург", '["питер", "спб"]', "812"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return db
+
+
+def test_get_region_by_city_alias_and_typo(tmp_path):
+    db = make_db(tmp_path)
+    assert db.get_region_by_city("Питер")["region_code"] == "north-western_fd"
+    region = db.get_region_by_city("моска")
+    assert region["city_name"] == "москва" and region["phone_route_code"] == "495"
+    assert db.get_region_by_city("владивосток") is None
+
+
+def test_find_client_by_phone_matches_any_stored_format(tmp_path):
+    db = make_db(tmp_path)
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("INSERT INTO clients_info (client_id, phone, name) VALUES ('1', '+79161234567', 'Анна')")
+    conn.commit()
+    conn.close()
+    # Записи до миграции получают phone_e164 при следующем запуске
+    db = DatabaseManager(db.db_path)
+    assert db.find_client_by_phone("8 (916) 123-45-67")["name"] == "Анна"
+    assert db.find_client_by_phone("79161234567")["client_id"] == "1"
+    assert db.find_client_by_phone("123") is None
+
+
+def test_turns_written_during_call_survive_a_crash(tmp_path):
+    db = make_db(tmp_path)
+    started = datetime.now() - timedelta(hours=1)
+    for turn, (speaker, text) in enumerate([("client", "алло"), ("bot", "здравствуйте")], start=1):
+        segment = SimpleNamespace(speaker=speaker, text=text, timestamp=started)
+        with db.connections.transaction() as conn:
+            apply_jobs(conn, [db.turn_write("call-1", turn, segment)])
+
+    assert db.recover_unfinished_calls(idle_minutes=30) == 1
+    assert db.recover_unfinished_calls(idle_minutes=30) == 0
+    conn = sqlite3.connect(db.db_path)
+    assert conn.execute("SELECT sip_status FROM calls WHERE call_id = 'call-1'").fetchone() == ("interrupted",)
+    assert [row[0] for row in conn.execute(
+        "SELECT segment_id FROM call_transcripts WHERE call_id = 'call-1' ORDER BY segment_id"
+    )] == ["seg_0001", "seg_0002"]
+    conn.close()
+
+
+class Profile:
+    """Минимальный CallProfile: поля диалога в data, client_id и признаки звонка атрибутами."""
+
+    def __init__(self, client_id=None, **data):
+        self.client_id = client_id
+        self.is_repeat_call = False
+        self.last_call_summary = None
+        self.data = data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+
+def test_saving_known_number_updates_existing_client(tmp_path):
+    db = make_db(tmp_path)
+    first = db.save_call_data(Profile(**{"Телефон": "+79161234567", "Имя клиента": "Анна", "Город": "москва"}), [], [])
+    conn = sqlite3.connect(db.db_path)
+    (client_id,) = conn.execute("SELECT client_id FROM calls WHERE call_id = ?", (first,)).fetchone()
+
+    # Номер в другом формате, client_id не известен, имя не названо
+    second = db.save_call_data(Profile(**{"Телефон": "8 916 123 45 67", "Комментарии": "повторный"}), [], [])
+    assert conn.execute("SELECT client_id, name, city_name, comment FROM clients_info").fetchall() == [
+        (client_id, "Анна", "москва", "повторный")
+    ]
+    assert conn.execute("SELECT client_id FROM calls WHERE call_id = ?", (second,)).fetchone() == (client_id,)
+    conn.close()
+
+
+def test_group_attaches_client_to_turns_queued_after_another_call(tmp_path):
+    db = make_db(tmp_path)
+    segment = SimpleNamespace(speaker="client", text="алло", timestamp=datetime.now())
+    jobs = [
+        db.build_call_write(Profile("a", **{"Телефон": "+79161234567"}), [], [], call_id="A", transcript_saved=True),
+        db.turn_write("B", 1, segment),
+        db.build_call_write(Profile("b", **{"Телефон": "+79031234567"}), [], [], call_id="B", transcript_saved=True),
+    ]
+    with db.connections.transaction() as conn:
+        apply_jobs(conn, jobs)
+    conn = sqlite3.connect(db.db_path)
+    assert conn.execute("SELECT call_id, client_id FROM call_transcripts").fetchall() == [("B", "b")]
+    conn.close()
+
+
+def test_recovered_call_belongs_to_client_found_after_first_turns(tmp_path):
+    db = make_db(tmp_path)
+    segment = SimpleNamespace(speaker="bot", text="здравствуйте", timestamp=datetime.now() - timedelta(hours=1))
+    with db.connections.transaction() as conn:
+        # Приветствие записано до конца предзагрузки, следующая реплика — уже с клиентом
+        apply_jobs(conn, [db.turn_write("call-1", 1, segment), db.attach_turns_write("call-1", "1")])
+        apply_jobs(conn, [db.turn_write("call-1", 2, segment, client_id="1")])
+
+    assert db.recover_unfinished_calls(idle_minutes=30) == 1
+    conn = sqlite3.connect(db.db_path)
+    assert conn.execute("SELECT client_id FROM calls WHERE call_id = 'call-1'").fetchone() == ("1",)
+    assert conn.execute("SELECT DISTINCT client_id FROM call_transcripts").fetchall() == [("1",)]
+    conn.close()
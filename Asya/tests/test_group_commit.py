@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+
+import pytest
+from src.database.connection import ConnectionManager
+from src.database.group_commit import GroupCommitWriter, WriteJob
+
+INSERT_CALL = "INSERT INTO calls (call_id, client_id) VALUES (?, ?)"
+INSERT_SEGMENT = "INSERT INTO call_transcripts (call_id, text) VALUES (?, ?)"
+
+
+def make_writer(db_path, **kwargs):
+    connections = ConnectionManager(db_path)
+    with connections.transaction() as conn:
+        conn.executemany("INSERT INTO clients_info (client_id) VALUES (?)", [(str(i),) for i in range(10)])
+    writer = GroupCommitWriter(connections, **kwargs)
+    writer.start()
+    return writer
+
+
+def call_job(i):
+    return WriteJob(
+        statements=[(INSERT_CALL, [(f"c{i}", str(i % 10))]), (INSERT_SEGMENT, [(f"c{i}", "алло"), (f"c{i}", "да")])],
+        changed_clients=[str(i % 10)],
+        result=f"c{i}",
+    )
+
+
+def test_concurrent_jobs_are_committed_in_groups(db_path):
+    writer = make_writer(db_path, flush_interval=0.05)
+    futures = []
+    threads = [
+        threading.Thread(target=lambda i=i: futures.append(writer.submit_job(call_job(i))))
+        for i in range(40)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(f.result(timeout=2) for f in futures) == sorted(f"c{i}" for i in range(40))
+
+    conn = sqlite3.connect(writer.connections.db_path)
+    assert conn.execute("SELECT count(*) FROM calls").fetchone()[0] == 40
+    assert conn.execute("SELECT count(*) FROM call_transcripts").fetchone()[0] == 80
+    # Одна версия "clients" на группу
+    metrics = writer.metrics.snapshot()
+    assert metrics["jobs"] == 40 and metrics["rows"] == 120
+    assert metrics["groups"] < 40 and metrics["max_group_jobs"] > 1
+    assert conn.execute("SELECT version FROM data_versions WHERE name = 'clients'").fetchone()[0] == metrics["groups"]
+    conn.close()
+    writer.stop(timeout=1)
+
+
+def test_failed_job_does_not_lose_its_group(db_path):
+    writer = make_writer(db_path, flush_interval=0.05)
+    good = writer.submit_job(call_job(1))
+    duplicate = writer.submit_job(call_job(1))  # тот же call_id — нарушение PRIMARY KEY
+    other = writer.submit_job(call_job(2))
+    assert good.result(timeout=2) == "c1" and other.result(timeout=2) == "c2"
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result(timeout=2)
+    assert writer.metrics.snapshot()["failed_groups"] == 1
+    writer.stop(timeout=1)
+
+
+def test_plain_functions_keep_queue_order(db_path):
+    writer = make_writer(db_path, flush_interval=0.05)
+    job = writer.submit_job(call_job(3))
+
+    def count_calls():
+        return writer.connections.connection().execute("SELECT count(*) FROM calls").fetchone()[0]
+
+    # Функция, поставленная после записи, видит её закоммиченной
+    assert writer.submit(count_calls).result(timeout=2) == 1
+    assert job.result(timeout=2) == "c3"
+    writer.stop(timeout=1)
@@ -0,0 +1,69 @@
+from src.utils.city_index import CityIndex
+from src.utils.intent_detector import IntentDetector, ensure_intent_detector, get_intent_detector
+
+PRODUCTS = [
+    {"product_id": 1, "official_name": "Мат прошивной базальтовый МПБ", "slang_name": "прошивной мат,мпб",
+     "is_archived": False},
+    {"product_id": 2, "official_name": "Шнур базальтовый ШБТ-50", "slang_name": "шбт,шнур", "is_archived": 0},
+    {"product_id": 3, "official_name": "Минеральная вата", "slang_name": "минвата", "is_archived": True},
+]
+
+CITIES = [
+    {"city_name": "Москва", "aliases": '["мск"]'},
+    {"city_name": "Санкт-Петербург", "aliases": "питер,спб"},
+]
+
+
+def spans(detector, text):
+    return [(s.type, s.text) for s in detector.scan(text)]
+
+
+def test_scan_returns_typed_spans_in_one_pass():
+    detector = IntentDetector(PRODUCTS, city_index=CityIndex(CITIES))
+    found = detector.scan("Сколько стоит шнур базальтовый ШБТ-50? Нужно 2,5 тонны в Питер")
+    assert [(s.type, s.text) for s in found] == [
+        ("question", "Сколько стоит"),
+        ("product", "шнур базальтовый ШБТ-50"),
+        ("number", "2,5"),
+        ("city", "Питер"),
+    ]
+    assert found[1].value["product_id"] == 2
+    assert found[2].value == 2.5
+    assert found[3].value["city_name"] == "Санкт-Петербург"
+    # Позиции — в исходном тексте
+    text = "из Москвы"
+    city = detector.scan(text)[0]
+    assert text[city.start:city.end] == "Москвы"
+
+
+def test_departments_and_word_boundaries():
+    detector = IntentDetector(PRODUCTS)
+    found = detector.scan("соедините с бухгалтерией")
+    assert [(s.type, s.value) for s in found] == [("department", "бухгалтерский")]
+    assert detector.scan("переведите на отдел продаж")[0].value == "коммерческий"
+    # "мат" не находится внутри других слов, окончания допускаются
+    assert spans(detector, "из материала автомат") == []
+    assert spans(detector, "маты нужны") == [("product", "маты")]
+    # Короткий термин — только с грамматическим окончанием
+    assert spans(detector, "нужен матрас") == []
+    assert spans(detector, "десять матов") == [("product", "матов")]
+
+
+def test_products_helper_skips_archived_and_deduplicates():
+    detector = IntentDetector(PRODUCTS)
+    mentioned, rows = detector.products("прошивной мат МПБ, мпб")
+    assert mentioned and [r["product_id"] for r in rows] == [1]
+    # Архивный товар не находится, но общее слово "вата" — вопрос о продукции
+    mentioned, rows = detector.products("а минвата есть?")
+    assert mentioned and rows == []
+    assert detector.products("добрый день") == (False, [])
+    assert detector.scan(None) == []
+
+
+def test_ensure_rebuilds_only_when_catalog_changes():
+    first = ensure_intent_detector(PRODUCTS)
+    assert ensure_intent_detector([dict(p) for p in PRODUCTS]) is first
+    changed = PRODUCTS + [{"product_id": 4, "official_name": "Огнезащитная мастика"}]
+    second = ensure_intent_detector(changed)
+    assert second is not first and get_intent_detector() is second
+    assert second.products("огнезащитная мастика")[1][0]["product_id"] == 4
@@ -0,0 +1,76 @@
+from src.asya_core.knowledge_base import (
+    KnowledgeBase, chunk_markdown, estimate_tokens, kb_query_from_history, kb_system_message,
+)
+
+CATALOG = """# Продукты компании
+
+## 1. Шнур базальтовый теплоизоляционный ШБТ
+
+### Описание
+Шнур из базальтового волокна для термоизоляции труб и дымоходов.
+
+### Технические характеристики
+| Плотность оплетки | Высокая |
+| Температура эксплуатации | От -260 до 900 |
+
+---
+
+## 2. Огнезащитная краска EXPERT FIRE-M
+
+### Описание
+Вспучивающаяся краска для огнезащиты металлоконструкций.
+
+### Преимущества
+
+#### Экономичный расход
+Тонкий слой даёт нужный предел огнестойкости.
+"""
+
+
+def test_chunk_markdown_by_product_and_section():
+    chunks = chunk_markdown(CATALOG)
+    assert [(c.product, c.section) for c in chunks] == [
+        ("Шнур базальтовый теплоизоляционный ШБТ", "Описание"),
+        ("Шнур базальтовый теплоизоляционный ШБТ", "Технические характеристики"),
+        ("Огнезащитная краска EXPERT FIRE-M", "Описание"),
+        ("Огнезащитная краска EXPERT FIRE-M", "Преимущества"),
+    ]
+    # Подраздел остаётся внутри раздела, разделитель "---" выброшен
+    assert "Экономичный расход" in chunks[3].text
+    assert "---" not in chunks[1].text
+
+
+def test_search_ranks_relevant_chunks():
+    kb = KnowledgeBase(chunk_markdown(CATALOG))
+    best, _ = kb.search("какая температура эксплуатации у шнура?")[0]
+    assert best.section == "Технические характеристики"
+    assert {c.product for c, _ in kb.search("краска для металлоконструкций")} == {"Огнезащитная краска EXPERT FIRE-M"}
+    assert kb.search("добрый день") == []
+
+
+def test_build_context_respects_token_budget():
+    kb = KnowledgeBase(chunk_markdown(CATALOG))
+    context = kb.build_context("базальтовый шнур", token_budget=60)
+    assert "Шнур" in context and estimate_tokens(context) < 60 + 40
+    assert kb.build_context("базальтовый шнур", token_budget=5) == ""
+
+
+def test_kb_system_message_uses_last_user_turns():
+    kb = KnowledgeBase(chunk_markdown(CATALOG))
+    history = [
+        {"role": "system", "content": "промпт"},
+        {"role": "user", "content": "нужна огнезащитная краска"},
+        {"role": "assistant", "content": "Уточните, пожалуйста"},
+        {"role": "user", "content": "а какой расход?"},
+    ]
+    assert kb_query_from_history(history) == "нужна огнезащитная краска а какой расход?"
+    message = kb_system_message(kb, history)
+    assert message["role"] == "system" and "Экономичный расход" in message["content"]
+    assert kb_system_message(None, history) is None
+
+
+def test_real_catalog_context_is_much_smaller():
+    kb = KnowledgeBase.from_file()
+    context = kb.build_context("какая плотность у прошивного мата")
+    assert "Мат базальтовый прошивной" in context
+    assert estimate_tokens(context) < kb.total_tokens / 5
@@ -0,0 +1,115 @@
+import sqlite3
+
+import pytest
+
+from src.database.call_history import RECENT_CALLS_SQL, UNFINISHED_CALLS_SQL
+from src.database.migrations import MIGRATIONS, TABLES, current_version, migrate
+
+# Горячие запросы и индексы, которые они обязаны использовать
+HOT_QUERIES = [
+    ("SELECT * FROM clients_info WHERE phone_e164 = ?", ("+79161234567",), ["idx_clients_phone_e164"]),
+    ("SELECT * FROM clients_info WHERE change_version > ? ORDER BY change_version", (0,), ["idx_clients_change_version"]),
+    (
+        RECENT_CALLS_SQL,
+        {"client_id": "1", "n": 3, "segments": 4, "chars": 200},
+        ["COVERING INDEX idx_calls_client_timestamp", "idx_transcripts_call_segment"],
+    ),
+    (
+        "SELECT c.call_id FROM clients_info AS ci JOIN calls AS c ON c.client_id = ci.client_id "
+        "WHERE ci.phone_e164 = ? ORDER BY c.timestamp DESC LIMIT 3",
+        ("+79161234567",),
+        ["idx_clients_phone_e164", "idx_calls_client_timestamp"],
+    ),
+    (
+        "SELECT speaker, text, segment_time FROM call_transcripts WHERE call_id = ? ORDER BY rowid",
+        ("c1",),
+        ["idx_transcripts_call_segment"],
+    ),
+    (UNFINISHED_CALLS_SQL, {"before": "2025-01-01"}, ["idx_transcripts_call_segment", "sqlite_autoindex_calls_1"]),
+    ("SELECT json_blob FROM jsons WHERE call_id = ?", ("c1",), ["sqlite_autoindex_jsons_1"]),
+    (
+        "SELECT call_id, timestamp FROM jsons WHERE client_id = ? ORDER BY timestamp DESC",
+        ("1",),
+        ["idx_jsons_client_timestamp"],
+    ),
+    (
+        "SELECT month FROM archived_call_months WHERE client_id = ? ORDER BY month DESC",
+        ("1",),
+        ["PRIMARY KEY (client_id=?)"],
+    ),
+    (
+        "SELECT c.city_name, c.region_code FROM city_aliases AS a "
+        "JOIN cities_map AS c ON c.city_id = a.city_id WHERE a.alias_lower = ?",
+        ("мск",),
+        ["PRIMARY KEY (alias_lower=?)", "INTEGER PRIMARY KEY (rowid=?)"],
+    ),
+]
+
+
+def query_plan(conn, sql, params):
+    return "\n".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+
+def columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def test_fresh_database_gets_every_migration_once():
+    conn = sqlite3.connect(":memory:")
+    assert migrate(conn) == [m.version for m in MIGRATIONS]
+    assert migrate(conn) == []
+    assert current_version(conn) == MIGRATIONS[-1].version
+    for table, table_columns in TABLES.items():
+        assert columns(conn, table) == [name for name, _ in table_columns]
+
+
+@pytest.mark.parametrize("sql, params, indexes", HOT_QUERIES)
+def test_hot_queries_use_indexes(sql, params, indexes):
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    plan = query_plan(conn, sql, params)
+    for index in indexes:
+        assert index in plan, plan
+
+
+def test_legacy_schemas_converge(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "clients.db"))
+    # db_create.py до миграций: без is_duplicate_city/created_at, у jsons нет первичного ключа
+    conn.execute("CREATE TABLE clients_info (client_id TEXT PRIMARY KEY, phone TEXT UNIQUE, name TEXT, city_name TEXT, "
+                 "region_code TEXT, region_name TEXT)")
+    conn.execute("CREATE TABLE jsons (call_id TEXT, client_id TEXT, timestamp TEXT, json_data TEXT)")
+    conn.execute("CREATE TABLE products (product_id TEXT PRIMARY KEY, official_name TEXT)")
+    # DatabaseManager до миграций: города в regions_map
+    conn.execute("CREATE TABLE regions_map (region_code TEXT PRIMARY KEY, region_name TEXT, city_name TEXT, "
+                 "aliases TEXT, phone_route_code TEXT)")
+    conn.execute("INSERT INTO regions_map VALUES ('msk', 'Центральный ФО', 'москва', 'мск,moskva', '495')")
+    conn.execute("INSERT INTO clients_info (client_id, phone, name) VALUES ('1', '8 916 123-45-67', 'Анна')")
+    conn.commit()
+
+    assert migrate(conn) == [m.version for m in MIGRATIONS]
+    assert {"is_duplicate_city", "created_at", "phone_e164", "change_version"} <= set(columns(conn, "clients_info"))
+    assert {"json_blob", "json_format"} <= set(columns(conn, "jsons"))
+    assert {"department", "content_hash"} <= set(columns(conn, "products"))
+    assert conn.execute("SELECT phone_e164 FROM clients_info").fetchone() == ("+79161234567",)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'regions_map'").fetchone() is None
+    assert conn.execute(
+        "SELECT c.region_code FROM city_aliases AS a JOIN cities_map AS c ON c.city_id = a.city_id "
+        "WHERE a.alias_lower = 'мск'"
+    ).fetchone() == ("msk",)
+    # Триггер региона работает по перенесённым городам
+    conn.execute("INSERT INTO clients_info (client_id, phone, city_name) VALUES ('2', '+79031112233', 'москва')")
+    assert conn.execute("SELECT region_code FROM clients_info WHERE client_id = '2'").fetchone() == ("msk",)
+    # Без первичного ключа JSON звонка находится по отдельному индексу
+    assert "idx_jsons_call_id" in query_plan(conn, "SELECT json_blob FROM jsons WHERE call_id = ?", ("c1",))
+
+
+def test_failed_migration_is_rolled_back():
+    def broken(conn):
+        conn.execute("CREATE TABLE half_done (x)")
+        raise sqlite3.OperationalError("boom")
+
+    conn = sqlite3.connect(":memory:")
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn, MIGRATIONS + [type(MIGRATIONS[0])(99, "broken", broken)])
+    assert current_version(conn) == MIGRATIONS[-1].version
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
@@ -0,0 +1,45 @@
+from src.utils.numbering_plan import collapse_prefixes, range_prefixes, registry_prefixes, subject_districts, write_prefixes
+from src.utils.phone_regions import load_phone_trie, predict_region
+
+# Фрагмент выписки в формате реестра (диапазоны условные)
+REGISTRY = """АВС/ DEF;От;До;Емкость;Оператор;Регион;Территория ГАР;ИНН
+916;0000000;9999999;10000000;ПАО "МТС";г. Москва и Московская область;;7740000076
+912;2000000;2999999;1000000;ПАО "МТС";Свердловская обл.;;7740000076
+912;3000000;3499999;500000;ПАО "МТС";Ямало-Ненецкий АО;;7740000076
+912;3500000;3500999;1000;ПАО "МТС";Томская обл.;;7740000076
+958;0000000;0999999;1000000;ООО "Т2 Мобайл";Российская Федерация;;7743895280
+"""
+
+
+def test_subject_districts():
+    assert subject_districts("г. Москва и Московская область") == {"сentral_fd"}
+    assert subject_districts("Ямало-Ненецкий АО") == {"ural_fd"}
+    assert subject_districts("Томская обл.") == {"siberian_fd"}
+    assert subject_districts("Нижегородская обл.|Новгородская обл.") == {"privolzhsky_fd", "north-western_fd"}
+    assert subject_districts("Российская Федерация") == frozenset()
+
+
+def test_range_prefixes_and_collapse():
+    assert range_prefixes(0, 9999999) == [""]
+    assert range_prefixes(2000000, 2999999) == ["2"]
+    assert range_prefixes(3000000, 3499999) == ["30", "31", "32", "33", "34"]
+    assert range_prefixes(1230, 1249) == ["000123", "000124"]
+    ural = frozenset({"ural_fd"})
+    assert collapse_prefixes({f"9122{d}": ural for d in "0123456789"}) == {"9122": ural}
+
+
+def test_registry_gives_mobile_prediction(tmp_path):
+    registry = tmp_path / "DEF-9xx.csv"
+    registry.write_text(REGISTRY, encoding="cp1251")
+    prefixes = registry_prefixes([str(registry)])
+    assert prefixes["916"] == {"сentral_fd"} and prefixes["9122"] == {"ural_fd"}
+    assert not any(prefix.startswith("958") for prefix in prefixes)
+
+    def_path = tmp_path / "phone_def_prefixes.csv"
+    write_prefixes(prefixes, str(def_path))
+    trie = load_phone_trie(def_path=str(def_path))
+    assert predict_region("+79161234567", trie)["region_codes"] == ["сentral_fd"]
+    assert predict_region("8 912 350 05 00", trie)["region_codes"] == ["siberian_fd"]
+    assert predict_region("+79123123456", trie)["prefix"] == "91231"
+    # Коды ABC из phone_prefixes.csv на месте
+    assert predict_region("83431234567", trie)["region_codes"] == ["ural_fd"]
@@ -0,0 +1,75 @@
+import json
+import sqlite3
+
+import pytest
+
+from src.database.call_json import COMPACT_JSON_FORMAT, encode_call_json
+from src.database.parquet_export import CALLS_CHUNK_SQL, build_chunk, call_detail_row, export_incremental, load_state
+
+DOCUMENT = {
+    "call_id": "c1",
+    "client_data": {"city": "Казань", "region": {"code": "volga_fd", "name": "Приволжский ФО"}, "company": "ООО Ромашка"},
+    "request_details": {"product_service": "мат"},
+    "transcription": [{"speaker": "client", "text": "алло", "timestamp": "10:00:00"}],
+}
+
+
+def add_call(conn, call_id, timestamp, department="Коммерческий отдел"):
+    conn.execute(
+        "INSERT INTO calls (call_id, client_id, timestamp, department, next_step, is_work_time) VALUES (?, '1', ?, ?, 'transfer', 1)",
+        (call_id, timestamp, department),
+    )
+    conn.executemany(
+        "INSERT INTO call_transcripts (call_id, client_id, speaker, text, segment_time) VALUES (?, '1', ?, ?, ?)",
+        [(call_id, "client", "алло", timestamp), (call_id, "bot", "здравствуйте", timestamp)],
+    )
+    conn.execute(
+        "INSERT INTO jsons (call_id, client_id, json_blob, json_format) VALUES (?, '1', ?, ?)",
+        (call_id, encode_call_json({**DOCUMENT, "call_id": call_id}), COMPACT_JSON_FORMAT),
+    )
+    conn.commit()
+
+
+def test_call_detail_row_reads_compact_and_legacy_dumps():
+    compact = call_detail_row("c1", "1", None, encode_call_json(DOCUMENT), COMPACT_JSON_FORMAT)
+    assert compact["region_code"] == "volga_fd" and compact["city"] == "Казань"
+    # Транскрипция ссылкой — число реплик не из дампа
+    assert compact["transcript_turns"] is None
+
+    legacy = {**DOCUMENT, "client_data": {"city": "Москва", "region": "msk"}}
+    row = call_detail_row("c2", "1", json.dumps(legacy, ensure_ascii=False), None, None)
+    assert (row["region_code"], row["region_name"], row["transcript_turns"]) == ("msk", None, 1)
+
+
+def test_build_chunk_groups_rows_by_call_month(db_conn):
+    conn = db_conn
+    add_call(conn, "c1", "2025-04-30T23:59:00")
+    add_call(conn, "c2", "2025-05-01T00:01:00")
+    calls = conn.execute(CALLS_CHUNK_SQL, (0, 10)).fetchall()
+    chunk = build_chunk(conn, calls)
+    assert sorted(chunk["calls"]) == ["2025-04", "2025-05"]
+    assert [row["turn"] for row in chunk["call_transcripts"]["2025-05"]] == [1, 2]
+    assert chunk["call_details"]["2025-04"][0]["transcript_turns"] == 2
+
+
+def test_export_is_incremental_and_dictionary_encoded(db_path, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    ds = pytest.importorskip("pyarrow.dataset")
+    root = str(tmp_path / "parquet")
+    conn = sqlite3.connect(db_path)
+    for i in range(5):
+        add_call(conn, f"c{i}", f"2025-0{4 + i % 2}-10T10:00:00")
+
+    assert export_incremental(db_path, root, chunk_size=2)["calls"] == 5
+    assert export_incremental(db_path, root, chunk_size=2)["calls"] == 0
+    add_call(conn, "c5", "2025-05-11T10:00:00", department="Технический отдел")
+    assert export_incremental(db_path, root, chunk_size=2)["calls"] == 1
+    assert load_state(root)["calls_rowid"] == 6
+
+    calls = ds.dataset(f"{root}/calls", partitioning="hive").to_table()
+    assert calls.num_rows == 6
+    assert str(calls.schema.field("department").type).startswith("dictionary")
+    transcripts = ds.dataset(f"{root}/call_transcripts", partitioning="hive").to_table()
+    assert transcripts.num_rows == 12
+    files = list((tmp_path / "parquet" / "call_details" / "month=2025-05").glob("*.parquet"))
+    assert sum(pq.read_table(str(f)).num_rows for f in files) == 3
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+from datetime import date
+
+from src.database.call_json import COMPACT_JSON_FORMAT, encode_call_json
+from src.database.db_manager import DatabaseManager
+from src.database.partitions import archive_closed_months, closed_months, partition_name
+
+TODAY = date(2025, 6, 15)
+CALLS = [
+    ("c1", "2025-01-10T10:00:00"),
+    ("c2", "2025-03-05T10:00:00"),
+    ("c3", "2025-03-20T10:00:00"),
+    ("c4", "2025-06-01T10:00:00"),
+]
+
+
+def make_db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "clients.db"))
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("INSERT INTO clients_info (client_id, phone, name) VALUES ('1', '+79161234567', 'Анна')")
+    for call_id, timestamp in CALLS:
+        conn.execute(
+            "INSERT INTO calls (call_id, client_id, timestamp, department, request_text) VALUES (?, '1', ?, 'Продажи', ?)",
+            (call_id, timestamp, f"запрос {call_id}"),
+        )
+        conn.executemany(
+            "INSERT INTO call_transcripts (call_id, client_id, speaker, text, segment_time) VALUES (?, '1', ?, ?, ?)",
+            [(call_id, "client", f"алло {call_id}", timestamp), (call_id, "bot", "здравствуйте", timestamp)],
+        )
+        conn.execute(
+            "INSERT INTO jsons (call_id, client_id, timestamp, json_blob, json_format) VALUES (?, '1', ?, ?, ?)",
+            (call_id, timestamp, encode_call_json({"call_id": call_id, "transcription": []}), COMPACT_JSON_FORMAT),
+        )
+    conn.commit()
+    conn.close()
+    return db
+
+
+def count(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_closed_months_are_moved_and_history_stays_readable(tmp_path):
+    db = make_db(tmp_path)
+    conn = sqlite3.connect(db.db_path)
+    assert closed_months(conn, keep_months=3, today=TODAY) == ["2025-01", "2025-03"]
+    conn.close()
+
+    assert archive_closed_months(db.db_path, keep_months=3, batch_size=1, today=TODAY) == {"2025-01": 1, "2025-03": 2}
+    assert count(db.db_path, "calls") == 1 and count(db.db_path, "call_transcripts") == 2
+    march = str(tmp_path / partition_name("2025-03"))
+    assert count(march, "calls") == 2 and count(march, "call_transcripts") == 4 and count(march, "jsons") == 2
+    assert archive_closed_months(db.db_path, keep_months=3, today=TODAY) == {}
+
+    calls = db.get_recent_calls("1", n=3)
+    assert [call["call_id"] for call in calls] == ["c4", "c3", "c2"]
+    assert calls[1]["transcript_excerpt"] == "client: алло c3\nbot: здравствуйте"
+    assert [call["call_id"] for call in db.get_recent_calls("1", n=10)] == ["c4", "c3", "c2", "c1"]
+    assert db.get_call_json("c1") == {"call_id": "c1", "transcription": [
+        {"speaker": "client", "text": "алло c1", "timestamp": "10:00:00"},
+        {"speaker": "bot", "text": "здравствуйте", "timestamp": "10:00:00"},
+    ]}
+    # Архивы отсоединены после запроса
+    attached = [row[1] for row in db.connections.connection().execute("PRAGMA database_list")]
+    assert attached == ["main"]
+
+
+def test_history_attaches_only_the_clients_months(tmp_path):
+    db = make_db(tmp_path)
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("INSERT INTO clients_info (client_id, phone, name) VALUES ('2', '+79031112233', 'Олег')")
+    conn.execute("INSERT INTO calls (call_id, client_id, timestamp) VALUES ('d1', '2', '2025-02-10T10:00:00')")
+    conn.commit()
+    conn.close()
+    archive_closed_months(db.db_path, keep_months=3, today=TODAY)
+    assert db.partitions.months() == ["2025-03", "2025-02", "2025-01"]
+
+    attached = []
+    original = db.partitions.attached
+
+    def recording(conn, month):
+        attached.append(month)
+        return original(conn, month)
+
+    db.partitions.attached = recording
+    assert [call["call_id"] for call in db.get_recent_calls("2", n=3)] == ["d1"]
+    assert attached == ["2025-02"]
+    attached.clear()
+    assert [call["call_id"] for call in db.get_recent_calls("1", n=2)] == ["c4", "c3"]
+    assert attached == ["2025-03"]
+
+
+def test_copy_is_repeated_safely_after_crash_between_steps(tmp_path):
+    db = make_db(tmp_path)
+    path = str(tmp_path / partition_name("2025-01"))
+    archive_closed_months(db.db_path, keep_months=3, today=TODAY)
+    # Имитация сбоя после копии: строки снова в живой базе
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("ATTACH DATABASE ? AS a", (path,))
+    for table in ("calls", "call_transcripts", "jsons"):
+        conn.execute(f"INSERT INTO main.{table} SELECT * FROM a.{table}")
+    conn.commit()
+    conn.execute("DETACH DATABASE a")
+    conn.close()
+
+    assert archive_closed_months(db.db_path, keep_months=3, today=TODAY) == {"2025-01": 1}
+    assert count(path, "calls") == 1 and count(path, "call_transcripts") == 2
+    assert os.path.exists(str(tmp_path / partition_name("2025-03")))
@@ -0,0 +1,39 @@
+import sqlite3
+
+import pytest
+from src.database.phone_keys import migrate_phone_keys
+
+
+def make_conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE clients_info (client_id TEXT PRIMARY KEY, phone TEXT UNIQUE, name TEXT)")
+    conn.executemany(
+        "INSERT INTO clients_info (client_id, phone) VALUES (?, ?)",
+        [("1", "+79161234567"), ("2", "8 (916) 123-45-67"), ("3", "9031112233"), ("4", "доб. 12"), ("5", None)],
+    )
+    return conn
+
+
+def test_migration_backfills_keys_and_keeps_first_duplicate():
+    conn = make_conn()
+    assert migrate_phone_keys(conn) == {"updated": 2, "duplicates": 1, "invalid": 1}
+    keys = dict(conn.execute("SELECT client_id, phone_e164 FROM clients_info"))
+    assert keys == {"1": "+79161234567", "2": None, "3": "+79031112233", "4": None, "5": None}
+
+    # Повторный запуск дозаполняет только новые строки
+    conn.execute("INSERT INTO clients_info (client_id, phone) VALUES ('6', '89990001122')")
+    assert migrate_phone_keys(conn)["updated"] == 1
+
+
+def test_phone_key_is_unique_and_indexed():
+    conn = make_conn()
+    migrate_phone_keys(conn)
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO clients_info (client_id, phone_e164) VALUES ('7', '+79031112233')")
+    plan = " ".join(
+        row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM clients_info WHERE phone_e164 = ?", ("+79161234567",)
+        )
+    )
+    assert "idx_clients_phone_e164" in plan
+
@@ -0,0 +1,51 @@
+from src.utils.city_index import CityIndex, CityResolver
+from src.utils.phone_regions import PhonePrefixTrie, load_phone_trie, phone_digits, predict_region, region_prediction_text
+
+CITIES = [
+    {"city_name": "мирный", "region_code": "north-western_fd", "region_name": "Северо-Западный ФО",
+     "is_duplicate": 1, "aliases": None, "phone_route_code": None},
+    {"city_name": "мирный", "region_code": "eastern_fd", "region_name": "Дальневосточный ФО",
+     "is_duplicate": 1, "aliases": None, "phone_route_code": "41136"},
+    {"city_name": "москва", "region_code": "сentral_fd", "region_name": "Центральный ФО",
+     "is_duplicate": 0, "aliases": None, "phone_route_code": ""},
+]
+
+
+def test_phone_digits_formats():
+    assert phone_digits("8 (343) 123-45-67") == "3431234567"
+    assert phone_digits("+7 912 123 45 67") == "9121234567"
+    assert phone_digits("3431234567") == "3431234567"
+    assert phone_digits("12345") is None
+
+
+def test_longest_prefix_wins():
+    trie = PhonePrefixTrie()
+    trie.insert("411", "eastern_fd")
+    trie.insert("495", "сentral_fd")
+    assert trie.add_route_codes(CITIES) == 1
+
+    assert predict_region("84951234567", trie)["region_codes"] == ["сentral_fd"]
+    prediction = predict_region("+7 (41136) 2-34-56", trie)
+    assert prediction == {"prefix": "41136", "region_codes": ["eastern_fd"], "phone": "+74113623456"}
+    assert predict_region("+79001234567", trie) is None
+
+
+def test_default_prefix_file_loads():
+    trie = PhonePrefixTrie.from_csv()
+    assert predict_region("83431234567", trie)["region_codes"] == ["ural_fd"]
+    text = region_prediction_text(predict_region("88121234567", trie), {"north-western_fd": "Северо-Западный ФО"})
+    assert "Северо-Западный ФО" in text and "812" in text
+
+
+def test_default_def_file_resolves_mobile_numbers():
+    trie = load_phone_trie()
+    assert predict_region("+7 916 123-45-67", trie)["region_codes"] == ["сentral_fd"]
+    assert sorted(predict_region("89281234567", trie)["region_codes"]) == ["north-caucasian_fd", "southern_fd"]
+
+
+def test_region_hint_breaks_duplicate_tie():
+    resolver = CityResolver(CityIndex(CITIES))
+    assert resolver.resolve_city("мирный")["region_code"] == "north-western_fd"
+    assert resolver.resolve_city("из мирного", region_hint=["eastern_fd"])["region_code"] == "eastern_fd"
+    # Подсказка не влияет на города без дублей
+    assert resolver.resolve_city("москва", region_hint=["eastern_fd"])["region_code"] == "сentral_fd"
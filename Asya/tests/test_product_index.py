@@ -0,0 +1,63 @@
+import time
+
+from src.utils.product_index import ProductIndex
+
+PRODUCTS = [
+    {"product_id": 1, "official_name": "Мат прошивной базальтовый МПБ", "slang_name": "маты,прошивной мат",
+     "is_archived": False, "weight_priority": 1},
+    {"product_id": 2, "official_name": "Шнур базальтовый теплоизоляционный ШБТ", "slang_name": "шнур",
+     "is_archived": 0, "weight_priority": 5},
+    {"product_id": 3, "official_name": "Минеральная вата", "slang_name": "вата,минвата",
+     "is_archived": True, "weight_priority": 100},
+    {"product_id": 4, "official_name": "Огнезащитная мастика", "slang_name": float("nan"),
+     "is_archived": None, "weight_priority": None},
+]
+
+
+def ids(rows):
+    return [row["product_id"] for row in rows]
+
+
+def test_archived_products_are_not_indexed():
+    index = ProductIndex(PRODUCTS)
+    assert len(index) == 3
+    assert index.search("минвата") == []
+
+
+def test_search_by_slang_typo_and_phrase():
+    index = ProductIndex(PRODUCTS)
+    assert ids(index.search("маты")) == [1]
+    assert ids(index.search("огнезащитная мастека")) == [4]
+    # Название внутри фразы клиента
+    assert ids(index.search("Сколько стоит прошивной мат?")) == [1]
+    assert index.search("") == [] and index.search(None) == []
+
+
+def test_short_slang_matches_whole_words_only():
+    index = ProductIndex(PRODUCTS)
+    assert ids(index.search("нужны маты")) == [1]
+    for query in ("нужен автоматический выключатель", "какой материал лучше", "математика", "нужен матрас"):
+        assert all(score < 100 for _, score in index.search_scored(query)), query
+
+
+def test_ranking_by_weight_priority():
+    index = ProductIndex(PRODUCTS)
+    # Оба товара "базальтовые": выше тот, у кого больше weight_priority
+    rows = index.search("базальтовый")
+    assert ids(rows) == [2, 1]
+    assert ids(index.search("базальтовый", top_k=1)) == [2]
+
+
+def test_large_catalog_is_fast():
+    rows = [
+        {"product_id": i, "official_name": f"изделие {i} модель {i % 97}", "slang_name": f"товар{i}",
+         "weight_priority": i % 7}
+        for i in range(5000)
+    ] + PRODUCTS
+    index = ProductIndex(rows)
+    assert ids(index.search("прошивной мат")) == [1]
+
+    start = time.perf_counter()
+    for _ in range(100):
+        index.search("сколько стоит прошивной мат")
+    assert (time.perf_counter() - start) / 100 < 0.005
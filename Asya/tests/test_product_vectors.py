@@ -0,0 +1,38 @@
+import numpy as np
+
+from src.utils.product_vectors import ProductVectorIndex, load_or_build, vector_text
+
+PRODUCTS = [
+    {"product_id": 1, "official_name": "Шнур базальтовый теплоизоляционный ШБТ-50", "slang_name": "шнур"},
+    {"product_id": 2, "official_name": "Мат базальтовый прошивной ОБМ-50", "slang_name": "маты"},
+    {"product_id": 3, "official_name": "Огнезащитная краска EXPERT FIRE-M", "slang_name": None},
+    {"product_id": 4, "official_name": "Минеральная вата", "slang_name": "минвата", "is_archived": True},
+]
+
+
+def test_vector_text_transliterates_and_compacts():
+    assert vector_text("EXPERT FIRE-M") == "експертфирем"
+    assert vector_text("Ш Б Т - 50") == vector_text("ШБТ-50") == "шбт50"
+
+
+def test_search_survives_asr_errors():
+    index = ProductVectorIndex.build(PRODUCTS).attach_rows(PRODUCTS)
+    assert [r["product_id"] for r in index.search("ш б т 50", top_k=1)] == [1]
+    assert index.search("эксперт файр м", top_k=1)[0]["product_id"] == 3
+    # Архивные товары в индекс не попадают, посторонняя фраза ничего не находит
+    assert all(r["product_id"] != 4 for r in index.search("минвата"))
+    assert index.search("добрый день, соедините с бухгалтерией") == []
+
+
+def test_save_and_mmap_load(tmp_path):
+    path = str(tmp_path / "product_vectors.npz")
+    built = ProductVectorIndex.build(PRODUCTS)
+    built.save(path)
+
+    loaded = ProductVectorIndex.load(path)
+    assert isinstance(loaded.weights, np.memmap) and isinstance(loaded.vocab, np.memmap)
+    assert loaded.search_ids("обм 50") == built.search_ids("обм 50")
+
+    # Без файла индекс строится в памяти
+    fallback = load_or_build(str(tmp_path / "missing.npz"), PRODUCTS)
+    assert fallback.search("маты", top_k=1)[0]["product_id"] == 2
@@ -1,88 +1,26 @@
+import os
 import sqlite3
+import sys
+
+# Общие модули пакета Asya (src.*) лежат в соседней папке Asya/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Asya"))
+from src.database.city_aliases import install_region_triggers, rebuild_city_aliases
 
 def update_trigger_safe():
+    conn = None
     try:
         conn = sqlite3.connect('clients.db')
-        cursor = conn.cursor()
-        
-        # Удаляем старый триггер
-        cursor.execute("DROP TRIGGER IF EXISTS update_region_from_city")
-        cursor.execute("DROP TRIGGER IF EXISTS update_region_on_update")
-        
-        # Создаём новый триггер с проверкой на JSON
-        cursor.execute('''
-            CREATE TRIGGER update_region_from_city
-            AFTER INSERT ON clients_info
-            FOR EACH ROW
-            WHEN NEW.city_name IS NOT NULL AND NEW.city_name != ''
-            BEGIN
-                UPDATE clients_info 
-                SET region_code = (
-                    SELECT region_code FROM cities_map 
-                    WHERE LOWER(NEW.city_name) = LOWER(city_name)
-                       OR (
-                           json_valid(aliases) 
-                           AND EXISTS (
-                               SELECT 1 FROM json_each(aliases) 
-                               WHERE LOWER(value) = LOWER(NEW.city_name)
-                           )
-                       )
-                    LIMIT 1
-                ),
-                region_name = (
-                    SELECT region_name FROM cities_map 
-                    WHERE LOWER(NEW.city_name) = LOWER(city_name)
-                       OR (
-                           json_valid(aliases) 
-                           AND EXISTS (
-                               SELECT 1 FROM json_each(aliases) 
-                               WHERE LOWER(value) = LOWER(NEW.city_name)
-                           )
-                       )
-                    LIMIT 1
-                )
-                WHERE client_id = NEW.client_id;
-            END;
-        ''')
-        
-        # Аналогично для UPDATE
-        cursor.execute('''
-            CREATE TRIGGER update_region_on_update
-            AFTER UPDATE OF city_name ON clients_info
-            FOR EACH ROW
-            WHEN NEW.city_name IS NOT NULL AND NEW.city_name != ''
-            BEGIN
-                UPDATE clients_info 
-                SET region_code = (
-                    SELECT region_code FROM cities_map 
-                    WHERE LOWER(NEW.city_name) = LOWER(city_name)
-                       OR (
-                           json_valid(aliases) 
-                           AND EXISTS (
-                               SELECT 1 FROM json_each(aliases) 
-                               WHERE LOWER(value) = LOWER(NEW.city_name)
-                           )
-                       )
-                    LIMIT 1
-                ),
-                region_name = (
-                    SELECT region_name FROM cities_map 
-                    WHERE LOWER(NEW.city_name) = LOWER(city_name)
-                       OR (
-                           json_valid(aliases) 
-                           AND EXISTS (
-                               SELECT 1 FROM json_each(aliases) 
-                               WHERE LOWER(value) = LOWER(NEW.city_name)
-                           )
-                       )
-                    LIMIT 1
-                )
-                WHERE client_id = NEW.client_id;
-            END;
-        ''')
-        
+
+        # Таблица алиасов: один поиск по первичному ключу вместо
+        # LOWER() по всей cities_map и json_each по алиасам
+        aliases_count = rebuild_city_aliases(conn)
+
+        # Пересоздаём триггеры: регион ищется через city_aliases,
+        # оба поля берутся из одной найденной строки cities_map
+        install_region_triggers(conn)
+
         conn.commit()
-        print("✅ Триггеры обновлены: теперь безопасно работают с JSON")
+        print(f"✅ Триггеры обновлены: регион ищется через city_aliases ({aliases_count} алиасов)")
         
     except sqlite3.Error as e:
         print(f"❌ Ошибка: {e}")
@@ -91,4 +29,4 @@ def update_trigger_safe():
             conn.close()
 
 if __name__ == "__main__":
-    update_trigger_safe()
\ No newline at end of file
+    update_trigger_safe()
@@ -0,0 +1,135 @@
+"""
+Массовое заполнение region_code / region_name в Clients_info по city_name.
+
+Клиенты, сохранённые с комментарием "Регион клиента не добавлен", получают
+регион пакетно: таблица читается чанками по rowid, чанки разбираются
+пулом процессов (CityIndex.lookup_many — матрица cdist по всем названиям
+и алиасам), результаты пишутся через executemany большими транзакциями.
+"""
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Общие модули пакета Asya (src.utils.*) лежат в соседней папке Asya/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Asya"))
+from src.utils.city_index import CityIndex
+
+DB_NAME = "clients.db"
+CHUNK_SIZE = 5000          # клиентов в одном чанке для воркера
+ROWS_PER_COMMIT = 50000    # обновлённых строк в одной транзакции
+REGION_COMMENT = "Регион клиента не добавлен."
+
+# Индекс городов внутри процесса-воркера (строится один раз в initializer)
+_worker_index = None
+
+
+def _init_worker(city_rows):
+    global _worker_index
+    _worker_index = CityIndex(city_rows)
+
+
+def _resolve_chunk(chunk):
+    """Возвращает параметры UPDATE для клиентов чанка, у которых нашёлся город."""
+    matches = _worker_index.lookup_many([city for _, city in chunk])
+    return [
+        (row["region_code"], row["region_name"], rowid)
+        for (rowid, _), (row, _) in zip(chunk, matches)
+        if row is not None
+    ]
+
+
+def _iter_chunks(conn, chunk_size):
+    """Клиенты без региона, постранично по rowid (без OFFSET и без долгого курсора)."""
+    last_rowid = 0
+    while True:
+        chunk = conn.execute('''
+            SELECT rowid, city_name FROM Clients_info
+            WHERE rowid > ?
+              AND city_name IS NOT NULL AND city_name != ''
+              AND (region_code IS NULL OR region_code = '' OR region_name IS NULL OR region_name = '')
+            ORDER BY rowid
+            LIMIT ?
+        ''', (last_rowid, chunk_size)).fetchall()
+        if not chunk:
+            return
+        last_rowid = chunk[-1][0]
+        yield chunk
+
+
+def _load_city_rows(conn):
+    cursor = conn.execute("SELECT * FROM cities_map ORDER BY city_id")
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def backfill_regions(db_path=DB_NAME, chunk_size=CHUNK_SIZE, workers=None):
+    """
+    Заполняет регионы у всех клиентов, где указан город, но нет региона.
+
+    Args:
+        db_path: Путь к clients.db.
+        chunk_size: Размер чанка для одного воркера.
+        workers: Число процессов (по умолчанию — число ядер).
+
+    Returns:
+        int: Сколько клиентов получили регион.
+    """
+    conn = None
+    started = time.perf_counter()
+    updated = 0
+    try:
+        conn = sqlite3.connect(db_path)
+        city_rows = _load_city_rows(conn)
+        print(f"Загружено {len(city_rows)} городов из cities_map")
+
+        update_sql = '''
+            UPDATE Clients_info
+            SET region_code = ?, region_name = ?,
+                comment = NULLIF(TRIM(REPLACE(comment, ?, '')), '')
+            WHERE rowid = ?
+        '''
+        batch = []
+
+        def flush():
+            nonlocal batch, updated
+            if batch:
+                conn.executemany(update_sql, batch)
+                conn.commit()
+                updated += len(batch)
+                batch = []
+
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(city_rows,)) as pool:
+            # Не держим в памяти больше пары чанков на воркер
+            max_in_flight = 2 * workers
+            in_flight = set()
+            for chunk in _iter_chunks(conn, chunk_size):
+                in_flight.add(pool.submit(_resolve_chunk, chunk))
+                if len(in_flight) < max_in_flight:
+                    continue
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch.extend((code, name, REGION_COMMENT, rowid) for code, name, rowid in future.result())
+                if len(batch) >= ROWS_PER_COMMIT:
+                    flush()
+            for future in in_flight:
+                batch.extend((code, name, REGION_COMMENT, rowid) for code, name, rowid in future.result())
+            flush()
+
+        print(f"✅ Регион заполнен у {updated} клиентов за {time.perf_counter() - started:.1f} с")
+        return updated
+
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка SQLite: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    backfill_regions(sys.argv[1] if len(sys.argv) > 1 else DB_NAME)
@@ -1,5 +1,11 @@
 import csv
+import os
 import sqlite3
+import sys
+
+# Общие модули пакета Asya (src.*) лежат в соседней папке Asya/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Asya"))
+from src.database.city_aliases import rebuild_city_aliases
 
 def load_cities_from_csv(csv_file_path):
     conn = None  # ← ВАЖНО: объявляем заранее
@@ -57,9 +63,12 @@ def load_cities_from_csv(csv_file_path):
                     phone_route_code
                 ))
                 cities_added += 1
+
+            # Алиасы для триггеров региона — в той же транзакции
+            aliases_count = rebuild_city_aliases(conn)
                 
         conn.commit()
-        print(f"Успешно загружено {cities_added} городов из файла {csv_file_path}")
+        print(f"Успешно загружено {cities_added} городов и {aliases_count} алиасов из файла {csv_file_path}")
         
     except FileNotFoundError:
         print(f"Файл {csv_file_path} не найден")
@@ -9,6 +9,12 @@ import logging
 import uuid
 import sqlite3 # type: ignore
 import os
+import sys
+
+# Общие модули пакета Asya (src.utils.*) лежат в соседней папке Asya/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Asya"))
+from src.utils.city_index import CityIndex
+from src.utils.product_index import ProductIndex
 
 # --- Настройка логирования в файл ---
 sys_logger = logging.getLogger('system_logger')
@@ -293,7 +299,7 @@ FULL_PROMPT = """
 13. Избегай формальных конструкций вроде "Переходим к этапу..."
 14. Для голосового общения используй короткие, четкие предложения
 15. Не используй сокращения, которые могут быть неправильно прочитаны системой синтеза речи
-""""""
+"""
 
 
 # --- Константы ---
@@ -303,6 +309,8 @@ DB_NAME = "clients.db"
 df_clients = None
 df_regions = None
 df_products = None
+product_index = None # Индекс товаров, строится из df_products в load_data_from_db
+city_index = None # Индекс городов, строится из df_regions в load_data_from_db
 
 # --- Функции для работы с базой данных ---
 def get_db_connection():
@@ -316,7 +324,7 @@ def get_db_connection():
 
 def load_data_from_db():
     """Загружает данные из таблиц базы данных в глобальные pandas DataFrame."""
-    global df_clients, df_regions, df_products
+    global df_clients, df_regions, df_products, city_index, product_index
     try:
         conn = get_db_connection()
         df_clients = pd.read_sql_query("SELECT * FROM Clients_info", conn)
@@ -330,6 +338,9 @@ def load_data_from_db():
         if 'product_id' in df_products.columns:
              df_products['product_id'] = pd.to_numeric(df_products['product_id'], errors='coerce')
 
+        city_index = CityIndex.from_dataframe(df_regions)
+        product_index = ProductIndex.from_dataframe(df_products)
+
         conn.close()
         sys_logger.info("Данные успешно загружены из базы данных.")
         print("[Система] Данные загружены из базы данных.")
@@ -340,48 +351,17 @@ def load_data_from_db():
 
 # --- Функции поиска и обработки данных ---
 def search_product(query):
-    """Ищет информацию о продукте в таблице products"""
-    global df_products
-    if df_products is None or df_products.empty:
+    """Ищет информацию о продукте в таблице products (по индексу товаров, без полного перебора)"""
+    if product_index is None:
         return None
-    clean_query = query.lower().strip()
-    matches = []
-    for _, row in df_products.iterrows():
-        if not pd.isna(row["official_name"]):
-            official_name = str(row["official_name"]).lower()
-            if clean_query in official_name or fuzz.ratio(clean_query, official_name) > 70:
-                matches.append(row)
-                continue
-        if not pd.isna(row["slang_name"]):
-            slang_names = str(row["slang_name"]).lower().split(',')
-            for slang in slang_names:
-                if clean_query in slang.strip() or fuzz.ratio(clean_query, slang.strip()) > 70:
-                    matches.append(row)
-                    break
-    return matches
+    return product_index.search(query)
 
 def get_region(city):
     """Определяет регион по названию города с учетом aliases"""
     if not city or pd.isna(city) or city == "Нет данных":
         return {"code": "Не определено", "name": "Не определено"}
-    best_match = None
-    best_score = 0
-    for _, row in df_regions.iterrows():
-        ref_city = str(row["city_name"]).strip().lower()
-        current_city = str(city).strip().lower()
-        score = fuzz.ratio(current_city, ref_city)
-        if score > best_score:
-            best_score = score
-            best_match = row
-        if not pd.isna(row.get("aliases")):
-            aliases = str(row["aliases"]).lower().split(',')
-            for alias in aliases:
-                alias = alias.strip()
-                score = fuzz.ratio(current_city, alias)
-                if score > best_score:
-                    best_score = score
-                    best_match = row
-    if best_score > 70 and best_match is not None:
+    best_match, best_score = city_index.lookup(city)
+    if best_match is not None:
          return {"code": best_match.get("region_code", "Не определено"), "name": best_match.get("region_name", "Не определено")}
     else:
          return {"code": "Не определено", "name": "Не определено"}
@@ -403,23 +383,8 @@ def normalize_city_name(city_input):
         if match:
             city_input = match.group(1).strip()
             break
-    best_match = None
-    best_score = 0
-    for _, row in df_regions.iterrows():
-        ref_city = str(row["city_name"]).strip().lower()
-        score = fuzz.ratio(city_input, ref_city)
-        if score > best_score:
-            best_score = score
-            best_match = row["city_name"]
-        if not pd.isna(row.get("aliases")):
-            aliases = str(row["aliases"]).lower().split(',')
-            for alias in aliases:
-                alias = alias.strip()
-                score = fuzz.ratio(city_input, alias)
-                if score > best_score:
-                    best_score = score
-                    best_match = row["city_name"]
-    final_result = best_match if best_score > 70 else city_input.capitalize()
+    best_match, best_score = city_index.lookup(city_input)
+    final_result = best_match["city_name"] if best_match is not None else city_input.capitalize()
     sys_logger.info(f"Нормализация города: '{city_input}' -> '{final_result}' (score: {best_score})")
     return final_result
 
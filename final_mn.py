@@ -5,6 +5,14 @@ from thefuzz import fuzz
 import json
 import re
 import time
+import os
+import sys
+
+# Общие модули пакета Asya (src.utils.*) лежат в соседней папке Asya/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Asya"))
+from src.utils.city_index import CityIndex
+from src.utils.product_index import ProductIndex
+from src.utils.intent_detector import ensure_intent_detector
 
 # Определение промпта
 FULL_PROMPT = """
@@ -232,39 +240,39 @@ df_clients = pd.read_excel("Clients.xlsx", sheet_name="Clients_info")
 df_regions = pd.read_excel("Clients.xlsx", sheet_name="Regions_map")
 # Таблица с информацией о продуктах
 df_products = pd.read_excel("Clients.xlsx", sheet_name="products")
+# Индекс городов для get_region / normalize_city_name
+city_index = CityIndex.from_dataframe(df_regions, name_field="Город")
+# Индекс товаров для search_product (архивные товары в него не попадают)
+product_index = ProductIndex.from_dataframe(df_products)
+# Детектор упоминаний товаров, отделов и городов для check_for_product_question
+intent_detector = ensure_intent_detector(df_products.to_dict("records"), city_index)
+# Время изменения Clients.xlsx, по которому загружены товары (см. refresh_products)
+products_mtime = os.path.getmtime("Clients.xlsx")
+
+def refresh_products():
+    """
+    Перечитывает лист products, если Clients.xlsx изменился с прошлой загрузки.
+    Вызывается на каждую реплику: проверка — один stat файла; детектор
+    перестраивается, только если изменились названия товаров (отпечаток каталога).
+    """
+    global df_products, product_index, intent_detector, products_mtime
+    try:
+        mtime = os.path.getmtime("Clients.xlsx")
+    except OSError:
+        return
+    if mtime == products_mtime:
+        return
+    products_mtime = mtime
+    df_products = pd.read_excel("Clients.xlsx", sheet_name="products")
+    product_index = ProductIndex.from_dataframe(df_products)
+    intent_detector = ensure_intent_detector(df_products.to_dict("records"), city_index)
 
 # Функция для поиска продукта в таблице products
 def search_product(query):
-    """Ищет информацию о продукте в таблице products"""
-    global df_products
-    
-    if df_products is None or df_products.empty:
+    """Ищет информацию о продукте в таблице products (по индексу товаров, без полного перебора)"""
+    if product_index is None:
         return None
-    
-    # Очищаем запрос
-    clean_query = query.lower().strip()
-    
-    # Ищем совпадения в официальных названиях и сленговых названиях
-    matches = []
-    
-    for _, row in df_products.iterrows():
-        # Проверяем официальное название
-        if not pd.isna(row["official_name"]):
-            official_name = str(row["official_name"]).lower()
-            if clean_query in official_name or fuzz.ratio(clean_query, official_name) > 70:
-                matches.append(row)
-                continue
-        
-        # Проверяем сленговое название
-        if not pd.isna(row["slang_name"]):
-            slang_names = str(row["slang_name"]).lower().split(',')
-            for slang in slang_names:
-                if clean_query in slang.strip() or fuzz.ratio(clean_query, slang.strip()) > 70:
-                    matches.append(row)
-                    break
-    
-    # Возвращаем все найденные совпадения после завершения цикла
-    return matches 
+    return product_index.search(query)
 
 # Функция для определения региона по городу (fuzzy-поиск)
 def get_region(city):
@@ -272,31 +280,8 @@ def get_region(city):
     if not city or pd.isna(city) or city == "Нет данных":
         return "Не определено"
         
-    best_match = None
-    best_score = 0
-    
-    for _, row in df_regions.iterrows():
-        # Проверяем основное название города
-        ref_city = str(row["Город"]).strip().lower()
-        current_city = str(city).strip().lower()
-        score = fuzz.ratio(current_city, ref_city)
-        
-        if score > best_score:
-            best_score = score
-            best_match = row["client_region"]
-        
-        # Проверяем aliases, если они есть
-        if not pd.isna(row.get("aliases")):
-            aliases = str(row["aliases"]).lower().split(',')
-            for alias in aliases:
-                alias = alias.strip()
-                score = fuzz.ratio(current_city, alias)
-                if score > best_score:
-                    best_score = score
-                    best_match = row["client_region"]
-    
-    # Порог схожести (можно настроить)
-    return best_match if best_score > 70 else "Не определено"
+    best_match, best_score = city_index.lookup(city)
+    return best_match["client_region"] if best_match is not None else "Не определено"
 
 # Функция для нормализации названия города
 def normalize_city_name(city_input):
@@ -319,30 +304,10 @@ def normalize_city_name(city_input):
             city_input = match.group(1)
             break
     
-    best_match = None
-    best_score = 0
-    
-    for _, row in df_regions.iterrows():
-        # Проверяем основное название города
-        ref_city = str(row["Город"]).strip().lower()
-        score = fuzz.ratio(city_input, ref_city)
-        
-        if score > best_score:
-            best_score = score
-            best_match = row["Город"]
-        
-        # Проверяем aliases, если они есть
-        if not pd.isna(row.get("aliases")):
-            aliases = str(row["aliases"]).lower().split(',')
-            for alias in aliases:
-                alias = alias.strip()
-                score = fuzz.ratio(city_input, alias)
-                if score > best_score:
-                    best_score = score
-                    best_match = row["Город"]
+    best_match, best_score = city_index.lookup(city_input)
     
     # Если нашли хорошее совпадение, возвращаем нормализованное название
-    return best_match if best_score > 70 else city_input.capitalize()
+    return best_match["Город"] if best_match is not None else city_input.capitalize()
 
 # Функция для поиска клиента по номеру телефона
 def find_client_by_phone(phone):
@@ -514,7 +479,7 @@ def get_agent_response(history, profile=None, product_info=None):
 
 def save_to_excel(profile):
     """Сохраняет профиль в Excel"""
-    global df_clients, df_regions, df_products
+    global df_clients, df_regions, df_products, products_mtime
     
     # Определяем регион, если город указан и регион не был загружен из базы
     if profile.get("Город") and not profile.get("client_region"):
@@ -533,32 +498,21 @@ def save_to_excel(profile):
         df_clients.to_excel(writer, sheet_name="Clients_info", index=False)
         df_regions.to_excel(writer, sheet_name="Regions_map", index=False)
         df_products.to_excel(writer, sheet_name="products", index=False)
+    # Свою запись не считаем изменением каталога
+    products_mtime = os.path.getmtime("Clients.xlsx")
 
 def check_for_product_question(user_input):
     """Проверяет, содержит ли ввод пользователя вопрос о продукте"""
-    product_keywords = [
-        'мат', 'маты', 'вата', 'утеплитель', 'изоляция', 'изолятор', 
-        'минвата', 'минеральная вата', 'прошивной', 'базальтовый', 
-        'теплоизоляция', 'звукоизоляция', 'огнезащита'
-    ]
-    
-    question_patterns = [
-        r'что такое', r'расскажи', r'информация', r'характеристики',
-        r'сколько стоит', r'цена', r'наличие', r'есть ли', r'продаете'
-    ]
-    
-    user_input_lower = user_input.lower()
-    
-    # Проверяем наличие ключевых слов о продуктах
-    has_product = any(keyword in user_input_lower for keyword in product_keywords)
-    
-    # Проверяем наличие вопросительных паттернов
-    has_question = any(re.search(pattern, user_input_lower) for pattern in question_patterns) or '?' in user_input
+    # Каталог мог измениться с прошлой реплики
+    refresh_products()
+    # Один проход детектора вместо перебора ключевых слов и шаблонов
+    has_product, product_matches = intent_detector.products(user_input)
     
-    # Если есть и упоминание продукта, и вопросительный контекст - это вопрос о продукте
+    # Если есть упоминание продукта - ищем его в базе
     if has_product:
-        # Ищем продукт в базе
-        product_matches = search_product(user_input_lower)
+        # Названный товар уже найден детектором; для общих слов ("вата") - поиск по индексу
+        if not product_matches:
+            product_matches = search_product(user_input.lower())
         if product_matches:
             return True, product_matches
     
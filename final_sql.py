@@ -1,3 +1,4 @@
+import asyncio
 import requests
 import pandas as pd
 from datetime import datetime
@@ -9,6 +10,25 @@ import logging
 import uuid
 import sqlite3 # Импортируем sqlite3
 import os # Для проверки существования файла БД
+import atexit
+import sys
+
+# Общие модули пакета Asya (src.utils.*) лежат в соседней папке Asya/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Asya"))
+from src.utils.city_index import CityIndex, extract_city_phrase, get_city_resolver, resolve_city, set_city_index
+from src.utils.product_index import ProductIndex
+from src.utils import product_vectors
+from src.utils.phone_regions import load_phone_trie, region_prediction_text
+from src.database.cities_loader import CitiesReloader
+from src.database.phone_keys import migrate_phone_keys
+from src.database.migrations import migrate
+from src.database.call_archive import CallArchive
+from src.database.call_json import COMPACT_JSON_FORMAT, encode_call_json
+from src.database.client_repository import ClientRepository, mark_client_changed
+from src.database.connection import get_connection_manager
+from src.utils.validation import normalize_phone
+from src.asya_core.knowledge_base import KnowledgeBase, kb_system_message
+from src.asya_core.caller_prefetch import CallerPrefetcher
 
 # --- Настройка логирования в файл ---
 sys_logger = logging.getLogger('system_logger')
@@ -23,34 +43,13 @@ sys_logger.addHandler(handler)
 def normalize_phone_number(phone_str):
     """
     Нормализует строку с номером телефона в формат +7XXXXXXXXXX.
+    Тот же нормализатор, что заполняет Clients_info.phone_e164 (validation.normalize_phone).
     Args:
         phone_str (str): Входная строка с номером телефона.
     Returns:
         str: Нормализованный номер телефона или None, если нормализация не удалась.
     """
-    if not phone_str:
-        return None
-    # Оставляем только цифры
-    digits = re.sub(r'\D', '', phone_str)
-    if not digits:
-        return None
-
-    # Российский номер: 11 цифр, начинается с 7 или 8
-    # Или 10 цифр, начинается с 9
-    if len(digits) == 11 and digits[0] in ('7', '8'):
-        # Заменяем 8 на 7 в начале
-        return "+7" + digits[1:]
-    elif len(digits) == 10 and digits[0] == '9':
-        # Добавляем +7 в начало
-        return "+7" + digits
-    else:
-        # Номер не соответствует ожидаемым форматам
-        # Можно вернуть как есть, но лучше залогировать предупреждение
-        # Для простоты вернем None или можно вернуть digits как есть
-        # sys_logger.warning(f"Номер телефона не соответствует стандартному формату РФ: {phone_str}")
-        # return None # Или "+7" + digits[-10:] если уверены, что последние 10 цифр правильные
-        # Лучше вернуть None, чтобы не записывать некорректные данные
-        return None
+    return normalize_phone(phone_str)
 
 # --- Определение промпта ---
 # ВСТАВЬТЕ СЮДА ВАШ FULL_PROMPT
@@ -339,43 +338,75 @@ FULL_PROMPT = """
 13. Избегай формальных конструкций вроде "Переходим к этапу..."
 14. Для голосового общения используй короткие, четкие предложения
 15. Не используй сокращения, которые могут быть неправильно прочитаны системой синтеза речи
-""""""
+"""
 
 # --- Константы ---
 DB_NAME = "clients.db" # Имя файла базы данных SQLite
 
 # --- Глобальные переменные для данных (будут заполнены из БД) ---
-df_clients = None
+client_repository = None # Клиенты в памяти: поиск по client_id и номеру, обновление по записи
 df_regions = None
 df_products = None
+product_index = None # Индекс товаров, строится из df_products в load_data_from_db
+knowledge_base = None # BM25 по каталогу продукции, строится в load_knowledge_base
+product_vector_index = None # Векторный поиск товаров (n-граммы), устойчивый к ошибкам распознавания
+# Векторный индекс выпускает компилятор каталога (из папки Asya): python -m src.database.catalog_compiler ../products.txt ../clients.db
+PRODUCT_VECTORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Asya", "data", "product_vectors.npz")
+# Архив JSON-дампов звонков: сегменты *.jsonl с индексом по call_id вместо файла call_data_<call_id>.json на звонок.
+# Старые файлы упаковываются один раз (из папки Asya): python -m src.database.call_archive pack ../call_archive ../call_data_*.json --remove
+CALL_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "call_archive")
+call_archive = None # Открывается при первом сохранении звонка, закрывается (с fsync) при выходе
 
 # --- Функции для работы с базой данных ---
+# Адаптер и конвертер для UUID регистрируются один раз при импорте
+sqlite3.register_adapter(uuid.UUID, lambda u: str(u))
+sqlite3.register_converter("UUID", lambda s: uuid.UUID(s.decode('utf-8')) if s else None)
+
+def get_call_archive():
+    """Архив звонков процесса (открывается один раз, fsync хвоста — при выходе)."""
+    global call_archive
+    if call_archive is None:
+        call_archive = CallArchive(CALL_ARCHIVE_DIR)
+        atexit.register(call_archive.close)
+    return call_archive
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
-    # Регистрируем адаптер и конвертер для UUID
-    sqlite3.register_adapter(uuid.UUID, lambda u: str(u))
-    sqlite3.register_converter("UUID", lambda s: uuid.UUID(s.decode('utf-8')) if s else None)
-    return conn
+    """Долгоживущее соединение текущего потока (WAL, общий кэш запросов). Закрывать не нужно."""
+    return get_connection_manager(DB_NAME).connection()
 
 def load_data_from_db():
-    global df_clients, df_regions, df_products
+    global client_repository, df_regions, df_products, product_index, product_vector_index
     try:
         conn = get_db_connection()
+        # Схема базы — текущей версии (колонки, cities_map, индексы горячих запросов)
+        migrate(conn)
+        # Канонический ключ телефона для строк, записанных без него
+        migrate_phone_keys(conn)
+        conn.commit()
         # Загружаем таблицы в DataFrame
         # Используем converters для UUID, если они есть в БД как BLOB/TEXT
-        df_clients = pd.read_sql_query("SELECT * FROM Clients_info", conn)
+        # Клиенты читаются целиком только при старте; дальше — apply_committed / refresh
+        client_repository = ClientRepository.load(conn)
         df_regions = pd.read_sql_query("SELECT * FROM cities_map", conn)
         df_products = pd.read_sql_query("SELECT * FROM products", conn)
         
         # Преобразуем client_id в UUID, если он строковый
-        if 'client_id' in df_clients.columns:
-             df_clients['client_id'] = df_clients['client_id'].apply(lambda x: uuid.UUID(x) if isinstance(x, str) and x else x)
         if 'city_id' in df_regions.columns:
              df_regions['city_id'] = pd.to_numeric(df_regions['city_id'], errors='coerce') # SERIAL -> int
         if 'product_id' in df_products.columns:
              df_products['product_id'] = pd.to_numeric(df_products['product_id'], errors='coerce') # SERIAL -> int
 
-        conn.close()
+        # Индекс городов для resolve_city (кэш прошлых запросов сбрасывается)
+        set_city_index(CityIndex.from_dataframe(df_regions))
+        # Индекс товаров для search_product (архивные товары в него не попадают)
+        product_index = ProductIndex.from_dataframe(df_products)
+        product_vector_index = product_vectors.load_or_build(
+            PRODUCT_VECTORS_PATH if os.path.exists(PRODUCT_VECTORS_PATH) else None,
+            df_products.to_dict("records"),
+        )
+        # Префиксы номеров (файл кодов + phone_route_code) для прогноза региона по номеру
+        load_phone_trie(cities=df_regions.to_dict("records"))
+
         sys_logger.info("Данные успешно загружены из базы данных.")
         print("[Система] Данные загружены из базы данных.")
     except Exception as e:
@@ -383,122 +414,104 @@ def load_data_from_db():
         print(f"[Система] Ошибка при загрузке данных из базы данных: {e}")
         raise
 
+def load_knowledge_base():
+    """Строит базу знаний по products_kb.md; без неё диалог работает, но без справки о товарах."""
+    global knowledge_base
+    try:
+        knowledge_base = KnowledgeBase.from_file()
+        sys_logger.info(f"База знаний загружена: {len(knowledge_base)} фрагментов")
+    except OSError as e:
+        knowledge_base = None
+        sys_logger.error(f"Не удалось загрузить базу знаний: {e}")
+
+def reload_cities(rows):
+    """
+    Вызывается CitiesReloader из фонового потока после обновления cities_map
+    (updated_cities.py). Новые объекты строятся целиком и подменяют старые.
+    """
+    global df_regions
+    set_city_index(CityIndex(rows))
+    load_phone_trie(cities=rows)
+    df_regions = pd.DataFrame(rows)
+    sys_logger.info(f"Справочник городов обновлён без перезапуска: {len(rows)} городов")
+
 # --- Функции поиска и обработки данных ---
 def search_product(query):
-    global df_products
-    if df_products is None or df_products.empty:
+    """Ищет информацию о продукте в таблице products (по индексу товаров, без полного перебора)"""
+    if product_index is None:
         return None
-    clean_query = query.lower().strip()
-    matches = []
-    for _, row in df_products.iterrows():
-        if not pd.isna(row["official_name"]):
-            official_name = str(row["official_name"]).lower()
-            if clean_query in official_name or fuzz.ratio(clean_query, official_name) > 70:
-                matches.append(row)
-                continue
-        if not pd.isna(row["slang_name"]):
-            slang_names = str(row["slang_name"]).lower().split(',')
-            for slang in slang_names:
-                if clean_query in slang.strip() or fuzz.ratio(clean_query, slang.strip()) > 70:
-                    matches.append(row)
-                    break
+    matches = product_index.search(query)
+    # Названия, искажённые распознаванием речи ("ш б т 50"), находит векторный поиск
+    if not matches and product_vector_index is not None:
+        matches = product_vector_index.search(query)
     return matches
 
 def get_region(city):
     if not city or pd.isna(city) or city == "Нет данных":
         return {"code": "Не определено", "name": "Не определено"}
-    best_match = None
-    best_score = 0
-    for _, row in df_regions.iterrows():
-        ref_city = str(row["city_name"]).strip().lower()
-        current_city = str(city).strip().lower()
-        score = fuzz.ratio(current_city, ref_city)
-        if score > best_score:
-            best_score = score
-            best_match = row # Сохраняем всю строку для доступа к коду и имени
-        if not pd.isna(row.get("aliases")):
-            aliases = str(row["aliases"]).lower().split(',')
-            for alias in aliases:
-                alias = alias.strip()
-                score = fuzz.ratio(current_city, alias)
-                if score > best_score:
-                    best_score = score
-                    best_match = row
-    if best_score > 70 and best_match is not None:
-         return {"code": best_match.get("region_code", "Не определено"), "name": best_match.get("region_name", "Не определено")}
+    city_info = resolve_city(city)
+    if city_info is not None:
+         return {"code": city_info.get("region_code") or "Не определено", "name": city_info.get("region_name") or "Не определено"}
     else:
          return {"code": "Не определено", "name": "Не определено"}
 
 def normalize_city_name(city_input):
     if not city_input or pd.isna(city_input):
         return None
-    city_input = city_input.strip().lower()
-    city_patterns = [
-        r'из\s+([а-яА-Я\-]+)',
-        r'в\s+([а-яА-Я\-]+)',
-        r'город\s+([а-яА-Я\-]+)',
-        r'г\.\s*([а-яА-Я\-]+)',
-        r'г\s+([а-яА-Я\-]+)'
-    ]
-    for pattern in city_patterns:
-        match = re.search(pattern, city_input)
-        if match:
-            city_input = match.group(1).strip()
-            break
-    best_match = None
-    best_score = 0
-    for _, row in df_regions.iterrows():
-        ref_city = str(row["city_name"]).strip().lower()
-        score = fuzz.ratio(city_input, ref_city)
-        if score > best_score:
-            best_score = score
-            best_match = row["city_name"]
-        if not pd.isna(row.get("aliases")):
-            aliases = str(row["aliases"]).lower().split(',')
-            for alias in aliases:
-                alias = alias.strip()
-                score = fuzz.ratio(city_input, alias)
-                if score > best_score:
-                    best_score = score
-                    best_match = row["city_name"]
-    final_result = best_match if best_score > 70 else city_input.capitalize()
+    city_info = resolve_city(city_input)
+    if city_info is not None:
+        final_result = city_info["city_name"]
+        best_score = city_info["score"]
+    else:
+        final_result = extract_city_phrase(city_input).capitalize()
+        best_score = 0
     sys_logger.info(f"Нормализация города: '{city_input}' -> '{final_result}' (score: {best_score})")
     return final_result
 
 def find_client_by_phone(phone):
-    global df_clients
     if not phone:
         sys_logger.debug("find_client_by_phone: Номер телефона не предоставлен.")
         return None
-    
-    # Нормализуем введенный номер
-    clean_input_phone = ''.join(filter(str.isdigit, str(phone)))
-    if len(clean_input_phone) == 11 and clean_input_phone[0] == '8':
-        clean_input_phone = '7' + clean_input_phone[1:]
-    normalized_search_phone = f"+{clean_input_phone}" if len(clean_input_phone) == 11 and clean_input_phone[0] == '7' else clean_input_phone
-
-    sys_logger.debug(f"find_client_by_phone: Поиск по нормализованному номеру '{normalized_search_phone}' (введено '{phone}')")
 
-    if df_clients is not None and not df_clients.empty:
-        for index, row in df_clients.iterrows():
-            if pd.isna(row.get("phone")):
-                continue
-            
-            db_phone_raw = str(row["phone"])
-            # Нормализуем номер из БД
-            clean_db_phone = ''.join(filter(str.isdigit, db_phone_raw))
-            if len(clean_db_phone) == 11 and clean_db_phone[0] == '8':
-                clean_db_phone = '7' + clean_db_phone[1:]
-            normalized_db_phone = f"+{clean_db_phone}" if len(clean_db_phone) == 11 and clean_db_phone[0] == '7' else clean_db_phone
-
-            sys_logger.debug(f"  Сравнение с записью ID {row.get('client_id', 'N/A')}: БД хранит '{db_phone_raw}' -> нормализовано '{normalized_db_phone}'")
-
-            if normalized_db_phone == normalized_search_phone:
-                sys_logger.info(f"find_client_by_phone: Клиент найден по номеру {normalized_search_phone}")
-                return row # Возвращаем всю строку (серии Pandas)
-    
-    sys_logger.info(f"find_client_by_phone: Клиент с номером {normalized_search_phone} не найден в df_clients")
-    return None
+    # Звонящий определяется одним обращением к словарю репозитория, без перебора клиентов
+    row = client_repository.find_by_phone(phone) if client_repository is not None else None
+    if row is None:
+        sys_logger.info(f"find_client_by_phone: Клиент с номером {normalize_phone_number(phone) or phone} не найден")
+        return None
+    sys_logger.info(f"find_client_by_phone: Клиент найден по номеру {row.get('phone_e164') or row.get('phone')}")
+    client = dict(row)
+    if isinstance(client.get("client_id"), str) and client["client_id"]:
+        client["client_id"] = uuid.UUID(client["client_id"])
+    return client
+
+def get_recent_calls_by_phone(phone, n=3):
+    """Последние n звонков клиента по номеру (одним запросом, без предварительного поиска клиента)."""
+    phone_key = normalize_phone_number(phone)
+    if phone_key is None:
+        return []
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = sqlite3.Row
+    rows = cursor.execute('''
+        SELECT c.call_id, c.timestamp, c.department, c.product_service, c.request_text, c.next_step
+        FROM Clients_info AS ci
+        JOIN calls AS c ON c.client_id = ci.client_id
+        WHERE ci.phone_e164 = ?
+        ORDER BY c.timestamp DESC
+        LIMIT ?
+    ''', (phone_key, n)).fetchall()
+    return [dict(row) for row in rows]
+
+# Клиент, его прошлые звонки и прогноз региона запрашиваются одновременно
+caller_prefetcher = CallerPrefetcher(find_client_by_phone, get_recent_calls_by_phone)
+
+def refresh_clients():
+    """Подтягивает клиентов, изменённых другими процессами (по версии "clients" в data_versions)."""
+    if client_repository is None:
+        return
+    try:
+        client_repository.refresh(get_db_connection())
+    except sqlite3.Error as e:
+        sys_logger.error(f"Не удалось обновить клиентов из базы: {e}")
 
 def format_product_info(product_matches):
     if not product_matches:
@@ -613,6 +626,10 @@ def get_llm_response(history, profile, system_info=""):
     messages = [{"role": "system", "content": FULL_PROMPT}]
     if system_info:
         messages.append({"role": "system", "content": system_info})
+    # Только фрагменты каталога, относящиеся к последним репликам клиента
+    kb_message = kb_system_message(knowledge_base, history)
+    if kb_message:
+        messages.append(kb_message)
     messages.extend(history)
     sys_logger.debug(f"Отправка запроса в LLM. Сообщения: {messages}")
     try:
@@ -764,21 +781,17 @@ def save_call_data_to_db(profile, history, client_id=None):
     conn = None
     try:
         # --- Проверка уникальности телефона напрямую в БД перед началом операции ---
-        # Это необходимо на случай, если df_clients устарел или номер был установлен в profile до начала диалога
+        # Это необходимо на случай, если клиенты в памяти устарели или номер был установлен в profile до начала диалога
         # И клиент на самом деле уже существует.
         entered_phone = profile.get("Телефон")
         if entered_phone and (client_id is None):
             conn_check = get_db_connection()
             cursor_check = conn_check.cursor()
-            # Нормализуем номер для поиска, как в find_client_by_phone
-            clean_input_phone = ''.join(filter(str.isdigit, str(entered_phone)))
-            if len(clean_input_phone) == 11 and clean_input_phone[0] == '8':
-                clean_input_phone = '7' + clean_input_phone[1:]
-            normalized_search_phone = f"+{clean_input_phone}" if len(clean_input_phone) == 11 and clean_input_phone[0] == '7' else clean_input_phone
+            # Тот же ключ, что и в find_client_by_phone; поиск по уникальному индексу phone_e164
+            normalized_search_phone = normalize_phone_number(entered_phone)
             sys_logger.debug(f"save call data to db: Предварительная проверка БД на существование клиента с номером '{normalized_search_phone}'")
-            cursor_check.execute("SELECT client_id FROM Clients_info WHERE phone = ?", (normalized_search_phone,))
+            cursor_check.execute("SELECT client_id FROM Clients_info WHERE phone_e164 = ?", (normalized_search_phone,))
             existing_client = cursor_check.fetchone()
-            conn_check.close()
             if existing_client:
                 found_client_id = existing_client[0]
                 client_id = found_client_id # Используем существующий ID
@@ -821,6 +834,7 @@ def save_call_data_to_db(profile, history, client_id=None):
             client_data_to_insert = {
                 'client_id': client_id,
                 'phone': profile.get("Телефон"),
+                'phone_e164': normalize_phone_number(profile.get("Телефон")),
                 'name': profile.get("Имя клиента"),
                 'city_name': profile_city if profile_city != "Нет данных" else None,
                 'region_code': profile_region_code if profile_region_code and profile_region_code != "Не определено" else None,
@@ -862,6 +876,7 @@ def save_call_data_to_db(profile, history, client_id=None):
             # Обновляем только те поля, которые могли измениться
             client_data_to_update = {
                 'phone': profile.get("Телефон"),
+                'phone_e164': normalize_phone_number(profile.get("Телефон")),
                 'name': profile.get("Имя клиента"),
                 'city_name': profile_city if profile_city != "Нет данных" else None,
                 'region_code': profile_region_code if profile_region_code and profile_region_code != "Не определено" else None,
@@ -911,20 +926,17 @@ def save_call_data_to_db(profile, history, client_id=None):
         transcription = json_data.get("transcription", [])
         if transcription:
             sys_logger.info(f"Сохранение {len(transcription)} реплик транскрипции.")
-            for i, replica in enumerate(transcription):
-                transcript_data = {
-                    'call_id': call_id,
-                    'client_id': client_id,
-                    'speaker': replica.get("speaker"),
-                    'text': replica.get("text"),
-                    'segment_time': datetime.now().isoformat(), # Заглушка, можно уточнить
-                    'llm_response': replica.get("speaker") == "bot",
-                    'segment_id': f"seg_{i}" # Простой ID сегмента
-                }
-                columns = ', '.join(transcript_data.keys())
-                placeholders = ', '.join('?' * len(transcript_data))
-                sql_insert_transcript = f'INSERT INTO call_transcripts ({columns}) VALUES ({placeholders})'
-                cursor.execute(sql_insert_transcript, list(transcript_data.values()))
+            segment_time = datetime.now().isoformat() # Заглушка, можно уточнить
+            # Все реплики одним executemany (один подготовленный запрос вместо запроса на реплику)
+            cursor.executemany(
+                'INSERT INTO call_transcripts (call_id, client_id, speaker, text, segment_time, llm_response, segment_id) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (call_id, client_id, replica.get("speaker"), replica.get("text"), segment_time,
+                     replica.get("speaker") == "bot", f"seg_{i}") # Простой ID сегмента
+                    for i, replica in enumerate(transcription)
+                ],
+            )
 
         # --- 4. Обновление last_call_summary у клиента ---
         if last_call_summary:
@@ -934,15 +946,17 @@ def save_call_data_to_db(profile, history, client_id=None):
 
         # --- 5. Сохранение JSON в таблицу Json ---
         try:
-            # Убедимся, что json_data - это строка
-            json_string_for_db = json.dumps(json_data, ensure_ascii=False) # Преобразуем dict в str
+            # Компактный JSON, сжатый zlib (читается обратно через call_json.load_call_json).
+            # Время реплик в call_transcripts здесь — заглушка, поэтому транскрипция остаётся внутри дампа
+            json_blob_for_db = encode_call_json(json_data, transcript_by_ref=False)
             
             # Используем UUID client_id напрямую, так как Json.client_id ссылается на Clients_info.client_id (UUID)
             json_record = {
                 'call_id': str(call_id),          # TEXT
                 'client_id': str(client_id),      # TEXT - UUID клиента (соответствует Clients_info.client_id)
                 'timestamp': datetime.now().isoformat(), # DATETIME (в SQLite часто хранится как TEXT)
-                'json_data': json_string_for_db   # TEXT
+                'json_blob': json_blob_for_db,    # BLOB
+                'json_format': COMPACT_JSON_FORMAT
             }
 
             columns = ', '.join(json_record.keys())
@@ -956,19 +970,20 @@ def save_call_data_to_db(profile, history, client_id=None):
              print(f"[Система] Предупреждение: Не удалось сохранить JSON в таблицу Json: {e}")
              # Продолжаем выполнение, так как основные данные уже сохранены
 
-        # --- 6. Сохранение JSON в лог-файл (по желанию) ---
-        json_string = json.dumps(json_data, ensure_ascii=False, indent=2)
-        with open(f"call_data_{call_id}.json", "w", encoding='utf-8') as f:
-            f.write(json_string)
-        sys_logger.info(f"JSON данных звонка сохранен в файл call_data_{call_id}.json")
+        # --- 6. Сохранение JSON в архив звонков (дозапись в текущий сегмент, fsync — пачкой) ---
+        segment, offset = get_call_archive().append(call_id, json_data)
+        sys_logger.info(f"JSON данных звонка сохранен в архив {segment} (смещение {offset})")
 
         # --- 7. Коммит транзакции ---
+        # Версия "clients" растёт в той же транзакции — другие процессы увидят изменение через refresh
+        mark_client_changed(conn, client_id)
         conn.commit()
         sys_logger.info("Данные звонка и клиента успешно сохранены в базе данных.")
         print("[Система] Данные звонка и клиента сохранены в базе данных.")
 
-        # --- Обновление df_clients после изменения базы ---
-        load_data_from_db()  # <--- Добавьте эту строку
+        # --- Обновление клиента в памяти (одна строка по client_id вместо перечитывания всех таблиц) ---
+        if client_repository is not None:
+            client_repository.apply_committed(conn, client_id)
 
         return client_id, call_id
     
@@ -978,9 +993,6 @@ def save_call_data_to_db(profile, history, client_id=None):
         sys_logger.error(f"Ошибка при сохранении данных в базу данных: {e}")
         print(f"[Система] Ошибка при сохранении данных в базу данных: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
 
 # --- Основная функция ---
@@ -995,6 +1007,10 @@ def main():
 
     # --- Загрузка данных из базы ---
     load_data_from_db()
+    load_knowledge_base()
+    # Горячая перезагрузка справочника городов при смене версии в data_versions
+    cities_reloader = CitiesReloader(DB_NAME, on_reload=reload_cities)
+    cities_reloader.start()
 
     # --- Получение и обработка входящего номера ---
     detected_phone_input = input("Введите определившийся номер телефона (или нажмите Enter): ").strip()
@@ -1006,6 +1022,19 @@ def main():
     else:
         print("Номер телефона не был предоставлен.")
 
+    # Клиент, прошлые звонки и регион по номеру — параллельно, не дольше таймаута предзагрузки
+    caller_context = None
+    if detected_phone:
+        # Изменения клиентов из других процессов (одна проверка версии, если их не было)
+        refresh_clients()
+        caller_context = asyncio.run(caller_prefetcher.fetch(detected_phone))
+
+    # Вероятный регион по номеру — известен до того, как клиент назовёт город
+    region_prediction = caller_context.region_prediction if caller_context else None
+    region_hint = region_prediction["region_codes"] if region_prediction else None
+    if region_prediction:
+        sys_logger.info(f"[Система] Прогноз региона по номеру: {region_prediction}")
+
     # --- Инициализация профиля и истории ---
     profile = ClientProfile()
     history = [] # Эта история будет передана в save_call_data_to_db
@@ -1014,8 +1043,7 @@ def main():
     # --- Поиск клиента в базе ---
     # ВАЖНО: Поиск происходит до начала диалога, используя нормализованный номер
     if detected_phone:
-        # find_client_by_phone теперь ожидает уже нормализованный номер
-        client_data = find_client_by_phone(detected_phone) 
+        client_data = caller_context.client
         if client_data is not None:
             # Клиент найден, загружаем его данные в профиль
             profile.load_from_db(client_data)
@@ -1023,6 +1051,12 @@ def main():
             # Передаем информацию о последнем звонке в контекст LLM
             if profile.last_call_summary:
                  history.append({"role": "system", "content": f"Информация о последнем звонке: {profile.last_call_summary}"})
+            if caller_context.recent_calls:
+                 recent = "\n".join(
+                     f"{(call.get('timestamp') or '')[:10]} — {call.get('department') or 'отдел не указан'}: {call.get('request_text') or ''}"
+                     for call in caller_context.recent_calls
+                 )
+                 history.append({"role": "system", "content": f"Прошлые звонки клиента:\n{recent}"})
         else:
              sys_logger.info("[Система] Клиент с таким номером не найден.")
              # Устанавливаем нормализованный номер в профиль для нового клиента
@@ -1040,6 +1074,9 @@ def main():
                 system_info += f"У клиента есть ИНН в базе ({inn_for_info}). "
         else:
             system_info += "Клиент не найден в базе. "
+        if profile.get("Город") in (None, "", "Нет данных"):
+            region_names = dict(zip(df_regions["region_code"], df_regions["region_name"]))
+            system_info += region_prediction_text(region_prediction, region_names)
 
     # --- Начало диалога ---
     print("\n--- Начало диалога ---")
@@ -1084,11 +1121,17 @@ def main():
             # Если вы полностью переходите на JSON, эту часть можно адаптировать или упростить
             for field, value in updates.items(): # updates будет пустым, если парсинг JSON успешен
                 if field == "Город":
-                     normalized_city = normalize_city_name(value)
+                     # Город и регион определяются за один проход по индексу городов
+                     city_info = resolve_city(value, region_hint) if value and value != "Нет данных" else None
+                     if city_info is not None:
+                         normalized_city = city_info["city_name"]
+                         region_info = {"code": city_info["region_code"] or "Не определено", "name": city_info["region_name"] or "Не определено"}
+                     else:
+                         normalized_city = extract_city_phrase(value).capitalize() if value and value != "Нет данных" else value
+                         region_info = {"code": "Не определено", "name": "Не определено"}
                      profile.update(field, normalized_city)
                      # Автоматически определяем регион при обновлении города
                      if normalized_city and normalized_city != "Нет данных":
-                         region_info = get_region(normalized_city)
                          profile.update("client_region", region_info)
                          sys_logger.info(f"Город '{value}' нормализован в '{normalized_city}'. Регион определен: {region_info}")
                 elif field == "Телефон":
@@ -1188,6 +1231,13 @@ def main():
             # Выходим из цикла
             break
 
+    cities_reloader.stop()
+
+    # Доля городов, найденных точным поиском (с падежными формами), а не fuzzy
+    resolver = get_city_resolver()
+    if resolver is not None:
+        sys_logger.info(f"Статистика поиска городов: {resolver.index.lookup_stats()}")
+
     print("\n--- Диалог завершен ---")
 
 if __name__ == "__main__":
@@ -8,6 +8,14 @@ import time
 import logging
 import uuid # Для генерации call_id
 import os
+import sys
+import atexit
+
+# Общие модули пакета Asya (src.utils.*) лежат в соседней папке Asya/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Asya"))
+from src.utils.city_index import CityIndex
+from src.utils.product_index import ProductIndex
+from src.database.call_archive import CallArchive
 
 # --- Настройка логирования в файл ---
 sys_logger = logging.getLogger('system_logger')
@@ -311,6 +319,9 @@ sys_logger.info("Загрузка данных из Excel...")
 df_clients = pd.read_excel("Clients.xlsx", sheet_name="Clients_info")
 df_regions = pd.read_excel("Clients.xlsx", sheet_name="Regions_map")
 df_products = pd.read_excel("Clients.xlsx", sheet_name="products")
+city_index = CityIndex.from_dataframe(df_regions, name_field="Город")
+# Индекс товаров для search_product (архивные товары в него не попадают)
+product_index = ProductIndex.from_dataframe(df_products)
 # --- Загрузка вкладки Json ---
 try:
     df_json = pd.read_excel("Clients.xlsx", sheet_name="Json")
@@ -320,48 +331,17 @@ sys_logger.info("Данные загружены.")
 
 # --- Функции поиска и обработки данных ---
 def search_product(query):
-    """Ищет информацию о продукте в таблице products"""
-    global df_products
-    if df_products is None or df_products.empty:
+    """Ищет информацию о продукте в таблице products (по индексу товаров, без полного перебора)"""
+    if product_index is None:
         return None
-    clean_query = query.lower().strip()
-    matches = []
-    for _, row in df_products.iterrows():
-        if not pd.isna(row["official_name"]):
-            official_name = str(row["official_name"]).lower()
-            if clean_query in official_name or fuzz.ratio(clean_query, official_name) > 70:
-                matches.append(row)
-                continue
-        if not pd.isna(row["slang_name"]):
-            slang_names = str(row["slang_name"]).lower().split(',')
-            for slang in slang_names:
-                if clean_query in slang.strip() or fuzz.ratio(clean_query, slang.strip()) > 70:
-                    matches.append(row)
-                    break
-    return matches
+    return product_index.search(query)
 
 def get_region(city):
     """Определяет регион по названию города с учетом aliases"""
     if not city or pd.isna(city) or city == "Нет данных":
         return "Не определено"
-    best_match = None
-    best_score = 0
-    for _, row in df_regions.iterrows():
-        ref_city = str(row["Город"]).strip().lower()
-        current_city = str(city).strip().lower()
-        score = fuzz.ratio(current_city, ref_city)
-        if score > best_score:
-            best_score = score
-            best_match = row["client_region"]
-        if not pd.isna(row.get("aliases")):
-            aliases = str(row["aliases"]).lower().split(',')
-            for alias in aliases:
-                alias = alias.strip()
-                score = fuzz.ratio(current_city, alias)
-                if score > best_score:
-                    best_score = score
-                    best_match = row["client_region"]
-    return best_match if best_score > 70 else "Не определено"
+    best_match, best_score = city_index.lookup(city)
+    return best_match["client_region"] if best_match is not None else "Не определено"
 
 def normalize_city_name(city_input):
     """Нормализует название города, исправляя опечатки и используя aliases"""
@@ -381,24 +361,8 @@ def normalize_city_name(city_input):
             city_input = match.group(1).strip()
             break
 
-    best_match = None
-    best_score = 0
-    for _, row in df_regions.iterrows():
-        ref_city = str(row["Город"]).strip().lower()
-        score = fuzz.ratio(city_input, ref_city)
-        if score > best_score:
-            best_score = score
-            best_match = row["Город"]
-        if not pd.isna(row.get("aliases")):
-            aliases = str(row["aliases"]).lower().split(',')
-            for alias in aliases:
-                alias = alias.strip()
-                score = fuzz.ratio(city_input, alias)
-                if score > best_score:
-                    best_score = score
-                    best_match = row["Город"]
-    
-    final_result = best_match if best_score > 70 else city_input.capitalize()
+    best_match, best_score = city_index.lookup(city_input)
+    final_result = best_match["Город"] if best_match is not None else city_input.capitalize()
     sys_logger.info(f"Нормализация города: '{city_input}' -> '{final_result}' (score: {best_score})")
     return final_result
 
@@ -628,6 +592,20 @@ def clean_agent_response(response_text):
     return cleaned
 
 # --- НОВАЯ Функция для генерации и сохранения JSON ---
+# --- Архив JSON звонков ---
+# Раньше каждый звонок писался в отдельный JSON/<call_id>.json; старые файлы упаковываются
+# один раз (из папки Asya): python -m src.database.call_archive pack ../JSON ../JSON --remove
+CALL_ARCHIVE_DIR = "JSON"
+call_archive = None
+
+def get_call_archive():
+    """Архив звонков (открывается при первом звонке, fsync хвоста — при выходе)."""
+    global call_archive
+    if call_archive is None:
+        call_archive = CallArchive(CALL_ARCHIVE_DIR)
+        atexit.register(call_archive.close)
+    return call_archive
+
 def generate_and_save_json(profile, history, client_id):
     """Генерирует JSON на основе данных профиля и истории, и сохраняет его во вкладку Json и в файл."""
     global df_json
@@ -765,24 +743,16 @@ def generate_and_save_json(profile, history, client_id):
         sys_logger.error(f"Ошибка при сохранении JSON в Excel: {e}")
         print(f"[Система] Ошибка при сохранении JSON в Excel: {e}")
 
-    # 11. Сохраняем в отдельный файл
+    # 11. Дописываем в архив звонков (сегменты JSON/calls-*.jsonl с индексом по call_id)
     file_saved = False
     try:
-        # Убедимся, что папка JSON существует
-        os.makedirs("JSON", exist_ok=True)
-        
-        # Создаем имя файла: call_id.json
-        filename = f"JSON/{call_id}.json"
-        
-        # Записываем JSON в файл
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(json_string)
+        segment, offset = get_call_archive().append(call_id, json_data)
         file_saved = True
-        sys_logger.info(f"JSON данных звонка сохранен в файл: {filename}")
-        print(f"[Система] JSON данных звонка сохранен в файл: {filename}")
+        sys_logger.info(f"JSON данных звонка сохранен в архив: {segment} (смещение {offset})")
+        print(f"[Система] JSON данных звонка сохранен в архив: {segment}")
     except Exception as e:
-        sys_logger.error(f"Ошибка при сохранении JSON в файл: {e}")
-        print(f"[Система] Ошибка при сохранении JSON в файл: {e}")
+        sys_logger.error(f"Ошибка при сохранении JSON в архив: {e}")
+        print(f"[Система] Ошибка при сохранении JSON в архив: {e}")
         
     # 12. Проверка успешности сохранения
     if not excel_saved and not file_saved:
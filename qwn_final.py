@@ -7,6 +7,13 @@ import re
 import time
 import logging
 import uuid # Для генерации call_id
+import os
+import sys
+
+# Общие модули пакета Asya (src.utils.*) лежат в соседней папке Asya/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Asya"))
+from src.utils.city_index import CityIndex
+from src.utils.product_index import ProductIndex
 
 # --- Настройка логирования в файл ---
 sys_logger = logging.getLogger('system_logger')
@@ -278,6 +285,9 @@ sys_logger.info("Загрузка данных из Excel...")
 df_clients = pd.read_excel("Clients.xlsx", sheet_name="Clients_info")
 df_regions = pd.read_excel("Clients.xlsx", sheet_name="Regions_map")
 df_products = pd.read_excel("Clients.xlsx", sheet_name="products")
+city_index = CityIndex.from_dataframe(df_regions, name_field="Город")
+# Индекс товаров для search_product (архивные товары в него не попадают)
+product_index = ProductIndex.from_dataframe(df_products)
 # --- Загрузка вкладки Json ---
 try:
     df_json = pd.read_excel("Clients.xlsx", sheet_name="Json")
@@ -287,48 +297,17 @@ sys_logger.info("Данные загружены.")
 
 # --- Функции поиска и обработки данных ---
 def search_product(query):
-    """Ищет информацию о продукте в таблице products"""
-    global df_products
-    if df_products is None or df_products.empty:
+    """Ищет информацию о продукте в таблице products (по индексу товаров, без полного перебора)"""
+    if product_index is None:
         return None
-    clean_query = query.lower().strip()
-    matches = []
-    for _, row in df_products.iterrows():
-        if not pd.isna(row["official_name"]):
-            official_name = str(row["official_name"]).lower()
-            if clean_query in official_name or fuzz.ratio(clean_query, official_name) > 70:
-                matches.append(row)
-                continue
-        if not pd.isna(row["slang_name"]):
-            slang_names = str(row["slang_name"]).lower().split(',')
-            for slang in slang_names:
-                if clean_query in slang.strip() or fuzz.ratio(clean_query, slang.strip()) > 70:
-                    matches.append(row)
-                    break
-    return matches
+    return product_index.search(query)
 
 def get_region(city):
     """Определяет регион по названию города с учетом aliases"""
     if not city or pd.isna(city) or city == "Нет данных":
         return "Не определено"
-    best_match = None
-    best_score = 0
-    for _, row in df_regions.iterrows():
-        ref_city = str(row["Город"]).strip().lower()
-        current_city = str(city).strip().lower()
-        score = fuzz.ratio(current_city, ref_city)
-        if score > best_score:
-            best_score = score
-            best_match = row["client_region"]
-        if not pd.isna(row.get("aliases")):
-            aliases = str(row["aliases"]).lower().split(',')
-            for alias in aliases:
-                alias = alias.strip()
-                score = fuzz.ratio(current_city, alias)
-                if score > best_score:
-                    best_score = score
-                    best_match = row["client_region"]
-    return best_match if best_score > 70 else "Не определено"
+    best_match, best_score = city_index.lookup(city)
+    return best_match["client_region"] if best_match is not None else "Не определено"
 
 def normalize_city_name(city_input):
     """Нормализует название города, исправляя опечатки и используя aliases"""
@@ -348,24 +327,8 @@ def normalize_city_name(city_input):
             city_input = match.group(1).strip()
             break
 
-    best_match = None
-    best_score = 0
-    for _, row in df_regions.iterrows():
-        ref_city = str(row["Город"]).strip().lower()
-        score = fuzz.ratio(city_input, ref_city)
-        if score > best_score:
-            best_score = score
-            best_match = row["Город"]
-        if not pd.isna(row.get("aliases")):
-            aliases = str(row["aliases"]).lower().split(',')
-            for alias in aliases:
-                alias = alias.strip()
-                score = fuzz.ratio(city_input, alias)
-                if score > best_score:
-                    best_score = score
-                    best_match = row["Город"]
-    
-    final_result = best_match if best_score > 70 else city_input.capitalize()
+    best_match, best_score = city_index.lookup(city_input)
+    final_result = best_match["Город"] if best_match is not None else city_input.capitalize()
     sys_logger.info(f"Нормализация города: '{city_input}' -> '{final_result}' (score: {best_score})")
     return final_result
 
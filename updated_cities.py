@@ -1,51 +1,31 @@
-import csv
+import os
 import sqlite3
-import json
+import sys
+
+# Общие модули пакета Asya (src.*) лежат в соседней папке Asya/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Asya"))
+from src.database.cities_loader import read_cities_csv, swap_cities_map
 
 def update_cities_from_csv(csv_file_path):
+    conn = None
     try:
+        # 1. Читаем CSV целиком — до любых изменений в базе
+        rows = read_cities_csv(csv_file_path)
+        print(f"Прочитано {len(rows)} городов из {csv_file_path}")
+
+        # 2. Теневая таблица + проверка + подмена через RENAME одной транзакцией.
+        #    Звонки видят либо старый справочник, либо новый — но не пустой.
         conn = sqlite3.connect('clients.db')
-        cursor = conn.cursor()
-        
-        # 1. Очищаем таблицу
-        cursor.execute("DELETE FROM cities_map")
-        print("Таблица cities_map очищена")
-        
-        # 2. Загружаем новые данные
-        with open(csv_file_path, 'r', encoding='utf-8-sig') as csvfile:
-            reader = csv.DictReader(csvfile)
-            cities_added = 0
-            
-            for row in reader:
-                # Преобразование is_duplicate
-                is_duplicate_str = row.get('is_duplicate', '0').strip().upper()
-                is_duplicate = is_duplicate_str in ('1', 'TRUE')
-                
-                city_name = row.get('city_name', '')
-                region_code = row.get('region_code', '')
-                region_name = row.get('region_name', '')
-                aliases = row.get('aliases', '').strip()
-                phone_route_code = row.get('phone_route_code', '').strip()
+        result = swap_cities_map(conn, rows)
 
-                cursor.execute('''
-                    INSERT INTO cities_map (
-                        city_name, region_code, region_name, is_duplicate, aliases, phone_route_code
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    city_name,
-                    region_code,
-                    region_name,
-                    is_duplicate,
-                    aliases,  # JSON-строка
-                    phone_route_code
-                ))
-                cities_added += 1
-                
-        conn.commit()
-        print(f"✅ Успешно загружено {cities_added} городов")
+        # 3. Процесс диалога увидит новую версию в data_versions и перестроит индекс сам
+        print(f"✅ Успешно загружено {result['cities']} городов, {result['aliases']} алиасов "
+              f"(версия справочника {result['version']})")
         
     except FileNotFoundError:
         print(f"❌ Файл {csv_file_path} не найден")
+    except ValueError as e:
+        print(f"❌ Новый справочник не прошёл проверку, cities_map не изменена: {e}")
     except sqlite3.Error as e:
         print(f"❌ Ошибка SQLite: {e}")
     except Exception as e: